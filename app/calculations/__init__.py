@@ -6,7 +6,7 @@ and calculating therapy cluster recommendations.
 
 Modules:
 
-* **calculate_cluster**: Core algorithm for processing questionnaire responses
+* **calculate_cluster**: Core algorithm for processing questionnaire responses, compiled into a scoring engine
     
 Author: Vajo Sekulic
 Version: 0.1.0
@@ -1,4 +1,18 @@
 """This module processes questionnaire responses to recommend therapy clusters"""
+import numpy as np
+
+# Clusters scored by the questionnaire. The order is the tie-break order:
+# when clusters share the highest score, the one listed first wins. Clusters
+# missing from this list rank after all listed ones, alphabetically.
+CLUSTER_ORDER = ("PA", "VT", "SYS", "PZ", "G")
+
+# Therapy method cluster (``TherapyMethodCluster.cluster_short``) matching each questionnaire cluster
+METHOD_CLUSTERS = {"PA": "PA", "VT": "VT", "SYS": "ST", "PZ": "HT", "G": "HT"}
+
+# Weighted cluster points per answer: question_id -> selected option -> {cluster: weight}.
+# Answers listed here are scored with these weights; all other answers give
+# one point to each cluster in their ``cluster_points``.
+QUESTION_WEIGHTS = {}
 
 def process_all_responses(responses):
     """
@@ -19,27 +33,166 @@ def process_all_responses(responses):
 
     return scores
 
+def tie_break_key(cluster):
+    """
+    Sort key implementing the tie-break rule of ``CLUSTER_ORDER``.
+
+    :param cluster: Cluster short code.
+    :type cluster: str
+    :return: Key that sorts listed clusters first, in list order, then the rest alphabetically.
+    :rtype: tuple
+    """
+    try:
+        return (0, CLUSTER_ORDER.index(cluster), "")
+    except ValueError:
+        return (1, 0, cluster)
+
 def calculate_cluster(scores):
     """
     Determines the cluster with the highest score.
 
+    Runs in a single pass over the scores; ties are resolved by :func:`tie_break_key`.
+
     :param scores: Scores for each cluster.
     :type scores: dict
     :return: The cluster with the highest score.
     :rtype: str
     """
-    # Add score tuples to a list for sorting
-    sorted_scores = []
-    for cluster, score in scores.items():
-        sorted_scores.append((cluster, score))
-
-    # Perform bubble sort to sort scores in descending order
-    n = len(sorted_scores)
-    for i in range(n):
-        for j in range(0, n - i - 1):
-            if sorted_scores[j][1] < sorted_scores[j + 1][1]:
-                sorted_scores[j], sorted_scores[j + 1] = sorted_scores[j + 1], sorted_scores[j]
-
-    # Get the key of the highest score
-    best_cluster = sorted_scores[0][0]
-    return best_cluster
+    return min(scores, key=lambda cluster: (-scores[cluster], tie_break_key(cluster)))
+
+class ScoringEngine:
+    """
+    Questionnaire scoring compiled to cluster columns and weight vectors.
+
+    The cluster order and the weighted answers are compiled once. A submission
+    is then scored by accumulating its weights into one score vector whose
+    columns follow ``CLUSTER_ORDER``, so the first maximum applies the tie-break
+    rule. Batches use one weighted ``bincount`` over a score matrix.
+    """
+
+    def __init__(self, clusters=CLUSTER_ORDER, question_weights=None):
+        """
+        :param clusters: Clusters in tie-break order.
+        :type clusters: tuple
+        :param question_weights: Weighted cluster points per question and option, see ``QUESTION_WEIGHTS``.
+        :type question_weights: dict
+        """
+        self.clusters = tuple(clusters)
+        self.columns = {cluster: column for column, cluster in enumerate(self.clusters)}
+        self.answer_vectors = {}
+        for question_id, options in (question_weights or {}).items():
+            for option, weights in options.items():
+                unknown = set(weights) - self.columns.keys()
+                if unknown:
+                    raise ValueError(f"Unknown cluster(s) in weights of question {question_id}: {sorted(unknown)}")
+                if any(weight < 0 for weight in weights.values()):
+                    raise ValueError(f"Negative weight in question {question_id}")
+                self.answer_vectors[(question_id, option)] = (
+                    [self.columns[cluster] for cluster in weights], [float(w) for w in weights.values()]
+                )
+
+    def _points(self, responses, extra_columns):
+        """
+        Collect the cluster columns and weights of a submission's answers.
+
+        Clusters outside the compiled order get columns from ``extra_columns``.
+        """
+        columns, weights = [], []
+        for response in responses:
+            vector = self.answer_vectors and self.answer_vectors.get(
+                (response.get("question_id"), response.get("selected_option"))
+            )
+            if vector:
+                columns.extend(vector[0])
+                weights.extend(vector[1])
+                continue
+            for cluster in response["cluster_points"]:
+                column = self.columns.get(cluster)
+                if column is None:
+                    column = extra_columns.setdefault(cluster, len(self.clusters) + len(extra_columns))
+                columns.append(column)
+                weights.append(1.0)
+        return columns, weights
+
+    def _labels(self, extra_columns):
+        """Return the cluster labels in tie-break order and the column permutation into that order."""
+        extra = sorted(extra_columns)
+        order = list(range(len(self.clusters))) + [extra_columns[cluster] for cluster in extra]
+        return self.clusters + tuple(extra), order
+
+    def score(self, responses):
+        """
+        Score one submission and rank all clusters.
+
+        :param responses: List of response objects from the frontend.
+        :type responses: list
+        :return: Recommended cluster (None without any points) and the ranking,
+            a list of ``cluster``, ``score`` and ``share`` of the total, best first.
+        :rtype: dict
+        """
+        extra_columns = {}
+        columns, weights = self._points(responses, extra_columns)
+        labels, order = self._labels(extra_columns)
+
+        # Accumulate in plain lists: for a single submission this beats array setup
+        accumulated = [0.0] * len(labels)
+        for column, weight in zip(columns, weights):
+            accumulated[column] += weight
+        scores = [accumulated[column] for column in order]
+
+        total = sum(scores)
+        if not total:
+            return {"recommended_cluster": None, "ranking": []}
+
+        # Stable sort keeps the tie-break order among equal scores
+        ranked = sorted(range(len(labels)), key=lambda column: -scores[column])
+        return {
+            "recommended_cluster": labels[ranked[0]],
+            "ranking": [
+                {"cluster": labels[column], "score": scores[column], "share": scores[column] / total}
+                for column in ranked if scores[column]
+            ],
+        }
+
+    def score_batch(self, questionnaires):
+        """
+        Determine the best cluster for many submissions in one pass.
+
+        Builds a questionnaires x clusters score matrix with one weighted
+        ``bincount`` and takes the row-wise first maximum.
+
+        :param questionnaires: Response lists, one per questionnaire.
+        :type questionnaires: list
+        :return: The best cluster per questionnaire, or None if it has no cluster points.
+        :rtype: list
+        """
+        extra_columns, rows, columns, weights = {}, [], [], []
+        for row, responses in enumerate(questionnaires):
+            row_columns, row_weights = self._points(responses, extra_columns)
+            rows.extend([row] * len(row_columns))
+            columns.extend(row_columns)
+            weights.extend(row_weights)
+
+        labels, order = self._labels(extra_columns)
+        width = len(labels)
+        flat = np.array(rows, dtype=np.int64) * width + np.array(columns, dtype=np.int64)
+        scores = np.bincount(flat, weights, minlength=len(questionnaires) * width)
+        scores = scores.reshape(len(questionnaires), width)[:, order]
+
+        best = scores.argmax(axis=1) if width else np.zeros(len(questionnaires), dtype=np.int64)
+        totals = scores.sum(axis=1)
+        return [labels[column] if total else None for column, total in zip(best, totals)]
+
+# Scoring engine compiled once at import
+scoring_engine = ScoringEngine(CLUSTER_ORDER, QUESTION_WEIGHTS)
+
+def score_batch(questionnaires):
+    """
+    Determines the best cluster for many questionnaires in one pass.
+
+    :param questionnaires: Response lists, one per questionnaire.
+    :type questionnaires: list
+    :return: The best cluster per questionnaire, or None if it has no cluster points.
+    :rtype: list
+    """
+    return scoring_engine.score_batch(questionnaires)
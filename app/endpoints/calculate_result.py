@@ -1,8 +1,73 @@
-"""This module contains the calculate_result endpoint for processing questionnaire responses."""
-from fastapi import APIRouter, Depends, HTTPException
-from app.calculations.calculate_cluster import process_all_responses, calculate_cluster
+"""This module contains the calculate_result endpoints for processing questionnaire responses."""
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.calculations.calculate_cluster import score_batch, scoring_engine
 from app.utils.validate_api_key import validate_api_key
 
+# Number of NDJSON questionnaires scored together while streaming
+NDJSON_CHUNK_SIZE = 5000
+
+# ------------------------------
+# Helper functions
+# ------------------------------
+
+def _questionnaire_responses(questionnaire):
+    """
+    Validate a questionnaire payload of a batch.
+
+    :param questionnaire: Parsed questionnaire payload.
+    :return: The responses, or an error message if the payload cannot be scored.
+    :rtype: tuple
+    """
+    responses = questionnaire.get("responses") if isinstance(questionnaire, dict) else None
+    if not responses:
+        return None, "No responses provided"
+    if not isinstance(responses, list) or not all(
+        isinstance(response, dict)
+        and isinstance(response.get("cluster_points"), list)
+        and all(isinstance(cluster, str) for cluster in response["cluster_points"])
+        for response in responses
+    ):
+        return None, "Malformed responses"
+    return responses, None
+
+def _score_questionnaires(questionnaires):
+    """
+    Score parsed questionnaires, reporting invalid ones per item.
+
+    :param questionnaires: Questionnaire payloads, or None for unparseable items.
+    :type questionnaires: list
+    :return: One result dict per questionnaire.
+    :rtype: list
+    """
+    valid, results = [], []
+    for questionnaire in questionnaires:
+        responses, error = _questionnaire_responses(questionnaire)
+        if error:
+            results.append({"recommended_cluster": None, "error": error})
+            continue
+        valid.append(responses)
+        results.append(None)
+
+    clusters = iter(score_batch(valid))
+    return [result or {"recommended_cluster": next(clusters)} for result in results]
+
+def _parse_ndjson_line(line):
+    """Parse one NDJSON line, returning None if it is not valid JSON."""
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+async def _stream_ndjson_results(questionnaires):
+    """Score parsed NDJSON questionnaires in chunks and yield NDJSON results."""
+    for start in range(0, len(questionnaires), NDJSON_CHUNK_SIZE):
+        chunk = questionnaires[start:start + NDJSON_CHUNK_SIZE]
+        results = await run_in_threadpool(_score_questionnaires, chunk)
+        yield "".join(json.dumps(result) + "\n" for result in results)
+
 # ------------------------------
 # Endpoint definition
 # ------------------------------
@@ -20,15 +85,47 @@ def calculate_results(
     :param api_key: API key for authentication (validated).
     :param payload: JSON payload containing questionnaire responses.
     :type payload: dict
-    :return: Recommended therapy cluster.
+    :return: Recommended therapy cluster and the ranking of all scored clusters.
     :rtype: dict
     """
     responses = payload.get("responses", [])
     if not responses:
         raise HTTPException(status_code=400, detail="No responses provided")
 
-    # Process responses, calculate scores, and determine best cluster
-    scores = process_all_responses(responses)
-    best_cluster = calculate_cluster(scores)
+    # Score all responses at once and rank the clusters
+    return scoring_engine.score(responses)
+
+@router.post("/calculate_results/batch")
+async def calculate_results_batch(
+    request: Request,
+    _api_key: str = Depends(validate_api_key)
+):
+    """
+    Calculate the recommended therapy cluster for many questionnaires at once.
+
+    Accepts a JSON array of questionnaire payloads, or NDJSON (one payload per
+    line, ``Content-Type: application/x-ndjson``) which is scored in chunks and
+    streamed back as NDJSON. Questionnaires without responses or with malformed
+    responses get an ``error`` instead of failing the batch.
+
+    :param api_key: API key for authentication (validated).
+    :param request: Request with the questionnaire payloads as body.
+    :type request: Request
+    :return: Recommended therapy cluster per questionnaire, in input order.
+    :rtype: dict
+    """
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        # Read the body before streaming: the response listens for disconnects on the same channel
+        body = await request.body()
+        questionnaires = [_parse_ndjson_line(line) for line in body.splitlines() if line.strip()]
+        return StreamingResponse(_stream_ndjson_results(questionnaires), media_type="application/x-ndjson")
+
+    try:
+        questionnaires = await request.json()
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Invalid JSON body") from exc
+    if not isinstance(questionnaires, list) or not questionnaires:
+        raise HTTPException(status_code=400, detail="Expected a non-empty array of questionnaires")
 
-    return {"recommended_cluster": best_cluster}
+    results = await run_in_threadpool(_score_questionnaires, questionnaires)
+    return {"results": results}
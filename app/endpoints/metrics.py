@@ -0,0 +1,19 @@
+"""This module contains the metrics endpoint for Prometheus scraping."""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.utils.metrics import registry
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    """
+    Return the request and database metrics in the Prometheus text format.
+
+    Like the root endpoint, this endpoint needs no API key, so scrapers can reach it.
+
+    :param: None
+    :return: Metrics exposition text.
+    :rtype: PlainTextResponse
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,75 @@
+"""This module contains the recommendations endpoint combining questionnaire scoring and therapist search."""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.calculations.calculate_cluster import METHOD_CLUSTERS, scoring_engine
+from app.utils.validate_api_key import validate_api_key
+from app.utils.db_session import get_async_db
+from app.utils.pagination import NEXT_CURSOR_HEADER, encode_cursor
+from app.utils.therapist_index import therapist_index
+from app.utils.catalogue_snapshot import catalogue_snapshot
+from app.utils.projections import load_therapists, parse_expand
+from app.utils.therapist_filters import experience_cutoff
+from app.utils.responses import FastJSONResponse
+
+# ------------------------------
+# Endpoint definition
+# ------------------------------
+
+router = APIRouter()
+
+@router.post("/recommendations")
+async def get_recommendations(
+    payload: dict,
+    _api_key: str = Depends(validate_api_key), # unused argument
+    db: AsyncSession = Depends(get_async_db),
+    limit: int = Query(10),
+    min_experience: int = Query(None),
+    postal_code: str = Query(None),
+    expand: str = Query(None)
+):
+    """
+    Score a questionnaire and return the first page of matching therapists.
+
+    Combines ``POST /calculate_results`` and ``GET /therapists?cluster_short=...``
+    in one call. Therapists are taken from the per-cluster posting of the
+    in-memory therapist index, so the page costs one primary key load. Further
+    pages are fetched from ``/therapists`` with ``cluster_short`` and the
+    ``X-Next-Cursor`` header of this response.
+
+    :param api_key: API key for authentication (validated).
+    :param payload: JSON payload containing questionnaire responses.
+    :type payload: dict
+    :param limit: Maximum number of therapists to return (default is 10).
+    :param min_experience: Minimum years of experience required.
+    :param postal_code: Filter by postal code.
+    :param expand: Comma-separated nested data to include (address, contact, methods).
+    :param db: Async database session dependency.
+    :return: Recommended cluster, cluster ranking, matching therapy cluster and therapists.
+    :rtype: dict
+    """
+    expansions = parse_expand(expand)
+    responses = payload.get("responses", [])
+    if not responses:
+        raise HTTPException(status_code=400, detail="No responses provided")
+
+    result = scoring_engine.score(responses)
+    cluster_short = METHOD_CLUSTERS.get(result["recommended_cluster"], result["recommended_cluster"])
+
+    therapist_ids, dataset_version = [], None
+    if cluster_short:
+        index = await db.run_sync(therapist_index.get)
+        dataset_version = therapist_index.version
+        therapist_ids = index.search(
+            min_registration_date=experience_cutoff(min_experience),
+            postal_code=postal_code,
+            cluster_short=cluster_short,
+            limit=limit,
+        )
+
+    therapists = catalogue_snapshot.load_therapists(therapist_ids, expansions, dataset_version)
+    if therapists is None:
+        therapists = await db.run_sync(load_therapists, therapist_ids, expansions)
+    headers = None
+    if limit and len(therapist_ids) == limit:
+        headers = {NEXT_CURSOR_HEADER: encode_cursor(therapist_ids[-1])}
+    return FastJSONResponse({**result, "cluster_short": cluster_short, "therapists": therapists}, headers=headers)
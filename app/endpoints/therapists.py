@@ -1,10 +1,21 @@
 """This module contains the therapists endpoint for retrieving therapists."""
-from datetime import date
-from fastapi import APIRouter, Query, Depends
-from sqlalchemy.orm import Session
-from data.models import Therapist, TherapistAddress, TherapyMethod, TherapyMethodCluster
+from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils.validate_api_key import validate_api_key
-from app.utils.db_session import get_db
+from app.utils.db_session import get_async_db
+from app.utils.pagination import decode_id_cursor, decode_postal_cursor, encode_cursor
+from app.utils.therapist_index import therapist_index
+from app.utils.catalogue_snapshot import catalogue_snapshot
+from app.utils.projections import load_therapists, parse_expand
+from app.utils.therapist_filters import experience_cutoff
+from app.utils.therapist_export import EXPORT_FORMATS, stream_therapists
+from app.utils.facets import therapist_facets
+from app.utils.responses import FastJSONResponse, encode_json
+from app.utils.reference_cache import page_response
+from app.utils.result_cache import therapist_results
+from data.search_index import search_therapist_ids
 
 
 # ------------------------------
@@ -14,15 +25,23 @@ from app.utils.db_session import get_db
 router = APIRouter()
 
 @router.get("/therapists")
-def get_therapists(
+async def get_therapists(
     _api_key: str = Depends(validate_api_key), # unused argument
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     limit: int = Query(10),
     offset: int = Query(0),
+    cursor: str = Query(None),
     min_experience: int = Query(None),
     therapy_method: str = Query(None),
     postal_code: str = Query(None),
-    cluster_short: str = Query(None)
+    cluster_short: str = Query(None),
+    state: str = Query(None),
+    postal_prefix: str = Query(None),
+    postal_from: str = Query(None),
+    postal_to: str = Query(None),
+    near: str = Query(None),
+    q: str = Query(None),
+    expand: str = Query(None)
 ):
     """
     Retrieve a list of therapists with optional filtering.
@@ -30,41 +49,186 @@ def get_therapists(
     :param api_key: API key for authentication (validated).
     :param limit: Maximum number of results to return (default is 10).
     :param offset: Number of results to skip for pagination (default is 0).
+    :param cursor: Cursor from the ``X-Next-Cursor`` header of the previous page.
     :param min_experience: Minimum years of experience required.
     :param therapy_method: Filter by specific therapy method.
     :param postal_code: Filter by postal code.
-    :param db: Database session dependency.
+    :param cluster_short: Filter by therapy cluster short code.
+    :param state: Filter by the state of the therapist's address.
+    :param postal_prefix: Filter by postal code prefix, e.g. ``10`` for 10xx.
+    :param postal_from: Filter by lowest postal code, inclusive.
+    :param postal_to: Filter by highest postal code, inclusive.
+    :param near: Order by distance of the postal code from this postal code.
+    :param q: Search therapist names, titles and therapy methods; results are ranked by relevance.
+    :param expand: Comma-separated nested data to include (address, contact, methods).
+    :param db: Async database session dependency.
     :return: List of therapists matching the criteria.
-    :rtype: List[Therapist]
+    :rtype: List[dict]
     """
-    # Base query
-    query = db.query(Therapist)
+    expansions = parse_expand(expand)
 
-    # Filter by experience, postal code or therapy method
-    if min_experience:
-        min_experience_date = date.today().replace(year=date.today().year - min_experience)
-        query = query.filter(Therapist.registration_date <= min_experience_date)
-    if postal_code:
-        query = query.join(
-            TherapistAddress
-            ).filter(
-                TherapistAddress.postal_code == postal_code
+    index = await db.run_sync(therapist_index.get)
+    dataset_version = therapist_index.version
+    filters = {
+        "min_registration_date": experience_cutoff(min_experience),
+        "therapy_method": therapy_method or None,
+        "postal_code": postal_code or None,
+        "cluster_short": cluster_short or None,
+        "state": state or None,
+    }
+    postal_filters = {
+        "postal_prefix": postal_prefix or None,
+        "postal_from": postal_from or None,
+        "postal_to": postal_to or None,
+    }
+
+    async def load_page():
+        """Select and encode the page, returning its JSON body and next cursor."""
+        if q:
+            # Ranked name search, narrowed by the other filters; pages are addressed by offset
+            unfiltered = not any(filters.values()) and not any(postal_filters.values())
+            try:
+                ranked_ids = await db.run_sync(search_therapist_ids, q, offset + limit if unfiltered else None)
+            except OperationalError as exc:
+                raise HTTPException(
+                    status_code=503, detail="Name search index is not built, run python -m data.migrate"
+                ) from exc
+            therapist_ids = index.filter_ranked(
+                ranked_ids,
+                **filters,
+                **postal_filters,
+                offset=offset,
+                limit=limit,
+            )
+            last_key = None
+        elif any(postal_filters.values()) or near:
+            # Postal code regions are walked through the sorted postal codes, nearest first
+            therapist_ids = index.search_postal(
+                **filters,
+                **postal_filters,
+                near=near,
+                after=decode_postal_cursor(cursor) if cursor else None,
+                offset=0 if cursor else offset,
+                limit=limit,
             )
-    if therapy_method:
-        query = query.join(
-            TherapyMethod, Therapist.therapy_methods
-            ).filter(
-                TherapyMethod.method_name == therapy_method
+            last_key = (index.postal_codes[therapist_ids[-1]], therapist_ids[-1]) if therapist_ids else None
+        else:
+            # Filter by experience, postal code, state, therapy method or cluster using the in-memory index
+            therapist_ids = index.search(
+                **filters,
+                after_id=decode_id_cursor(cursor) if cursor else None,
+                offset=0 if cursor else offset,
+                limit=limit,
             )
-    if cluster_short:
-        query = query.join(
-            TherapyMethod, Therapist.therapy_methods
-        ).join(
-            TherapyMethod.therapy_cluster
-        ).filter(
-            TherapyMethodCluster.cluster_short == cluster_short
+            last_key = therapist_ids[-1:]
+
+        # Load the page from the shared snapshot of the same dataset version, otherwise by primary
+        # key with one batched query per expansion
+        therapists = catalogue_snapshot.load_therapists(therapist_ids, expansions, dataset_version)
+        if therapists is None:
+            therapists = await db.run_sync(load_therapists, therapist_ids, expansions)
+        next_cursor = encode_cursor(*last_key) if last_key and limit and len(therapist_ids) == limit else None
+        return encode_json(therapists), next_cursor
+
+    # Identical requests within RESULT_CACHE_TTL seconds share one page; the search ignores cursor and
+    # near, and cursors replace the offset
+    key = (
+        expansions, tuple(filters.values()), tuple(postal_filters.values()), q or None,
+        None if q else near or None, None if q else cursor or None, offset if q or not cursor else 0, limit,
+    )
+    page = await therapist_results.get(dataset_version, key, load_page)
+    return page_response(page)
+
+@router.get("/therapists/export")
+async def export_therapists(
+    _api_key: str = Depends(validate_api_key), # unused argument
+    export_format: str = Query("ndjson", alias="format"),
+    min_experience: int = Query(None),
+    therapy_method: str = Query(None),
+    postal_code: str = Query(None),
+    cluster_short: str = Query(None),
+    state: str = Query(None),
+    postal_prefix: str = Query(None),
+    postal_from: str = Query(None),
+    postal_to: str = Query(None)
+):
+    """
+    Stream all therapists matching the filters with address, contact and methods.
+
+    :param api_key: API key for authentication (validated).
+    :param export_format: ``ndjson`` (default) or ``csv``.
+    :param min_experience: Minimum years of experience required.
+    :param therapy_method: Filter by specific therapy method.
+    :param postal_code: Filter by postal code.
+    :param cluster_short: Filter by therapy cluster short code.
+    :param state: Filter by the state of the therapist's address.
+    :param postal_prefix: Filter by postal code prefix.
+    :param postal_from: Filter by lowest postal code, inclusive.
+    :param postal_to: Filter by highest postal code, inclusive.
+    :return: Streamed export ordered by id.
+    :rtype: StreamingResponse
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown format: {export_format}. Allowed: {', '.join(EXPORT_FORMATS)}"
         )
+    media_type, extension = EXPORT_FORMATS[export_format]
 
-    # Apply pagination
-    therapists = query.offset(offset).limit(limit).all()
-    return therapists
+    chunks = stream_therapists(
+        export_format,
+        min_registration_date=experience_cutoff(min_experience),
+        therapy_method=therapy_method,
+        postal_code=postal_code,
+        cluster_short=cluster_short,
+        state=state,
+        postal_prefix=postal_prefix,
+        postal_from=postal_from,
+        postal_to=postal_to,
+    )
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="therapists.{extension}"'},
+    )
+
+@router.get("/therapists/facets")
+async def get_therapist_facets(
+    _api_key: str = Depends(validate_api_key), # unused argument
+    db: AsyncSession = Depends(get_async_db),
+    min_experience: int = Query(None),
+    therapy_method: str = Query(None),
+    postal_code: str = Query(None),
+    cluster_short: str = Query(None),
+    state: str = Query(None),
+    postal_prefix: str = Query(None),
+    postal_from: str = Query(None),
+    postal_to: str = Query(None)
+):
+    """
+    Count therapists per cluster, state, therapy method and experience band.
+
+    :param api_key: API key for authentication (validated).
+    :param min_experience: Minimum years of experience required.
+    :param therapy_method: Filter by specific therapy method.
+    :param postal_code: Filter by postal code.
+    :param cluster_short: Filter by therapy cluster short code.
+    :param state: Filter by the state of the therapist's address.
+    :param postal_prefix: Filter by postal code prefix.
+    :param postal_from: Filter by lowest postal code, inclusive.
+    :param postal_to: Filter by highest postal code, inclusive.
+    :param db: Async database session dependency.
+    :return: Total number of matching therapists and their counts per facet value.
+    :rtype: dict
+    """
+    index = await db.run_sync(therapist_index.get)
+    return FastJSONResponse(therapist_facets(
+        index,
+        min_registration_date=experience_cutoff(min_experience),
+        therapy_method=therapy_method,
+        postal_code=postal_code,
+        cluster_short=cluster_short,
+        state=state,
+        postal_prefix=postal_prefix,
+        postal_from=postal_from,
+        postal_to=postal_to,
+    ))
@@ -1,9 +1,10 @@
 """This module contains the therapy_clusters endpoint for retrieving therapy clusters."""
 from fastapi import APIRouter, Query, Depends
-from sqlalchemy.orm import Session
-from data.models import TherapyMethodCluster
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils.validate_api_key import validate_api_key
-from app.utils.db_session import get_db
+from app.utils.db_session import get_async_db
+from app.utils.pagination import decode_id_cursor
+from app.utils.reference_cache import reference_data, page_response
 
 # ------------------------------
 # Endpoint definition
@@ -12,11 +13,12 @@ from app.utils.db_session import get_db
 router = APIRouter()
 
 @router.get("/therapy_clusters")
-def get_therapy_clusters(
+async def get_therapy_clusters(
     _api_key: str = Depends(validate_api_key), # unused argument
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     limit: int = Query(10),
     offset: int = Query(0),
+    cursor: str = Query(None),
     cluster_short: str = Query(None)
 ):
     """
@@ -25,18 +27,16 @@ def get_therapy_clusters(
     :param api_key: API key for authentication (validated).
     :param limit: Maximum number of results to return (default is 10).
     :param offset: Number of results to skip for pagination (default is 0).
+    :param cursor: Cursor from the ``X-Next-Cursor`` header of the previous page.
     :param cluster_short: Filter by therapy cluster short code.
-    :param db: Database session dependency.
+    :param db: Async database session dependency.
     :return: List of therapy method clusters matching the criteria.
     :rtype: List[TherapyMethodCluster]
     """
-    # Base query
-    query = db.query(TherapyMethodCluster)
-
-    # Filter by cluster short code
-    if cluster_short:
-        query = query.filter(TherapyMethodCluster.cluster_short == cluster_short)
-
-    # Apply pagination
-    clusters = query.offset(offset).limit(limit).all()
-    return clusters
+    # Serve the pre-encoded page from the reference data cache
+    after_id = decode_id_cursor(cursor) if cursor else None
+    data = await db.run_sync(reference_data.get)
+    page = data.page(
+        "therapy_clusters", limit, offset, after_id, cluster_short=cluster_short
+    )
+    return page_response(page)
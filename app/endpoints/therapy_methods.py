@@ -1,9 +1,10 @@
 """This module contains the therapy_methods endpoint for retrieving therapy methods."""
 from fastapi import APIRouter, Query, Depends
-from sqlalchemy.orm import Session
-from data.models import TherapyMethod, TherapyMethodCluster
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils.validate_api_key import validate_api_key
-from app.utils.db_session import get_db
+from app.utils.db_session import get_async_db
+from app.utils.pagination import decode_id_cursor
+from app.utils.reference_cache import reference_data, page_response
 
 # ------------------------------
 # Endpoint definition
@@ -12,11 +13,12 @@ from app.utils.db_session import get_db
 router = APIRouter()
 
 @router.get("/therapy_methods")
-def get_therapy_methods(
+async def get_therapy_methods(
     _api_key: str = Depends(validate_api_key), # unused argument
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     limit: int = Query(25),
     offset: int = Query(0),
+    cursor: str = Query(None),
     method_name: str = Query(None),
     cluster_short: str = Query(None),
 ):
@@ -26,24 +28,17 @@ def get_therapy_methods(
     :param api_key: API key for authentication (validated).
     :param limit: Maximum number of results to return (default is 25).
     :param offset: Number of results to skip for pagination (default is 0).
+    :param cursor: Cursor from the ``X-Next-Cursor`` header of the previous page.
     :param method_name: Filter by specific therapy method name.
     :param cluster_short: Filter by therapy cluster short code.
-    :param db: Database session dependency.
+    :param db: Async database session dependency.
     :return: List of therapy methods matching the criteria.
     :rtype: List[TherapyMethod]
     """
-    # Base query
-    query = db.query(TherapyMethod)
-
-    # Filter by method name or therapy cluster
-    if method_name:
-        query = query.filter(TherapyMethod.method_name == method_name)
-    if cluster_short:
-        query = query.join(
-            TherapyMethod.therapy_cluster).filter(
-                TherapyMethodCluster.cluster_short == cluster_short
-        )
-
-    # Apply pagination
-    therapy_methods = query.offset(offset).limit(limit).all()
-    return therapy_methods
\ No newline at end of file
+    # Serve the pre-encoded page from the reference data cache
+    after_id = decode_id_cursor(cursor) if cursor else None
+    data = await db.run_sync(reference_data.get)
+    page = data.page(
+        "therapy_methods", limit, offset, after_id, method_name=method_name, cluster_short=cluster_short
+    )
+    return page_response(page)
@@ -1,9 +1,10 @@
 """This module contains the therapy_types endpoint for retrieving therapy types."""
 from fastapi import APIRouter, Query, Depends
-from sqlalchemy.orm import Session
-from data.models import TherapyType, TherapyMethodCluster
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils.validate_api_key import validate_api_key
-from app.utils.db_session import get_db
+from app.utils.db_session import get_async_db
+from app.utils.pagination import decode_id_cursor
+from app.utils.reference_cache import reference_data, page_response
 
 # ------------------------------
 # Endpoint definition
@@ -12,34 +13,30 @@ from app.utils.db_session import get_db
 router = APIRouter()
 
 @router.get("/therapy_types")
-def get_therapy_types(
+async def get_therapy_types(
     _api_key: str = Depends(validate_api_key), # unused argument
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     limit: int = Query(10),
     offset: int = Query(0),
+    cursor: str = Query(None),
     cluster_short: str = Query(None)
 ):
     """
     Retrieve a list of therapy types with optional filtering.
     
     :param api_key: API key for authentication (validated).
-    :param db: Database session dependency.
+    :param db: Async database session dependency.
     :param limit: Maximum number of results to return (default is 10).
     :param offset: Number of results to skip for pagination (default is 0).
+    :param cursor: Cursor from the ``X-Next-Cursor`` header of the previous page.
     :param cluster_short: Filter by therapy cluster short code.
     :return: List of therapy types matching the criteria.
     :rtype: List[TherapyType]
     """
-    # Base query
-    query = db.query(TherapyType)
-
-    # Filter by cluster short code
-    if cluster_short:
-        query = query.join(
-            TherapyType.therapy_cluster).filter(
-                TherapyMethodCluster.cluster_short == cluster_short
-        )
-
-    # Apply pagination
-    clusters = query.offset(offset).limit(limit).all()
-    return clusters
+    # Serve the pre-encoded page from the reference data cache
+    after_id = decode_id_cursor(cursor) if cursor else None
+    data = await db.run_sync(reference_data.get)
+    page = data.page(
+        "therapy_types", limit, offset, after_id, cluster_short=cluster_short
+    )
+    return page_response(page)
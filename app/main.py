@@ -3,38 +3,84 @@ Open ELIS API - Main Application Module
 
 This module contains the FastAPI application for the Open ELIS therapy recommendation system.
 It sets up the main FastAPI instance, configures CORS middleware, and registers all API route handlers
-for therapy types, methods, clusters, therapists, and questionnaire result calculations.
+for therapy types, methods, clusters, therapists, questionnaire result calculations and recommendations.
 
 Author: Vajo Sekulic
 Version: 0.1.0
 """
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.utils.middleware import add_cors_middleware
+from sqlalchemy.exc import OperationalError
+from data.models import AsyncSessionLocal, get_async_engine
+from app.utils.middleware import (
+    add_compression_middleware, add_cors_middleware, add_metrics_middleware, instrument_engine
+)
+from app.utils.therapist_index import therapist_index
+from app.utils.reference_cache import reference_data
+from app.utils.key_store import key_store
+from app.utils.database_release import database_release
 from app.endpoints.calculate_result import router as calculate_result_router
+from app.endpoints.recommendations import router as recommendations_router
 from app.endpoints.therapy_types import router as therapy_types_router
 from app.endpoints.therapy_methods import router as therapy_methods_router
 from app.endpoints.therapy_clusters import router as therapy_clusters_router
 from app.endpoints.therapists import router as therapists_router
 from app.endpoints.root import router as root_router
+from app.endpoints.metrics import router as metrics_router
+
+logger = logging.getLogger(__name__)
 
 # ------------------------------
 # App Setup
 # ------------------------------
 
+@asynccontextmanager
+async def lifespan(_app):
+    """
+    Open the database, build the in-memory indexes and load the API keys before serving requests.
+
+    The engine is created here rather than on import, so importing the app
+    touches no database. Pooled connections, including those of database
+    generations the app switched away from, are closed on shutdown.
+    """
+    # Time requests' SQL statements for the Server-Timing header and /metrics
+    instrument_engine(get_async_engine())
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(therapist_index.get)
+            await db.run_sync(reference_data.get)
+    except OperationalError:
+        # Databases without a schema fail on their first request instead of at startup
+        logger.warning("Database schema is missing, run python -m data.migrate")
+    await key_store.refresh()
+    yield
+    await database_release.close()
+    await get_async_engine().dispose()
+
 # Create FastAPI app instance
 app = FastAPI(
     title="Open ELIS API",
     description="API for managing therapist data, therapy types, and clusters.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
 add_cors_middleware(app)
 
+# Compress large responses with gzip or brotli, as the client accepts
+add_compression_middleware(app)
+
+# Time requests for the Server-Timing header and /metrics; the engine is instrumented in the lifespan
+add_metrics_middleware(app)
+
 # Register routers
 app.include_router(calculate_result_router)
+app.include_router(recommendations_router)
 app.include_router(therapy_types_router)
 app.include_router(therapy_methods_router)
 app.include_router(therapy_clusters_router)
 app.include_router(root_router)
+app.include_router(metrics_router)
 app.include_router(therapists_router)
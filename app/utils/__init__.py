@@ -6,10 +6,24 @@ and API key generation and validation.
 
 Modules:
 
-* **middleware**: Custom middleware for request/response processing
+* **middleware**: CORS, response compression and request metrics middleware
 * **db_session**: Database session management for endpoints
 * **validate_api_key**: API key validation utility
 * **api_key_generator**: API key generation utility
+* **key_store**: Hashed API keys with per-key rate and concurrency limits
+* **pagination**: Keyset (cursor) pagination helpers
+* **projections**: Therapist row projections with nested expansion
+* **database_release**: Switching to refreshed database files without dropping requests
+* **dataset_cache**: Caches rebuilt when the dataset version changes
+* **therapist_index**: In-memory therapist filter index
+* **catalogue_snapshot**: Therapist rows served from the shared catalogue snapshot
+* **therapist_filters**: SQL conditions for the therapist filters
+* **reference_cache**: Preloaded reference data with pre-encoded responses
+* **therapist_export**: Streaming NDJSON and CSV export of the therapist catalogue
+* **facets**: Therapist counts per facet value
+* **metrics**: Counters and histograms in the Prometheus text format
+* **responses**: Fast JSON encoding for the list endpoints
+* **result_cache**: Short-lived /therapists page cache with coalesced misses
 
 Author: Vajo Sekulic
 Version: 0.1.0
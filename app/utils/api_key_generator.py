@@ -1,5 +1,6 @@
 """This module provides functionality to generate secure API keys."""
 
+import argparse
 import secrets
 
 def generate_api_key():
@@ -16,9 +17,30 @@ def generate_api_key():
     return api_key
 
 def main():
-    """Main function to demonstrate API key generation."""
-    new_key = generate_api_key()
-    print(f"Generated API Key: {new_key}")
+    """Generate an API key, or issue and store one for an integration, or revoke its keys."""
+    parser = argparse.ArgumentParser(description="Generate, issue or revoke API keys.")
+    parser.add_argument("--name", help="Issue a key to this integration and store its hash")
+    parser.add_argument("--rate-limit", type=float, help="Sustained requests per second")
+    parser.add_argument("--burst", type=int, help="Requests allowed at once after idling")
+    parser.add_argument("--max-concurrency", type=int, help="Requests in flight at once")
+    parser.add_argument("--revoke", metavar="NAME", help="Revoke every key of this integration")
+    args = parser.parse_args()
+
+    if not (args.name or args.revoke):
+        new_key = generate_api_key()
+        print(f"Generated API Key: {new_key}")
+        return
+
+    # Imported here so that generating a key needs no database
+    from data.models import SessionLocal
+    from app.utils.key_store import issue_api_key, revoke_api_keys
+    with SessionLocal() as session:
+        if args.revoke:
+            print(f"Revoked {revoke_api_keys(session, args.revoke)} API keys of {args.revoke}")
+        else:
+            new_key = issue_api_key(session, args.name, args.rate_limit, args.burst, args.max_concurrency)
+            print(f"Issued API Key for {args.name}: {new_key}")
+        session.commit()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,99 @@
+"""This module serves therapist rows from the memory-mapped catalogue snapshot shared by all workers."""
+import logging
+import os
+import time
+from data.models import ASYNC_DATABASE_URL
+from data.snapshot import CatalogueSnapshot, SnapshotError, snapshot_path
+from app.utils.dataset_cache import DATASET_CHECK_INTERVAL
+from app.utils.metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+pages_total = registry.register(Counter(
+    "elis_therapist_pages_total", "Therapist pages loaded, by source (snapshot or database).", ("source",)
+))
+
+class SnapshotFile:
+    """
+    Snapshot file mapped by this process, reopened when the build step replaces it.
+
+    The file is checked at most every ``check_interval`` seconds. A snapshot
+    is only used for the dataset version it was built from, so rows always
+    match the therapist index that selected them; otherwise callers fall back
+    to the database.
+    """
+
+    def __init__(self, path, check_interval=DATASET_CHECK_INTERVAL):
+        """
+        :param path: Snapshot file, or None to always use the database.
+        :type path: str
+        :param check_interval: Minimum seconds between checks of the file.
+        :type check_interval: float
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self._state = (None, None)  # (file identity, snapshot)
+        self._checked_at = 0.0
+
+    def _reopen_if_replaced(self):
+        """Map the file again if it was created, replaced or removed since the last check."""
+        try:
+            stat = os.stat(self.path)
+            identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            identity = None
+        if identity == self._state[0]:
+            return
+
+        snapshot = None
+        if identity is not None:
+            try:
+                snapshot = CatalogueSnapshot(self.path)
+            except (OSError, SnapshotError):
+                logger.exception("Cannot read the catalogue snapshot %s, serving from the database", self.path)
+        # Readers of the previous snapshot keep its mapping alive until they finish
+        self._state = (identity, snapshot)
+
+    def get(self, dataset_version):
+        """
+        Return the snapshot if it was built from the given dataset version.
+
+        :param dataset_version: Dataset version the caller reads, e.g. of the therapist index.
+        :type dataset_version: int
+        :return: The snapshot, or None if there is no matching snapshot.
+        :rtype: CatalogueSnapshot
+        """
+        if self.path is None or dataset_version is None:
+            return None
+        now = time.monotonic()
+        if not self._checked_at or now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._reopen_if_replaced()
+        snapshot = self._state[1]
+        if snapshot is None or snapshot.dataset_version != dataset_version:
+            return None
+        return snapshot
+
+    def load_therapists(self, ids, expand, dataset_version):
+        """
+        Load therapist rows from the snapshot, if it matches the dataset version.
+
+        :param ids: Therapist ids in the order they should be returned.
+        :type ids: list
+        :param expand: Expansion names as returned by :func:`app.utils.projections.parse_expand`.
+        :type expand: tuple
+        :param dataset_version: Dataset version the ids were selected from.
+        :type dataset_version: int
+        :return: Therapist rows, or None to load them from the database.
+        :rtype: list
+        """
+        snapshot = self.get(dataset_version)
+        pages_total.inc(("database" if snapshot is None else "snapshot",))
+        return None if snapshot is None else snapshot.load_therapists(ids, expand)
+
+    def expire(self):
+        """Check the file on the next access."""
+        self._checked_at = 0.0
+
+# Snapshot of the API's database, built by python -m data.snapshot
+catalogue_snapshot = SnapshotFile(snapshot_path(ASYNC_DATABASE_URL))
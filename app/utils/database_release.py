@@ -0,0 +1,139 @@
+"""This module switches the API to a refreshed database generation without dropping requests."""
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from data.models import (
+    ASYNC_DATABASE_URL, AsyncSessionLocal, bind_engine, create_db_engine, current_database_url,
+    get_async_engine, notify_dataset_change
+)
+from data.snapshot import snapshot_path
+from app.utils.dataset_cache import DATASET_CHECK_INTERVAL
+from app.utils.catalogue_snapshot import catalogue_snapshot
+from app.utils.key_store import key_store
+from app.utils.metrics import Counter, registry
+from app.utils.middleware import instrument_engine
+
+logger = logging.getLogger(__name__)
+
+switches_total = registry.register(Counter(
+    "elis_database_switches_total", "Switches to a database generation published by python -m data.refresh."
+))
+
+def _checked_out(engine):
+    """Return the number of pooled connections an engine has handed out."""
+    checkedout = getattr(engine.sync_engine.pool, "checkedout", None)
+    return checkedout() if checkedout else 0
+
+class DatabaseRelease:
+    """
+    Follow the pointer file of the API database and switch to new generations.
+
+    The pointer is read at most every ``check_interval`` seconds. On a switch,
+    new sessions are bound to an engine for the new file while sessions opened
+    before finish on the previous engine, which is disposed once none of its
+    sessions or connections are in use. The catalogue snapshot, the dataset
+    caches and the API keys follow the new file.
+    """
+
+    def __init__(self, url=ASYNC_DATABASE_URL, check_interval=DATASET_CHECK_INTERVAL):
+        """
+        :param url: Configured async database URL.
+        :type url: str
+        :param check_interval: Minimum seconds between reads of the pointer file.
+        :type check_interval: float
+        """
+        self.url = url
+        self.check_interval = check_interval
+        self.retiring = []
+        self._sessions = {}  # engine -> open sessions
+        self._checked_at = 0.0
+
+    def check(self):
+        """
+        Switch to the live generation if it changed since the last check.
+
+        :return: True if the API switched to a new database file.
+        :rtype: bool
+        """
+        now = time.monotonic()
+        if self._checked_at and now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+
+        url = current_database_url(self.url)
+        if url.database in (None, "", ":memory:"):
+            return False
+        engine = get_async_engine()
+        if os.path.abspath(url.database) == os.path.abspath(engine.url.database or ""):
+            return False
+        self.switch(url)
+        return True
+
+    def switch(self, url):
+        """
+        Bind new sessions to a database file and retire the current engine.
+
+        :param url: URL of the new database file.
+        :type url: sqlalchemy.engine.URL
+        """
+        engine = create_db_engine(url, is_async=True)
+        instrument_engine(engine)
+        previous = bind_engine(engine, is_async=True)
+        if previous is not None:
+            self.retiring.append(previous)
+
+        catalogue_snapshot.path = snapshot_path(self.url)
+        catalogue_snapshot.expire()
+        # Rebuild the dataset caches and reload the API keys from the new file
+        notify_dataset_change()
+        key_store.expire()
+        switches_total.inc()
+        logger.info("Switched to database %s", url.database)
+
+    async def retire_drained(self):
+        """
+        Dispose the retired engines whose sessions have all finished.
+
+        :return: Number of disposed engines.
+        :rtype: int
+        """
+        drained = [
+            engine for engine in self.retiring
+            if not self._sessions.get(engine) and not _checked_out(engine)
+        ]
+        for engine in drained:
+            self.retiring.remove(engine)
+            self._sessions.pop(engine, None)
+            await engine.dispose()
+        return len(drained)
+
+    @asynccontextmanager
+    async def session(self):
+        """
+        Open a session on the live generation and retire drained engines when it closes.
+
+        :return: Async database session.
+        :rtype: AsyncIterator[AsyncSession]
+        """
+        self.check()
+        db = AsyncSessionLocal()
+        engine = db.bind
+        self._sessions[engine] = self._sessions.get(engine, 0) + 1
+        try:
+            async with db:
+                yield db
+        finally:
+            self._sessions[engine] -= 1
+            if self.retiring:
+                await self.retire_drained()
+
+    async def close(self):
+        """Dispose the retired engines, on shutdown."""
+        for engine in self.retiring:
+            await engine.dispose()
+        self.retiring.clear()
+        self._sessions.clear()
+
+# Release of the API's database, published by python -m data.refresh
+database_release = DatabaseRelease()
@@ -0,0 +1,76 @@
+"""This module contains a cache for values derived from the database that are rebuilt when the dataset changes."""
+import os
+import threading
+import time
+from data.models import get_dataset_version, on_dataset_change
+
+# Minimum number of seconds between dataset version checks
+DATASET_CHECK_INTERVAL = float(os.getenv("DATASET_CHECK_INTERVAL", "2"))
+
+class VersionedCache:
+    """
+    Hold a value built from the database and rebuild it when the dataset version changes.
+
+    The dataset version is checked at most every ``check_interval`` seconds, and
+    on the next access after this process calls ``notify_dataset_change()``.
+    A rebuilt value replaces the previous one in a single assignment, so readers
+    always see either the old or the new value, never a partial one. Readers
+    arriving during a rebuild get the previous value instead of waiting.
+    """
+
+    def __init__(self, builder, check_interval=DATASET_CHECK_INTERVAL):
+        """
+        :param builder: Callable taking a database session and returning the cached value.
+        :type builder: callable
+        :param check_interval: Minimum seconds between dataset version checks.
+        :type check_interval: float
+        """
+        self.builder = builder
+        self.check_interval = check_interval
+        self._state = (None, None)  # (dataset version, value)
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        on_dataset_change(self.expire)
+
+    @property
+    def version(self):
+        """Dataset version of the cached value, or None if nothing is cached."""
+        return self._state[0]
+
+    def get(self, db):
+        """
+        Return the cached value, rebuilding it first if the dataset has changed.
+
+        :param db: Database session used for the version check and rebuild.
+        :return: The cached value.
+        """
+        version, value = self._state
+        now = time.monotonic()
+        if version is not None and self._checked_at and now - self._checked_at < self.check_interval:
+            return value
+
+        current = get_dataset_version(db)
+        self._checked_at = now
+        if current == version:
+            return value
+
+        # Keep serving the previous value while another caller rebuilds; never block,
+        # since async callers share one thread and would deadlock on the lock
+        if not self._lock.acquire(blocking=False):
+            return value if version is not None else self.builder(db)
+        try:
+            version, value = self._state
+            if current != version:
+                value = self.builder(db)
+                self._state = (current, value)
+        finally:
+            self._lock.release()
+        return value
+
+    def expire(self):
+        """Check the dataset version on the next access, keeping the current value until then."""
+        self._checked_at = 0.0
+
+    def invalidate(self):
+        """Drop the cached value so the next access rebuilds it."""
+        self._state = (None, None)
@@ -1,11 +1,8 @@
 """This module contains the database session utility for FastAPI endpoints."""
-from data.models import SessionLocal
+from app.utils.database_release import database_release
 
-# Dependency to get a database session
-def get_db():
-    """Yield a database session and ensure it's closed after use."""
-    db = SessionLocal()
-    try:
+# Dependency to get an async database session
+async def get_async_db():
+    """Yield an async database session on the live database and ensure it's closed after use."""
+    async with database_release.session() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -0,0 +1,61 @@
+"""This module counts therapists per facet value from the in-memory therapist index."""
+from bisect import bisect_right
+from datetime import date
+from app.utils.therapist_filters import experience_cutoff
+
+# Experience bands: label, minimum years (inclusive), maximum years (exclusive, None for open)
+EXPERIENCE_BANDS = (("0-4", 0, 5), ("5-9", 5, 10), ("10-19", 10, 20), ("20+", 20, None))
+
+def experience_counts(sorted_dates):
+    """
+    Count registration dates per experience band.
+
+    Each band is a date range, so it is counted with two binary searches.
+
+    :param sorted_dates: Registration dates in ascending order.
+    :type sorted_dates: list
+    :return: Number of therapists per band label.
+    :rtype: dict
+    """
+    counts = {}
+    for label, min_years, max_years in EXPERIENCE_BANDS:
+        newest = experience_cutoff(min_years) or date.today()
+        count = bisect_right(sorted_dates, newest)
+        if max_years is not None:
+            count -= bisect_right(sorted_dates, experience_cutoff(max_years))
+        counts[label] = count
+    return counts
+
+def therapist_facets(index, **filters):
+    """
+    Count therapists per cluster, state, therapy method and experience band.
+
+    Without filters the counts are the ones precomputed with the index. With
+    filters the matching ids are collected once and intersected with the
+    posting of every facet value; values without matches are left out.
+
+    :param index: Therapist index to count from.
+    :type index: TherapistIndex
+    :param filters: Keyword arguments of :meth:`TherapistIndex.matches`.
+    :return: ``total`` and the counts per value of ``cluster_short``, ``state``,
+        ``method_name`` and ``experience``.
+    :rtype: dict
+    """
+    matched = index.matches(**filters)
+    if matched is None:
+        facets = dict(index.facet_counts)
+        facets["experience"] = experience_counts(index.sorted_dates)
+        return {"total": len(index), **facets}
+
+    facets = {}
+    for facet, postings in index.facets().items():
+        counts = {}
+        for value, posting in sorted(postings.items()):
+            count = len(matched.intersection(posting.members))
+            if count:
+                counts[value] = count
+        facets[facet] = counts
+    facets["experience"] = experience_counts(
+        sorted(index.registration_dates[therapist_id] for therapist_id in matched)
+    )
+    return {"total": len(matched), **facets}
@@ -0,0 +1,234 @@
+"""This module stores hashed API keys and enforces their rate and concurrency limits."""
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from data.models import ApiKey, AsyncSessionLocal
+from app.utils.api_key_generator import generate_api_key
+
+# Seconds between reloads of the issued keys, so new and revoked keys take effect
+KEY_STORE_REFRESH = float(os.getenv("KEY_STORE_REFRESH", "60"))
+# Minimum seconds between reloads triggered by unknown keys
+KEY_STORE_MISS_INTERVAL = float(os.getenv("KEY_STORE_MISS_INTERVAL", "5"))
+
+logger = logging.getLogger(__name__)
+
+def hash_api_key(api_key):
+    """
+    Hash an API key for storage and lookup.
+
+    Keys are 192-bit random tokens, so a single SHA-256 is enough to make a
+    leaked hash useless and keeps the lookup cheap.
+
+    :param api_key: API key as sent by the client.
+    :type api_key: str
+    :return: Hex digest.
+    :rtype: str
+    """
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+class KeyLimits:
+    """Rate and concurrency limits of one API key, with its token bucket."""
+
+    __slots__ = ("name", "settings", "rate_limit", "burst", "max_concurrency", "tokens", "updated_at", "in_flight")
+
+    def __init__(self, name, rate_limit=None, burst=None, max_concurrency=None):
+        """
+        :param name: Name of the integration the key was issued to.
+        :type name: str
+        :param rate_limit: Sustained requests per second, or None for no limit.
+        :type rate_limit: float
+        :param burst: Requests allowed at once after idling, defaults to the rate limit (at least 1).
+        :type burst: int
+        :param max_concurrency: Requests in flight at once, or None for no limit.
+        :type max_concurrency: int
+        """
+        self.name = name
+        self.in_flight = 0
+        self.configure(rate_limit, burst, max_concurrency)
+
+    def configure(self, rate_limit=None, burst=None, max_concurrency=None):
+        """Set the limits and fill the token bucket."""
+        self.settings = (rate_limit, burst, max_concurrency)
+        self.rate_limit = rate_limit or None
+        self.burst = burst or max(1.0, rate_limit or 1.0)
+        self.max_concurrency = max_concurrency
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+
+    def acquire(self, now=None):
+        """
+        Admit a request: take a token from the bucket and a concurrency slot.
+
+        The bucket is refilled lazily from the time since the last request, so
+        this is constant time whatever the number of keys.
+
+        :param now: Current ``time.monotonic()``, for testing.
+        :type now: float
+        :return: None if the request is admitted, otherwise seconds until it may be retried.
+        :rtype: float
+        """
+        if self.max_concurrency is not None and self.in_flight >= self.max_concurrency:
+            return 1.0
+        if self.rate_limit is not None:
+            now = time.monotonic() if now is None else now
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate_limit)
+            self.updated_at = now
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate_limit
+            self.tokens -= 1
+        self.in_flight += 1
+        return None
+
+    def release(self):
+        """Free the concurrency slot of a finished request."""
+        self.in_flight -= 1
+
+class ApiKeyStore:
+    """
+    In-memory lookup of the issued API keys by hash.
+
+    Issued keys are loaded from the ``api_keys`` table and reloaded every
+    ``refresh_interval`` seconds, or earlier when an unknown key arrives, at
+    most every ``miss_interval`` seconds. Reloads keep the token buckets of
+    unchanged keys. Static keys, such as the ``API_KEY`` of the environment,
+    are never reloaded.
+    """
+
+    def __init__(self, refresh_interval=KEY_STORE_REFRESH, miss_interval=KEY_STORE_MISS_INTERVAL):
+        """
+        :param refresh_interval: Seconds between reloads.
+        :type refresh_interval: float
+        :param miss_interval: Minimum seconds between reloads triggered by unknown keys.
+        :type miss_interval: float
+        """
+        self.refresh_interval = refresh_interval
+        self.miss_interval = miss_interval
+        self.keys = {}
+        self.static_keys = {}
+        self.loaded_at = None
+        self._refreshing = False
+
+    def add_static_key(self, api_key, limits):
+        """
+        Accept a key that is not stored in the database.
+
+        :param api_key: API key.
+        :type api_key: str
+        :param limits: Limits of the key.
+        :type limits: KeyLimits
+        """
+        self.static_keys[hash_api_key(api_key)] = limits
+
+    def load(self, db):
+        """
+        Load the issued keys that are not revoked.
+
+        :param db: Database session.
+        :return: Number of loaded keys.
+        :rtype: int
+        """
+        try:
+            rows = db.execute(select(ApiKey).where(ApiKey.revoked_at.is_(None))).scalars().all()
+        except OperationalError:
+            # Databases not migrated yet have no key table; only static keys are accepted
+            logger.warning("Table api_keys is missing, run python -m data.migrate")
+            rows = []
+
+        keys = {}
+        for row in rows:
+            limits = self.keys.get(row.key_hash)
+            settings = (row.rate_limit, row.burst, row.max_concurrency)
+            if limits is None:
+                limits = KeyLimits(row.name, *settings)
+            elif limits.settings != settings:
+                limits.configure(*settings)
+            keys[row.key_hash] = limits
+        self.keys = keys
+        self.loaded_at = time.monotonic()
+        return len(keys)
+
+    async def refresh(self):
+        """Reload the issued keys with a session of their own, keeping the loaded keys if that fails."""
+        self._refreshing = True
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(self.load)
+        except SQLAlchemyError:
+            logger.exception("Reloading the API keys failed, retrying in %g seconds", self.refresh_interval)
+            self.loaded_at = time.monotonic()
+        finally:
+            self._refreshing = False
+
+    def expire(self):
+        """Reload the issued keys on the next lookup, e.g. after switching to another database."""
+        self.loaded_at = None
+
+    async def lookup(self, api_key):
+        """
+        Return the limits of a key, or None if the key is not valid.
+
+        :param api_key: API key as sent by the client.
+        :type api_key: str
+        :return: Limits of the key.
+        :rtype: KeyLimits
+        """
+        key_hash = hash_api_key(api_key)
+        limits = self.static_keys.get(key_hash) or self.keys.get(key_hash)
+
+        age = None if self.loaded_at is None else time.monotonic() - self.loaded_at
+        stale = age is None or age >= self.refresh_interval or (limits is None and age >= self.miss_interval)
+        if stale and not self._refreshing:
+            await self.refresh()
+            limits = self.static_keys.get(key_hash) or self.keys.get(key_hash)
+        return limits
+
+def issue_api_key(session, name, rate_limit=None, burst=None, max_concurrency=None):
+    """
+    Generate an API key and store its hash.
+
+    The key itself is not stored; it is returned once to hand to the integration.
+
+    :param session: Database session; the caller commits.
+    :param name: Name of the integration.
+    :type name: str
+    :param rate_limit: Sustained requests per second, or None for no limit.
+    :type rate_limit: float
+    :param burst: Requests allowed at once after idling.
+    :type burst: int
+    :param max_concurrency: Requests in flight at once, or None for no limit.
+    :type max_concurrency: int
+    :return: The new API key.
+    :rtype: str
+    """
+    api_key = generate_api_key()
+    session.add(ApiKey(
+        name=name,
+        key_hash=hash_api_key(api_key),
+        rate_limit=rate_limit,
+        burst=burst,
+        max_concurrency=max_concurrency,
+        created_at=datetime.now(),
+    ))
+    return api_key
+
+def revoke_api_keys(session, name):
+    """
+    Revoke every active key of an integration.
+
+    :param session: Database session; the caller commits.
+    :param name: Name of the integration.
+    :type name: str
+    :return: Number of revoked keys.
+    :rtype: int
+    """
+    result = session.execute(
+        update(ApiKey).where(ApiKey.name == name, ApiKey.revoked_at.is_(None)).values(revoked_at=datetime.now())
+    )
+    return result.rowcount
+
+# Key store of the API process
+key_store = ApiKeyStore()
@@ -0,0 +1,142 @@
+"""This module contains counters and histograms rendered in the Prometheus text format."""
+from bisect import bisect_left
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    """Escape a label value for the text format."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labelnames, labels, extra=""):
+    """Format label names and values as ``{name="value",...}``."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    """Format a sample value, integers without a fraction."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    """Monotonic counter per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        :param name: Metric name.
+        :type name: str
+        :param documentation: Help text.
+        :type documentation: str
+        :param labelnames: Label names; values are passed in this order.
+        :type labelnames: tuple
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, labels=(), amount=1):
+        """
+        Increase the counter of a label combination.
+
+        :param labels: Label values in the order of ``labelnames``.
+        :type labels: tuple
+        :param amount: Non-negative amount to add.
+        :type amount: float
+        """
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        """Yield the sample lines of the counter."""
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+class Histogram:
+    """Histogram with fixed buckets per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        :param name: Metric name.
+        :type name: str
+        :param documentation: Help text.
+        :type documentation: str
+        :param labelnames: Label names; values are passed in this order.
+        :type labelnames: tuple
+        :param buckets: Upper bounds of the buckets in ascending order, without ``+Inf``.
+        :type buckets: tuple
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, labels, value):
+        """
+        Record an observation.
+
+        Only the bucket the value falls into is incremented; buckets are made
+        cumulative when rendered.
+
+        :param labels: Label values in the order of ``labelnames``.
+        :type labels: tuple
+        :param value: Observed value.
+        :type value: float
+        """
+        counts = self.values.get(labels)
+        if counts is None:
+            # One count per bucket, one for +Inf, then the sum
+            counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def samples(self):
+        """Yield the bucket, sum and count sample lines of the histogram."""
+        for labels, counts in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else _format_value(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(counts[-1])}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """
+        Add a metric to the registry.
+
+        :param metric: Counter or histogram.
+        :return: The metric, for assignment.
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text exposition format (version 0.0.4).
+
+        :return: Exposition text.
+        :rtype: str
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+# Registry served by the metrics endpoint
+registry = MetricsRegistry()
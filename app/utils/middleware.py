@@ -1,7 +1,21 @@
 """This module contains middleware utilities for the FastAPI app."""
 
+import logging
 import os
+import time
+import zlib
+from contextvars import ContextVar
+from urllib.parse import parse_qsl
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import event
+from starlette.datastructures import Headers, MutableHeaders
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.metrics import Counter, Histogram, registry
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 def add_cors_middleware(app):
     """
@@ -19,4 +33,303 @@ def add_cors_middleware(app):
         allow_credentials=False,  # Set to True only if you need cookies/auth headers
         allow_methods=["GET", "POST", "OPTIONS"],  # Only methods you actually use
         allow_headers=["Accept", "Content-Type", "X-API-Key"],  # Your specific headers
+        expose_headers=[NEXT_CURSOR_HEADER],  # Readable by the frontend for pagination
     )
+
+# ------------------------------
+# Response compression
+# ------------------------------
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Compression levels; moderate levels trade little size for much less CPU
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Encodings in order of preference, brotli only when the module is installed
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+def negotiate_encoding(accept_encoding, supported=SUPPORTED_ENCODINGS):
+    """
+    Choose a content encoding from an ``Accept-Encoding`` header.
+
+    The encoding with the highest quality value wins, ties are broken by the
+    order of ``supported``. Encodings with ``q=0`` are refused, also through ``*``.
+
+    :param accept_encoding: Header value, e.g. ``"gzip, deflate, br;q=0.9"``.
+    :type accept_encoding: str
+    :param supported: Encodings the server can produce, in order of preference.
+    :type supported: tuple
+    :return: The chosen encoding, or None to send the response uncompressed.
+    :rtype: str
+    """
+    qualities = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in supported:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+class _Compressor:
+    """Incremental gzip or brotli compressor."""
+
+    def __init__(self, encoding):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._compress, self._flush = self._compressor.process, self._compressor.flush
+            self._finish = self._compressor.finish
+        else:
+            # wbits 31 selects the gzip container
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._compress = self._compressor.compress
+            self._flush = lambda: self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._compressor.flush
+
+    def compress(self, data, final=False):
+        """
+        Compress a chunk of the body.
+
+        Chunks of a streamed body are flushed, so clients can decode every
+        chunk as it arrives.
+
+        :param data: Uncompressed chunk.
+        :type data: bytes
+        :param final: Whether this is the last chunk.
+        :type final: bool
+        :return: Compressed bytes.
+        :rtype: bytes
+        """
+        return self._compress(data) + (self._finish() if final else self._flush())
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses with the encoding the client prefers.
+
+    Responses are compressed when the first body chunk reaches
+    ``minimum_size`` bytes or more chunks follow, as in streamed exports.
+    Responses that already have a ``Content-Encoding`` are passed through.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE):
+        """
+        :param app: ASGI app to wrap.
+        :param minimum_size: Bytes a response must have to be compressed.
+        :type minimum_size: int
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                # Hold the headers until the first body chunk shows whether to compress
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = MutableHeaders(scope=start_message)
+                if "content-encoding" not in headers:
+                    headers.add_vary_header("Accept-Encoding")
+                    if more_body or len(body) >= self.minimum_size:
+                        compressor = _Compressor(encoding)
+                        headers["Content-Encoding"] = encoding
+                if compressor is not None:
+                    body = compressor.compress(body, final=not more_body)
+                    if more_body:
+                        del headers["Content-Length"]
+                    else:
+                        headers["Content-Length"] = str(len(body))
+                    message = {**message, "body": body}
+                await send(start_message)
+                start_message = None
+            elif compressor is not None:
+                message = {**message, "body": compressor.compress(body, final=not more_body)}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+def add_compression_middleware(app):
+    """
+    Adds the response compression middleware to the FastAPI app.
+
+    :param app: FastAPI app instance.
+    :type app: FastAPI
+    """
+    app.add_middleware(CompressionMiddleware)
+
+# ------------------------------
+# Request metrics
+# ------------------------------
+
+# Statements slower than this many milliseconds are logged
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+
+# Query parameters that page through results rather than filter them
+PAGINATION_PARAMS = frozenset({"limit", "offset", "cursor"})
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LABELS = ("method", "route", "params")
+requests_total = registry.register(Counter(
+    "elis_http_requests_total", "Requests served, by route and status.", ("method", "route", "status")
+))
+request_duration = registry.register(Histogram(
+    "elis_http_request_duration_seconds",
+    "Request wall time until the response is complete, by route and query parameters used.",
+    REQUEST_LABELS,
+))
+db_duration = registry.register(Histogram(
+    "elis_http_request_db_duration_seconds", "Time spent executing SQL statements per request.", REQUEST_LABELS
+))
+db_statements = registry.register(Counter(
+    "elis_db_statements_total", "SQL statements executed while serving requests.", REQUEST_LABELS
+))
+slow_queries = registry.register(Counter(
+    "elis_db_slow_queries_total", f"SQL statements slower than SLOW_QUERY_MS ({SLOW_QUERY_MS:g} ms).", ("route",)
+))
+
+class RequestStats:
+    """Database time and statement count of the request being served."""
+
+    __slots__ = ("scope", "db_time", "statements")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.db_time = 0.0
+        self.statements = 0
+
+def _route_path(scope):
+    """Return the route template of a request, or ``unmatched`` before or without routing."""
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+# Stats of the current request; SQLAlchemy runs the statements of async sessions in the request's context
+current_request = ContextVar("current_request", default=None)
+
+def _before_cursor_execute(conn, _cursor, _statement, _parameters, _context, _executemany):
+    """Remember when a statement started."""
+    conn.info["query_started"] = time.perf_counter()
+
+def _after_cursor_execute(conn, _cursor, statement, _parameters, _context, _executemany):
+    """Add a statement to the current request and log it if it is slow."""
+    elapsed = time.perf_counter() - conn.info["query_started"]
+    stats = current_request.get()
+    if stats is not None:
+        stats.db_time += elapsed
+        stats.statements += 1
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        route = _route_path(stats.scope) if stats is not None else "none"
+        slow_queries.inc((route,))
+        logger.warning("Slow query (%.1f ms) on route %s: %s", elapsed * 1000, route, statement)
+
+def instrument_engine(engine):
+    """
+    Time every SQL statement of an engine for the request metrics and the slow-query log.
+
+    :param engine: Engine or async engine.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+# Filter parameter names declared per route, keyed on the route's id
+_route_params = {}
+
+def _request_labels(scope):
+    """Return the method, route template and sorted filter parameter names of a routed request."""
+    route = scope.get("route")
+    if route is None:
+        return scope["method"], _route_path(scope), ""
+    declared = _route_params.get(id(route))
+    if declared is None:
+        dependant = getattr(route, "dependant", None)
+        names = {param.alias for param in dependant.query_params} if dependant else set()
+        declared = _route_params[id(route)] = frozenset(names - PAGINATION_PARAMS)
+    used = {name for name, value in parse_qsl(scope["query_string"].decode("latin-1")) if value}
+    return scope["method"], route.path, ",".join(sorted(used & declared))
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware recording wall time, database time and statement count per request.
+
+    The times up to the response headers are reported in a ``Server-Timing``
+    header. The times until the response is complete are recorded in the
+    metrics registry, labelled with the route template and the names of the
+    filter parameters used (not their values).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - started
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", (
+                    f"app;dur={elapsed * 1000:.1f}, "
+                    f'db;dur={stats.db_time * 1000:.1f};desc="{stats.statements} statements"'
+                ))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            method, route, params = _request_labels(scope)
+            labels = (method, route, params)
+            requests_total.inc((method, route, str(status)))
+            request_duration.observe(labels, time.perf_counter() - started)
+            db_duration.observe(labels, stats.db_time)
+            db_statements.inc(labels, stats.statements)
+
+def add_metrics_middleware(app):
+    """
+    Adds the request metrics middleware to the FastAPI app.
+
+    :param app: FastAPI app instance.
+    :type app: FastAPI
+    """
+    app.add_middleware(RequestMetricsMiddleware)
@@ -0,0 +1,69 @@
+"""This module provides keyset (cursor) pagination helpers for list endpoints."""
+import base64
+import binascii
+import json
+from fastapi import HTTPException
+
+# Response header carrying the cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(*values):
+    """
+    Encode the sort key of the last returned row as an opaque cursor.
+
+    :param values: Sort key values of the last row on the page.
+    :return: URL-safe cursor string.
+    :rtype: str
+    """
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor created by :func:`encode_cursor`.
+
+    :param cursor: Cursor string from the request.
+    :type cursor: str
+    :raises HTTPException: If the cursor is malformed.
+    :return: Sort key values of the last row on the previous page.
+    :rtype: list
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+    if not isinstance(values, list) or not values:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def decode_id_cursor(cursor):
+    """
+    Decode a cursor whose sort key is an integer id.
+
+    :param cursor: Cursor string from the request.
+    :type cursor: str
+    :raises HTTPException: If the cursor is malformed or not an id cursor.
+    :return: Id of the last row on the previous page.
+    :rtype: int
+    """
+    last_id = decode_cursor(cursor)[0]
+    if not isinstance(last_id, int) or isinstance(last_id, bool):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
+
+def decode_postal_cursor(cursor):
+    """
+    Decode a cursor whose sort key is a postal code and an integer id.
+
+    :param cursor: Cursor string from the request.
+    :type cursor: str
+    :raises HTTPException: If the cursor is malformed or not a postal code cursor.
+    :return: Postal code and id of the last row on the previous page.
+    :rtype: tuple
+    """
+    values = decode_cursor(cursor)
+    if (len(values) != 2 or not isinstance(values[0], str)
+            or not isinstance(values[1], int) or isinstance(values[1], bool)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values[0], values[1]
@@ -0,0 +1,124 @@
+"""This module builds therapist list responses from column projections with explicit nested expansion."""
+from fastapi import HTTPException
+from sqlalchemy import select
+from data.models import (
+    Therapist, TherapistAddress, TherapistContact, TherapyMethod, TherapyMethodCluster,
+    therapist_therapy_method
+)
+
+# Therapist columns returned for every list row
+THERAPIST_COLUMNS = (
+    Therapist.id, Therapist.last_name, Therapist.first_name, Therapist.title,
+    Therapist.registration_date, Therapist.registration_number
+)
+
+# Maximum number of ids bound into a single IN list (SQLite variable limit)
+IN_BATCH_SIZE = 999
+
+def _batches(ids):
+    """Split ids into chunks that fit a single IN list."""
+    for start in range(0, len(ids), IN_BATCH_SIZE):
+        yield ids[start:start + IN_BATCH_SIZE]
+
+def _load_addresses(db, ids):
+    """Load one address per therapist id."""
+    addresses = {}
+    for batch in _batches(ids):
+        rows = db.execute(
+            select(TherapistAddress.therapist_id, TherapistAddress.state, TherapistAddress.postal_code)
+            .where(TherapistAddress.therapist_id.in_(batch))
+        )
+        for therapist_id, state, postal_code in rows:
+            addresses[therapist_id] = {"state": state, "postal_code": postal_code}
+    return addresses
+
+def _load_contacts(db, ids):
+    """Load one contact per therapist id."""
+    contacts = {}
+    for batch in _batches(ids):
+        rows = db.execute(
+            select(TherapistContact.therapist_id, TherapistContact.email, TherapistContact.website)
+            .where(TherapistContact.therapist_id.in_(batch))
+        )
+        for therapist_id, email, website in rows:
+            contacts[therapist_id] = {"email": email, "website": website}
+    return contacts
+
+def _load_methods(db, ids):
+    """Load the therapy methods per therapist id."""
+    methods = {}
+    for batch in _batches(ids):
+        rows = db.execute(
+            select(
+                therapist_therapy_method.c.therapist_id, TherapyMethod.id,
+                TherapyMethod.method_name, TherapyMethodCluster.cluster_short
+            )
+            .join(TherapyMethod, TherapyMethod.id == therapist_therapy_method.c.therapy_method_id)
+            .outerjoin(TherapyMethodCluster, TherapyMethodCluster.id == TherapyMethod.cluster_id)
+            .where(therapist_therapy_method.c.therapist_id.in_(batch))
+            .order_by(therapist_therapy_method.c.therapist_id, TherapyMethod.id)
+        )
+        for therapist_id, method_id, method_name, cluster_short in rows:
+            methods.setdefault(therapist_id, []).append(
+                {"id": method_id, "method_name": method_name, "cluster_short": cluster_short}
+            )
+    return methods
+
+# Nested fields that can be requested with ``expand``, with their loader and empty value
+EXPANSIONS = {
+    "address": (_load_addresses, None),
+    "contact": (_load_contacts, None),
+    "methods": (_load_methods, []),
+}
+
+def parse_expand(expand):
+    """
+    Parse a comma-separated ``expand`` parameter.
+
+    :param expand: Requested expansions, e.g. ``"address,methods"``.
+    :type expand: str
+    :raises HTTPException: If an unknown expansion is requested.
+    :return: Requested expansion names in a stable order.
+    :rtype: tuple
+    """
+    if not expand:
+        return ()
+    requested = {name.strip() for name in expand.split(",") if name.strip()}
+    unknown = requested - EXPANSIONS.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown expand value(s): {', '.join(sorted(unknown))}. Allowed: {', '.join(EXPANSIONS)}"
+        )
+    return tuple(name for name in EXPANSIONS if name in requested)
+
+def load_therapists(db, ids, expand=()):
+    """
+    Load therapist rows by id as plain dicts with the requested nested data.
+
+    Uses one projection query for the therapists and one batched query per
+    expansion, independent of the number of ids.
+
+    :param db: Database session.
+    :param ids: Therapist ids in the order they should be returned.
+    :type ids: list
+    :param expand: Expansion names as returned by :func:`parse_expand`.
+    :type expand: tuple
+    :return: Therapist rows in the order of ``ids``.
+    :rtype: list
+    """
+    if not ids:
+        return []
+
+    therapists = {}
+    for batch in _batches(ids):
+        for row in db.execute(select(*THERAPIST_COLUMNS).where(Therapist.id.in_(batch))).mappings():
+            therapists[row["id"]] = dict(row)
+
+    for name in expand:
+        loader, empty = EXPANSIONS[name]
+        nested = loader(db, ids)
+        for therapist_id, therapist in therapists.items():
+            therapist[name] = nested.get(therapist_id, empty)
+
+    return [therapists[therapist_id] for therapist_id in ids if therapist_id in therapists]
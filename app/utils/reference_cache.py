@@ -0,0 +1,120 @@
+"""This module contains the preloaded reference data cache for the therapy type, cluster and method endpoints."""
+from bisect import bisect_right
+from fastapi import Response
+from sqlalchemy import select
+from data.models import TherapyMethod, TherapyMethodCluster, TherapyType
+from app.utils.dataset_cache import VersionedCache
+from app.utils.pagination import NEXT_CURSOR_HEADER, encode_cursor
+from app.utils.responses import encode_json
+
+# Reference tables served from memory, with the default page size of their endpoint
+REFERENCE_TABLES = {
+    "therapy_clusters": (TherapyMethodCluster, 10),
+    "therapy_methods": (TherapyMethod, 25),
+    "therapy_types": (TherapyType, 10),
+}
+
+# Upper bound on the number of pre-encoded pages kept per dataset version
+MAX_CACHED_PAGES = 1024
+
+class ReferenceData:
+    """
+    In-memory copy of the reference tables with pre-encoded JSON pages.
+
+    Pages are keyed on table, filters and pagination. The unfiltered and
+    per-cluster first pages are encoded when the data is loaded, and other
+    combinations are encoded on first use.
+    """
+
+    def __init__(self, tables):
+        """
+        :param tables: Rows per reference table as dicts, ordered by id.
+        :type tables: dict
+        """
+        self.tables = tables
+        self.ids = {name: [row["id"] for row in rows] for name, rows in tables.items()}
+        self.cluster_ids = {row["cluster_short"]: row["id"] for row in tables["therapy_clusters"]}
+        self._pages = {}
+
+    @classmethod
+    def build(cls, db):
+        """
+        Load the reference tables and pre-encode their common pages.
+
+        :param db: Database session.
+        :return: Loaded reference data.
+        :rtype: ReferenceData
+        """
+        tables = {}
+        for name, (model, _) in REFERENCE_TABLES.items():
+            rows = db.execute(select(*model.__table__.columns).order_by(model.id)).mappings()
+            tables[name] = [dict(row) for row in rows]
+
+        data = cls(tables)
+        for name, (_, default_limit) in REFERENCE_TABLES.items():
+            data.page(name, default_limit)
+            for cluster_short in data.cluster_ids:
+                data.page(name, default_limit, cluster_short=cluster_short)
+        return data
+
+    def _filter(self, name, filters):
+        """Return the rows of a table matching all non-empty filters."""
+        rows = self.tables[name]
+        for column, value in filters.items():
+            if not value:
+                continue
+            if column == "cluster_short" and name != "therapy_clusters":
+                column, value = "cluster_id", self.cluster_ids.get(value)
+            rows = [row for row in rows if row[column] == value]
+        return rows
+
+    def page(self, name, limit, offset=0, after_id=None, **filters):
+        """
+        Return a pre-encoded page of a reference table.
+
+        :param name: Reference table name, see ``REFERENCE_TABLES``.
+        :type name: str
+        :param limit: Maximum number of rows to return.
+        :type limit: int
+        :param offset: Number of rows to skip when no cursor is given.
+        :type offset: int
+        :param after_id: Only return rows with a greater id (cursor pagination).
+        :type after_id: int
+        :param filters: Column filters, ``None`` values are ignored.
+        :return: JSON body and cursor for the next page (or None).
+        :rtype: tuple
+        """
+        key = (name, limit, offset, after_id, tuple(sorted(filters.items())))
+        cached = self._pages.get(key)
+        if cached is not None:
+            return cached
+
+        if any(filters.values()):
+            rows = self._filter(name, filters)
+            ids = [row["id"] for row in rows]
+        else:
+            rows, ids = self.tables[name], self.ids[name]
+        start = bisect_right(ids, after_id) if after_id is not None else max(offset, 0)
+        rows = rows[start:start + max(limit, 0)]
+
+        next_cursor = encode_cursor(rows[-1]["id"]) if limit and len(rows) == limit else None
+        cached = (encode_json(rows), next_cursor)
+        if len(self._pages) < MAX_CACHED_PAGES:
+            self._pages[key] = cached
+        return cached
+
+def page_response(page):
+    """
+    Build a JSON response from a pre-encoded page.
+
+    :param page: JSON body and next cursor as returned by :meth:`ReferenceData.page`.
+    :type page: tuple
+    :return: Response with the next cursor header set when there is a next page.
+    :rtype: fastapi.Response
+    """
+    body, next_cursor = page
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Shared reference data, reloaded when the dataset version changes
+reference_data = VersionedCache(ReferenceData.build)
@@ -0,0 +1,40 @@
+"""This module contains the fast JSON encoding used by the list endpoints."""
+import json
+from datetime import date
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+def _default(value):
+    """Encode the dates of plain row dicts as ISO strings, like ``jsonable_encoder`` does."""
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode_json(content):
+    """
+    Encode plain dicts, lists and tuples as compact UTF-8 JSON.
+
+    Uses orjson when it is installed, which encodes dates natively, and the
+    standard library with the same output otherwise. Unlike FastAPI's default
+    response path the content is not walked by ``jsonable_encoder`` first, so
+    it must only contain JSON types and dates.
+
+    :param content: Content to encode.
+    :return: JSON body.
+    :rtype: bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with :func:`encode_json`, for endpoints returning plain rows."""
+
+    def render(self, content):
+        return encode_json(content)
@@ -0,0 +1,123 @@
+"""This module caches encoded /therapists pages briefly and coalesces identical concurrent requests."""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from app.utils.metrics import Counter, registry
+
+# Number of pages kept, least recently used first out; 0 disables the cache
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+# Seconds a page is served from the cache
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "5"))
+
+cache_requests = registry.register(Counter(
+    "elis_result_cache_requests_total",
+    "Result cache lookups, by cache and result (hit, coalesced or miss).",
+    ("cache", "result"),
+))
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of computed results with a time to live and single-flight misses.
+
+    Results are kept per dataset version: the first lookup with a newer
+    version drops every cached result. Concurrent lookups of a key that is
+    being computed wait for that computation instead of starting their own.
+    Failed computations are not cached; their waiters get the same error.
+
+    Lookups must run on the event loop; the cache holds no lock.
+    """
+
+    def __init__(self, name, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        """
+        :param name: Cache name for the metrics.
+        :type name: str
+        :param max_entries: Maximum number of cached results, 0 to disable caching.
+        :type max_entries: int
+        :param ttl: Seconds a result is served from the cache.
+        :type ttl: float
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = None
+        self._entries = OrderedDict()  # key -> (expiry, result)
+        self._pending = {}  # key -> future of the running computation
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key, now):
+        """Return the cached result of a key, or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def get(self, dataset_version, key, compute):
+        """
+        Return the cached result of a key, computing it once if needed.
+
+        :param dataset_version: Dataset version the result is computed from.
+        :type dataset_version: int
+        :param key: Hashable key of the normalised request parameters.
+        :param compute: Coroutine function computing the result; must not return None.
+        :type compute: callable
+        :return: The result.
+        """
+        if not self.max_entries:
+            return await compute()
+        if dataset_version != self.version:
+            self.clear()
+            self.version = dataset_version
+
+        key = (dataset_version, key)
+        while True:
+            result = self._lookup(key, time.monotonic())
+            if result is not None:
+                cache_requests.inc((self.name, "hit"))
+                return result
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            cache_requests.inc((self.name, "coalesced"))
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Compute it here if the request computing it went away, but not if this one did
+                if not pending.cancelled():
+                    raise
+
+        cache_requests.inc((self.name, "miss"))
+        future = self._pending[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # Waiters re-raise it; do not log it as never retrieved
+            raise
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+        future.set_result(result)
+        if self.version == dataset_version:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        """Drop every cached result; running computations are still shared."""
+        self._entries.clear()
+
+# Encoded /therapists pages with their next cursor
+therapist_results = ResultCache("therapists")
@@ -0,0 +1,85 @@
+"""This module streams the therapist catalogue as NDJSON or CSV for bulk export."""
+import csv
+import io
+import json
+from sqlalchemy import select
+from data.models import Therapist
+from app.utils.database_release import database_release
+from app.utils.projections import EXPANSIONS, THERAPIST_COLUMNS, load_therapists
+from app.utils.therapist_filters import therapist_filters
+
+# Number of therapists fetched from the cursor and encoded per chunk
+EXPORT_CHUNK_SIZE = 1000
+
+# Media type and file extension per export format
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+# CSV columns: therapist columns, then the flattened address, contact and methods
+CSV_COLUMNS = [column.key for column in THERAPIST_COLUMNS] + [
+    "state", "postal_code", "email", "website", "methods", "clusters"
+]
+
+def _csv_row(therapist):
+    """Flatten an expanded therapist row into CSV values."""
+    address = therapist["address"] or {}
+    contact = therapist["contact"] or {}
+    methods = therapist["methods"]
+    return [therapist[column] for column in CSV_COLUMNS[:len(THERAPIST_COLUMNS)]] + [
+        address.get("state"), address.get("postal_code"), contact.get("email"), contact.get("website"),
+        ", ".join(method["method_name"] for method in methods),
+        ", ".join(dict.fromkeys(method["cluster_short"] for method in methods if method["cluster_short"])),
+    ]
+
+def encode_chunk(therapists, export_format):
+    """
+    Encode a chunk of expanded therapist rows.
+
+    :param therapists: Therapist rows with address, contact and methods.
+    :type therapists: list
+    :param export_format: ``"ndjson"`` or ``"csv"``.
+    :type export_format: str
+    :return: Encoded chunk.
+    :rtype: str
+    """
+    if export_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(_csv_row(therapist) for therapist in therapists)
+        return buffer.getvalue()
+    return "".join(json.dumps(therapist, default=str, ensure_ascii=False) + "\n" for therapist in therapists)
+
+async def stream_therapists(export_format="ndjson", chunk_size=EXPORT_CHUNK_SIZE, **filters):
+    """
+    Stream every therapist matching the filters, in id order, with all expansions.
+
+    Ids are read from a server-side cursor in chunks of ``chunk_size`` and each
+    chunk is loaded with one query per table, so memory stays constant however
+    large the registry is. The export runs in one read transaction of its own
+    session, so it is a consistent snapshot and outlives the request handler.
+
+    :param export_format: ``"ndjson"`` or ``"csv"``.
+    :type export_format: str
+    :param chunk_size: Number of therapists per chunk.
+    :type chunk_size: int
+    :param filters: Keyword arguments of :func:`therapist_filters`.
+    :return: Encoded chunks, starting with the CSV header.
+    :rtype: AsyncIterator[str]
+    """
+    if export_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(CSV_COLUMNS)
+        yield buffer.getvalue()
+
+    statement = (
+        select(Therapist.id)
+        .where(*therapist_filters(**filters))
+        .order_by(Therapist.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    async with database_release.session() as db:
+        result = await db.stream_scalars(statement)
+        async for therapist_ids in result.partitions():
+            therapists = await db.run_sync(load_therapists, list(therapist_ids), tuple(EXPANSIONS))
+            yield encode_chunk(therapists, export_format)
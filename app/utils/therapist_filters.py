@@ -0,0 +1,103 @@
+"""This module builds SQL conditions for the therapist filters of the therapists endpoints."""
+from datetime import date
+from sqlalchemy import select
+from data.models import (
+    Therapist, TherapistAddress, TherapyMethod, TherapyMethodCluster, therapist_therapy_method
+)
+from app.utils.therapist_index import prefix_upper_bound
+
+def years_before(day, years):
+    """
+    Return the same calendar day a number of years earlier.
+
+    29 February falls back to 28 February in years that are not leap years.
+
+    :param day: Date to count back from.
+    :type day: datetime.date
+    :param years: Number of years.
+    :type years: int
+    :return: The earlier date.
+    :rtype: datetime.date
+    """
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+def experience_cutoff(min_experience):
+    """
+    Return the latest registration date for a minimum number of years of experience.
+
+    :param min_experience: Minimum years of experience, or None.
+    :type min_experience: int
+    :return: Latest allowed registration date, or None if not filtered.
+    :rtype: datetime.date
+    """
+    if not min_experience:
+        return None
+    return years_before(date.today(), min_experience)
+
+def therapist_filters(min_registration_date=None, therapy_method=None, postal_code=None, cluster_short=None,
+                      state=None, postal_prefix=None, postal_from=None, postal_to=None):
+    """
+    Build WHERE clauses on ``Therapist`` matching :meth:`TherapistIndex.search`.
+
+    The therapists endpoint filters through the in-memory index; these clauses
+    are the equivalent SQL form, used by the streaming export.
+
+    Related-table filters are expressed as ``Therapist.id IN (subquery)`` so each
+    one is resolved through an index on the filter column and then the therapist
+    primary key, without scanning the therapist table.
+
+    :param min_registration_date: Latest allowed registration date.
+    :type min_registration_date: datetime.date
+    :param therapy_method: Therapy method name.
+    :type therapy_method: str
+    :param postal_code: Postal code.
+    :type postal_code: str
+    :param cluster_short: Therapy cluster short code.
+    :type cluster_short: str
+    :param state: State of the therapist's address.
+    :type state: str
+    :param postal_prefix: Postal code prefix, resolved as an index range.
+    :type postal_prefix: str
+    :param postal_from: Lowest postal code, inclusive.
+    :type postal_from: str
+    :param postal_to: Highest postal code, inclusive.
+    :type postal_to: str
+    :return: Clauses to pass to ``Select.where``.
+    :rtype: list
+    """
+    clauses = []
+    if min_registration_date is not None:
+        clauses.append(Therapist.registration_date <= min_registration_date)
+    address_conditions = []
+    if postal_code:
+        address_conditions.append(TherapistAddress.postal_code == postal_code)
+    if postal_prefix:
+        address_conditions.append(TherapistAddress.postal_code >= postal_prefix)
+        address_conditions.append(TherapistAddress.postal_code < prefix_upper_bound(postal_prefix))
+    if postal_from:
+        address_conditions.append(TherapistAddress.postal_code >= postal_from)
+    if postal_to:
+        address_conditions.append(TherapistAddress.postal_code <= postal_to)
+    if address_conditions:
+        clauses.append(Therapist.id.in_(select(TherapistAddress.therapist_id).where(*address_conditions)))
+    if state:
+        clauses.append(Therapist.id.in_(
+            select(TherapistAddress.therapist_id).where(TherapistAddress.state == state)
+        ))
+    if therapy_method:
+        clauses.append(Therapist.id.in_(
+            select(therapist_therapy_method.c.therapist_id)
+            .join(TherapyMethod, TherapyMethod.id == therapist_therapy_method.c.therapy_method_id)
+            .where(TherapyMethod.method_name == therapy_method)
+        ))
+    if cluster_short:
+        clauses.append(Therapist.id.in_(
+            select(therapist_therapy_method.c.therapist_id)
+            .join(TherapyMethod, TherapyMethod.id == therapist_therapy_method.c.therapy_method_id)
+            .join(TherapyMethodCluster, TherapyMethodCluster.id == TherapyMethod.cluster_id)
+            .where(TherapyMethodCluster.cluster_short == cluster_short)
+        ))
+    return clauses
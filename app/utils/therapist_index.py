@@ -0,0 +1,411 @@
+"""This module contains the in-memory therapist filter index serving the therapists endpoint."""
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from sqlalchemy import select
+from data.models import (
+    Therapist, TherapistAddress, TherapyMethod, TherapyMethodCluster, therapist_therapy_method
+)
+from app.utils.dataset_cache import VersionedCache
+
+# Therapist ids for one filter value, sorted for paging and as a set for membership tests
+Posting = namedtuple("Posting", ["ids", "members"])
+
+def _postings(pairs):
+    """Group (key, therapist id) pairs into postings keyed by value."""
+    grouped = {}
+    for key, therapist_id in pairs:
+        if key is not None:
+            grouped.setdefault(str(key), set()).add(therapist_id)
+    return {key: Posting(sorted(ids), frozenset(ids)) for key, ids in grouped.items()}
+
+def _tail(items, start):
+    """Iterate a list from a position without copying it."""
+    return (items[position] for position in range(start, len(items)))
+
+def prefix_upper_bound(prefix):
+    """
+    Return the smallest string greater than every string starting with ``prefix``.
+
+    :param prefix: Non-empty string prefix.
+    :type prefix: str
+    :return: Exclusive upper bound of the prefix range.
+    :rtype: str
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def postal_distance(postal_code, near):
+    """
+    Return the distance between two postal codes, or 0 when no reference code is given.
+
+    :param postal_code: Postal code.
+    :type postal_code: str
+    :param near: Reference postal code, or None.
+    :type near: str
+    :return: Absolute numeric difference; non-numeric codes sort after all numeric ones.
+    :rtype: float
+    """
+    if near is None:
+        return 0
+    if postal_code.isdigit() and near.isdigit():
+        return abs(int(postal_code) - int(near))
+    return float("inf")
+
+class TherapistIndex:
+    """
+    Postings per postal code, state, method name and cluster plus registration dates.
+
+    Filters are evaluated by walking the smallest matching posting in id order
+    and testing membership in the others, so a page costs O(limit) set lookups
+    instead of a join over the whole registry. Postal code regions are resolved
+    with binary search on the sorted postal codes.
+    """
+
+    def __init__(self, ids, registration_dates, by_postal_code, by_method, by_cluster, by_state=None,
+                 postal_codes=None):
+        """
+        :param ids: All therapist ids in ascending order.
+        :type ids: list
+        :param registration_dates: Registration date per therapist id.
+        :type registration_dates: dict
+        :param by_postal_code: Postings per postal code.
+        :type by_postal_code: dict
+        :param by_method: Postings per therapy method name.
+        :type by_method: dict
+        :param by_cluster: Postings per therapy cluster short code.
+        :type by_cluster: dict
+        :param by_state: Postings per state.
+        :type by_state: dict
+        :param postal_codes: Postal code per therapist id.
+        :type postal_codes: dict
+        """
+        self.ids = ids
+        self.registration_dates = registration_dates
+        self.sorted_dates = sorted(registration_dates.values())
+        self.by_postal_code = by_postal_code
+        self.by_method = by_method
+        self.by_cluster = by_cluster
+        self.by_state = by_state or {}
+        self.postal_codes = postal_codes or {}
+        self.sorted_postal_codes = sorted(by_postal_code)
+
+        # Therapist counts per facet value, refreshed together with the postings
+        self.facet_counts = {
+            facet: {value: len(posting.ids) for value, posting in sorted(postings.items())}
+            for facet, postings in self.facets().items()
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def facets(self):
+        """
+        Return the postings that facet counts are reported for.
+
+        :return: Postings per facet name.
+        :rtype: dict
+        """
+        return {"cluster_short": self.by_cluster, "state": self.by_state, "method_name": self.by_method}
+
+    @classmethod
+    def build(cls, db):
+        """
+        Build the index from the therapist tables.
+
+        :param db: Database session.
+        :return: A new therapist index.
+        :rtype: TherapistIndex
+        """
+        therapists = db.execute(
+            select(Therapist.id, Therapist.registration_date).order_by(Therapist.id)
+        ).all()
+        addresses = db.execute(
+            select(TherapistAddress.postal_code, TherapistAddress.state, TherapistAddress.therapist_id)
+        ).all()
+        methods = db.execute(
+            select(
+                TherapyMethod.method_name, TherapyMethodCluster.cluster_short,
+                therapist_therapy_method.c.therapist_id
+            )
+            .join(TherapyMethod, TherapyMethod.id == therapist_therapy_method.c.therapy_method_id)
+            .outerjoin(TherapyMethodCluster, TherapyMethodCluster.id == TherapyMethod.cluster_id)
+        ).all()
+
+        return cls(
+            ids=[therapist_id for therapist_id, _ in therapists],
+            registration_dates=dict(therapists),
+            by_postal_code=_postings((postal_code, therapist_id) for postal_code, _, therapist_id in addresses),
+            by_method=_postings((method_name, therapist_id) for method_name, _, therapist_id in methods),
+            by_cluster=_postings((cluster_short, therapist_id) for _, cluster_short, therapist_id in methods),
+            by_state=_postings((state, therapist_id) for _, state, therapist_id in addresses),
+            postal_codes={therapist_id: postal_code for postal_code, _, therapist_id in addresses},
+        )
+
+    def _postings(self, therapy_method=None, postal_code=None, cluster_short=None, state=None):
+        """Return the postings of the given filter values, or None if a value matches no one."""
+        postings = []
+        for value, table in (
+            (postal_code, self.by_postal_code),
+            (state, self.by_state),
+            (therapy_method, self.by_method),
+            (cluster_short, self.by_cluster),
+        ):
+            if value:
+                posting = table.get(value)
+                if posting is None:
+                    return None
+                postings.append(posting)
+        return postings
+
+    def _date_cutoff(self, min_registration_date):
+        """
+        Short-circuit registration date thresholds that match no one or everyone.
+
+        :return: False if nothing matches, otherwise the cutoff to check (None for everyone).
+        """
+        if min_registration_date is None:
+            return None
+        if not self.sorted_dates or min_registration_date < self.sorted_dates[0]:
+            return False
+        if min_registration_date >= self.sorted_dates[-1]:
+            return None
+        return min_registration_date
+
+    def _page(self, candidates, others, cutoff, offset, limit):
+        """Collect one page of candidate ids that are members of all other postings and meet the cutoff."""
+        page = []
+        for therapist_id in candidates:
+            if any(therapist_id not in members for members in others):
+                continue
+            if cutoff is not None and self.registration_dates[therapist_id] > cutoff:
+                continue
+            if offset:
+                offset -= 1
+                continue
+            page.append(therapist_id)
+            if len(page) >= limit:
+                break
+        return page
+
+    def search(self, min_registration_date=None, therapy_method=None, postal_code=None,
+               cluster_short=None, after_id=None, offset=0, limit=10, state=None):
+        """
+        Return one page of therapist ids matching all given filters, in id order.
+
+        :param min_registration_date: Latest allowed registration date.
+        :type min_registration_date: datetime.date
+        :param therapy_method: Therapy method name.
+        :type therapy_method: str
+        :param postal_code: Postal code.
+        :type postal_code: str
+        :param cluster_short: Therapy cluster short code.
+        :type cluster_short: str
+        :param after_id: Only return ids greater than this (cursor pagination).
+        :type after_id: int
+        :param offset: Number of matches to skip.
+        :type offset: int
+        :param limit: Maximum number of ids to return.
+        :type limit: int
+        :param state: State of the therapist's address.
+        :type state: str
+        :return: Matching therapist ids in ascending order.
+        :rtype: list
+        """
+        if limit <= 0:
+            return []
+        postings = self._postings(therapy_method, postal_code, cluster_short, state)
+        cutoff = self._date_cutoff(min_registration_date)
+        if postings is None or cutoff is False:
+            return []
+
+        postings.sort(key=lambda posting: len(posting.ids))
+        candidates = postings[0].ids if postings else self.ids
+        others = [posting.members for posting in postings[1:]]
+        start = bisect_right(candidates, after_id) if after_id is not None else 0
+        return self._page(_tail(candidates, start), others, cutoff, offset, limit)
+
+    def postal_region(self, postal_prefix=None, postal_from=None, postal_to=None):
+        """
+        Return the postal codes in a region, using binary search on the sorted codes.
+
+        Codes compare as strings, which matches their numeric order for the
+        four-digit Austrian postal codes.
+
+        :param postal_prefix: Postal code prefix, e.g. ``"10"``.
+        :type postal_prefix: str
+        :param postal_from: Lowest postal code, inclusive.
+        :type postal_from: str
+        :param postal_to: Highest postal code, inclusive.
+        :type postal_to: str
+        :return: Postal codes in the region in ascending order.
+        :rtype: list
+        """
+        codes = self.sorted_postal_codes
+        low, high = 0, len(codes)
+        if postal_prefix:
+            low = max(low, bisect_left(codes, postal_prefix))
+            high = min(high, bisect_left(codes, prefix_upper_bound(postal_prefix)))
+        if postal_from:
+            low = max(low, bisect_left(codes, postal_from))
+        if postal_to:
+            high = min(high, bisect_right(codes, postal_to))
+        return codes[low:high]
+
+    def search_postal(self, min_registration_date=None, therapy_method=None, postal_code=None,
+                      cluster_short=None, state=None, postal_prefix=None, postal_from=None,
+                      postal_to=None, near=None, after=None, offset=0, limit=10):
+        """
+        Return one page of therapist ids in a postal code region, nearest postal codes first.
+
+        Results are ordered by distance of their postal code from ``near`` (or
+        by postal code without ``near``), then by postal code and id.
+
+        :param min_registration_date: Latest allowed registration date.
+        :type min_registration_date: datetime.date
+        :param therapy_method: Therapy method name.
+        :type therapy_method: str
+        :param postal_code: Exact postal code.
+        :type postal_code: str
+        :param cluster_short: Therapy cluster short code.
+        :type cluster_short: str
+        :param state: State of the therapist's address.
+        :type state: str
+        :param postal_prefix: Postal code prefix.
+        :type postal_prefix: str
+        :param postal_from: Lowest postal code, inclusive.
+        :type postal_from: str
+        :param postal_to: Highest postal code, inclusive.
+        :type postal_to: str
+        :param near: Reference postal code for the distance order.
+        :type near: str
+        :param after: Postal code and id of the last result of the previous page (cursor pagination).
+        :type after: tuple
+        :param offset: Number of matches to skip.
+        :type offset: int
+        :param limit: Maximum number of ids to return.
+        :type limit: int
+        :return: Matching therapist ids, nearest first.
+        :rtype: list
+        """
+        if limit <= 0:
+            return []
+        postings = self._postings(therapy_method, None, cluster_short, state)
+        cutoff = self._date_cutoff(min_registration_date)
+        if postings is None or cutoff is False:
+            return []
+        others = [posting.members for posting in postings]
+
+        codes = self.postal_region(postal_prefix, postal_from, postal_to)
+        if postal_code:
+            codes = [code for code in codes if code == postal_code]
+        keys = sorted((postal_distance(code, near), code) for code in codes)
+
+        start, after_id = 0, None
+        if after is not None:
+            after_code, after_id = after
+            start = bisect_left(keys, (postal_distance(after_code, near), after_code))
+            if start == len(keys) or keys[start][1] != after_code:
+                after_id = None
+
+        def candidates():
+            for position in range(start, len(keys)):
+                ids = self.by_postal_code[keys[position][1]].ids
+                first = bisect_right(ids, after_id) if position == start and after_id is not None else 0
+                yield from _tail(ids, first)
+
+        return self._page(candidates(), others, cutoff, offset, limit)
+
+    def matches(self, min_registration_date=None, therapy_method=None, postal_code=None, cluster_short=None,
+                state=None, postal_prefix=None, postal_from=None, postal_to=None):
+        """
+        Return every therapist id matching the given filters.
+
+        :param min_registration_date: Latest allowed registration date.
+        :type min_registration_date: datetime.date
+        :param therapy_method: Therapy method name.
+        :type therapy_method: str
+        :param postal_code: Exact postal code.
+        :type postal_code: str
+        :param cluster_short: Therapy cluster short code.
+        :type cluster_short: str
+        :param state: State of the therapist's address.
+        :type state: str
+        :param postal_prefix: Postal code prefix.
+        :type postal_prefix: str
+        :param postal_from: Lowest postal code, inclusive.
+        :type postal_from: str
+        :param postal_to: Highest postal code, inclusive.
+        :type postal_to: str
+        :return: Matching therapist ids, or None if no filter is given (every therapist matches).
+        :rtype: set
+        """
+        postings = self._postings(therapy_method, postal_code, cluster_short, state)
+        cutoff = self._date_cutoff(min_registration_date)
+        if postings is None or cutoff is False:
+            return set()
+        region = postal_prefix or postal_from or postal_to
+        if not postings and cutoff is None and not region:
+            return None
+
+        postings.sort(key=lambda posting: len(posting.ids))
+        matched = set(postings[0].members) if postings else set(self.ids)
+        for posting in postings[1:]:
+            matched &= posting.members
+        if region:
+            codes = set(self.postal_region(postal_prefix, postal_from, postal_to))
+            matched = {therapist_id for therapist_id in matched if self.postal_codes.get(therapist_id) in codes}
+        if cutoff is not None:
+            matched = {therapist_id for therapist_id in matched if self.registration_dates[therapist_id] <= cutoff}
+        return matched
+
+    def filter_ranked(self, ranked_ids, min_registration_date=None, therapy_method=None, postal_code=None,
+                      cluster_short=None, state=None, postal_prefix=None, postal_from=None,
+                      postal_to=None, offset=0, limit=10):
+        """
+        Return one page of externally ranked therapist ids that match all given filters.
+
+        Keeps the order of ``ranked_ids``, e.g. the relevance order of a name search.
+
+        :param ranked_ids: Therapist ids in result order.
+        :type ranked_ids: list
+        :param min_registration_date: Latest allowed registration date.
+        :type min_registration_date: datetime.date
+        :param therapy_method: Therapy method name.
+        :type therapy_method: str
+        :param postal_code: Exact postal code.
+        :type postal_code: str
+        :param cluster_short: Therapy cluster short code.
+        :type cluster_short: str
+        :param state: State of the therapist's address.
+        :type state: str
+        :param postal_prefix: Postal code prefix.
+        :type postal_prefix: str
+        :param postal_from: Lowest postal code, inclusive.
+        :type postal_from: str
+        :param postal_to: Highest postal code, inclusive.
+        :type postal_to: str
+        :param offset: Number of matches to skip.
+        :type offset: int
+        :param limit: Maximum number of ids to return.
+        :type limit: int
+        :return: Matching therapist ids in ranked order.
+        :rtype: list
+        """
+        if limit <= 0:
+            return []
+        postings = self._postings(therapy_method, postal_code, cluster_short, state)
+        cutoff = self._date_cutoff(min_registration_date)
+        if postings is None or cutoff is False:
+            return []
+        others = [posting.members for posting in postings]
+
+        # Ids added after this index was built are left out until it is rebuilt
+        ranked_ids = (therapist_id for therapist_id in ranked_ids if therapist_id in self.registration_dates)
+        if postal_prefix or postal_from or postal_to:
+            region = set(self.postal_region(postal_prefix, postal_from, postal_to))
+            ranked_ids = (
+                therapist_id for therapist_id in ranked_ids if self.postal_codes.get(therapist_id) in region
+            )
+        return self._page(ranked_ids, others, cutoff, offset, limit)
+
+# Shared index, rebuilt and swapped when the dataset version changes
+therapist_index = VersionedCache(TherapistIndex.build)
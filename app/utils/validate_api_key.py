@@ -1,8 +1,10 @@
 """This module provides a dependency to validate API keys for securing FastAPI endpoints."""
+import math
 import os
 from fastapi import Depends, HTTPException
 from fastapi.security import APIKeyHeader
 from dotenv import load_dotenv
+from app.utils.key_store import KeyLimits, key_store
 
 # Load environment variables from .env file, retrieve API key
 load_dotenv()
@@ -12,16 +14,45 @@ API_KEY = os.getenv("API_KEY")
 API_KEY_NAME = "X-API-Key"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=True)
 
+def _optional_number(name, cast):
+    """Read an optional number from the environment."""
+    value = os.getenv(name)
+    return cast(value) if value else None
+
+# Accept the key of the environment next to the issued keys, with optional limits
+if API_KEY:
+    key_store.add_static_key(API_KEY, KeyLimits(
+        "env",
+        rate_limit=_optional_number("API_KEY_RATE_LIMIT", float),
+        burst=_optional_number("API_KEY_BURST", int),
+        max_concurrency=_optional_number("API_KEY_MAX_CONCURRENCY", int),
+    ))
+
 # Dependency to validate the API key
-def validate_api_key(api_key: str = Depends(api_key_header)):
+async def validate_api_key(api_key: str = Depends(api_key_header)):
     """
-    Validate the provided API key against the expected value.
-    
+    Validate the provided API key and enforce its rate and concurrency limits.
+
+    The key is looked up by hash in the in-memory key store. Its concurrency
+    slot is held until the response has been sent.
+
     :param api_key: The API key provided in the request header.
     :type api_key: str
-    :raises HTTPException: If the API key is invalid.
+    :raises HTTPException: 401 if the API key is invalid, 429 with ``Retry-After`` if it is over its limits.
     :return: None
     """
-    if api_key != API_KEY:
+    limits = await key_store.lookup(api_key)
+    if limits is None:
         raise HTTPException(status_code=401, detail="Invalid API Key")
-    return None
+
+    retry_after = limits.acquire()
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+    try:
+        yield
+    finally:
+        limits.release()
@@ -0,0 +1,15 @@
+"""
+Benchmark package for the Open ELIS API.
+
+This package contains a synthetic registry generator, scripted database builds
+through the import path and repeatable endpoint timings saved as JSON.
+
+Modules:
+
+* **generate_registry**: Synthetic ``PTH-CSV-Liste`` registry files
+* **build_database**: Database builds through the population, import and mapping scripts
+* **run**: Endpoint and import timings, compared against a baseline
+
+Author: Vajo Sekulic
+Version: 0.1.0
+"""
@@ -0,0 +1,86 @@
+"""This module builds benchmark databases through the population, import and mapping scripts."""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Repository root, the working directory of the data scripts
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Registry sizes by name
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# Scripts run for a build, in order, with their arguments
+BUILD_STEPS = (
+    ("schema", ["-m", "data.migrate"]),
+    ("populate", ["-m", "data.populate_tables"]),
+    ("import", ["-m", "data.import_data", "{csv_path}"]),
+    ("mappings", ["-m", "data.run_mappings"]),
+    ("analyze", ["-m", "data.migrate"]),
+    ("delta_import", ["-m", "data.import_data", "--delta", "{csv_path}"]),
+    ("snapshot", ["-m", "data.snapshot"]),
+)
+
+def database_url(db_path):
+    """
+    Return the SQLAlchemy URL of a SQLite database file.
+
+    :param db_path: Database file path.
+    :type db_path: str
+    :return: Database URL.
+    :rtype: str
+    """
+    return f"sqlite:///{os.path.abspath(db_path)}"
+
+def run_script(arguments, env=None):
+    """
+    Run a Python module of the repository in its own process.
+
+    :param arguments: Interpreter arguments, e.g. ``["-m", "data.migrate"]``.
+    :type arguments: list
+    :param env: Environment of the process, defaults to the current one.
+    :type env: dict
+    :raises subprocess.CalledProcessError: If the script fails.
+    :return: Duration in seconds.
+    :rtype: float
+    """
+    started = time.perf_counter()
+    subprocess.run([sys.executable] + arguments, cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+def build_database(csv_path, db_path):
+    """
+    Build a database from a registry CSV by running the data scripts.
+
+    Every step runs as its own process with ``DATABASE_URL`` pointing at the
+    new file, exactly as the scripts are run in production. The CSV is then
+    re-applied as an unchanged delta and the catalogue snapshot is built.
+
+    :param csv_path: Path to the ``PTH-CSV-Liste`` file.
+    :type csv_path: str
+    :param db_path: Database file to create; an existing file is replaced.
+    :type db_path: str
+    :raises subprocess.CalledProcessError: If a script fails.
+    :return: Duration of every step in seconds.
+    :rtype: dict
+    """
+    csv_path, db_path = os.path.abspath(csv_path), os.path.abspath(db_path)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    env = {**os.environ, "DATABASE_URL": database_url(db_path)}
+    env.pop("ASYNC_DATABASE_URL", None)
+    return {
+        step: run_script([argument.format(csv_path=csv_path) for argument in arguments], env)
+        for step, arguments in BUILD_STEPS
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a database from a registry CSV.")
+    parser.add_argument("csv_path", help="Path to the PTH-CSV-Liste file")
+    parser.add_argument("db_path", help="Database file to create")
+    args = parser.parse_args()
+    for name, seconds in build_database(args.csv_path, args.db_path).items():
+        print(f"{name}: {seconds:.2f}s")
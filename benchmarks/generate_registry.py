@@ -0,0 +1,103 @@
+"""This module writes synthetic therapist registries in the ``PTH-CSV-Liste`` format."""
+import argparse
+import csv
+import random
+from datetime import date, timedelta
+from data.import_data import CSV_COLUMNS
+from data.run_mappings import THERAPY_METHODS_TO_CLUSTERS
+from benchmarks.build_database import SIZES
+
+# States with the first digit of their postal codes and their share of therapists
+STATES = {
+    "Wien": ("1", 40),
+    "Niederösterreich": ("2", 12),
+    "Burgenland": ("7", 2),
+    "Oberösterreich": ("4", 12),
+    "Salzburg": ("5", 7),
+    "Steiermark": ("8", 12),
+    "Kärnten": ("9", 5),
+    "Tirol": ("6", 8),
+    "Vorarlberg": ("6", 2),
+}
+
+LAST_NAMES = (
+    "Gruber", "Huber", "Bauer", "Wagner", "Müller", "Pichler", "Steiner", "Moser", "Mayer", "Hofer",
+    "Leitner", "Berger", "Fuchs", "Eder", "Fischer", "Schmid", "Winkler", "Weber", "Schwarz", "Maier",
+)
+FIRST_NAMES = (
+    "Anna", "Maria", "Elisabeth", "Katharina", "Sophie", "Julia", "Lena", "Sarah", "Eva", "Barbara",
+    "Thomas", "Michael", "Andreas", "Stefan", "Markus", "Christian", "Martin", "Lukas", "Jürgen", "Peter",
+)
+TITLES = ("", "", "", "Mag.", "Mag.a", "Dr.", "Dr.in", "MSc")
+
+# Range of registration dates, fixed so that a seed always yields the same registry
+FIRST_REGISTRATION = date(1991, 1, 1)
+LAST_REGISTRATION = date(2025, 9, 13)
+
+def registry_rows(count, seed=0):
+    """
+    Generate synthetic registry rows.
+
+    Rows are deterministic for a seed. States and methods are drawn with
+    skewed weights, so filters match realistic shares of the registry.
+
+    :param count: Number of therapists.
+    :type count: int
+    :param seed: Random seed.
+    :type seed: int
+    :return: Rows in the order of ``CSV_COLUMNS``.
+    :rtype: Iterator[list]
+    """
+    rng = random.Random(seed)
+    states = list(STATES)
+    state_weights = [share for _digit, share in STATES.values()]
+    methods = list(THERAPY_METHODS_TO_CLUSTERS)
+    # A few methods are much more common than the rest
+    method_weights = [30 if name in ("Verhaltenstherapie", "Systemische Familientherapie") else 5 for name in methods]
+    days = (LAST_REGISTRATION - FIRST_REGISTRATION).days + 1
+
+    for number in range(count):
+        last_name = rng.choice(LAST_NAMES)
+        state = rng.choices(states, state_weights)[0]
+        postal_code = f"{STATES[state][0]}{rng.randint(10, 999):03d}"
+        therapy_methods = dict.fromkeys(rng.choices(methods, method_weights, k=rng.choice((1, 1, 1, 2, 2, 3))))
+        first_name = rng.choice(FIRST_NAMES)
+        yield [
+            last_name,
+            first_name,
+            rng.choice(TITLES),
+            (FIRST_REGISTRATION + timedelta(days=rng.randrange(days))).strftime("%d.%m.%y"),
+            100_000 + number,
+            f"{first_name}.{number}@example.at".lower() if rng.random() < 0.9 else "",
+            f"https://praxis-{number}.example.at" if rng.random() < 0.3 else "",
+            state,
+            postal_code,
+            ", ".join(therapy_methods),
+        ]
+
+def generate_registry_csv(path, count, seed=0):
+    """
+    Write a synthetic registry CSV (semicolon-separated, cp1252) for the importer.
+
+    :param path: Output file path.
+    :type path: str
+    :param count: Number of therapists.
+    :type count: int
+    :param seed: Random seed.
+    :type seed: int
+    :return: The output file path.
+    :rtype: str
+    """
+    with open(path, "w", newline="", encoding="cp1252") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(registry_rows(count, seed))
+    return str(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic PTH-CSV-Liste registry.")
+    parser.add_argument("size", choices=SIZES, help="Number of therapists")
+    parser.add_argument("path", help="Output CSV path")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+    generate_registry_csv(args.path, SIZES[args.size], args.seed)
@@ -0,0 +1,280 @@
+"""This module times the API endpoints and the import on a synthetic registry and compares runs."""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from benchmarks.build_database import ROOT, SIZES, build_database, database_url, run_script
+
+# Filter values of the therapists endpoint, matching the synthetic registry
+THERAPIST_FILTERS = {
+    "min_experience": "10",
+    "therapy_method": "Verhaltenstherapie",
+    "postal_code": "1010",
+    "cluster_short": "VT",
+    "state": "Wien",
+    "postal_prefix": "10",
+    "near": "1050",
+    "q": "Huber",
+}
+
+# Modules imported by a worker on cold start, timed in fresh interpreters
+IMPORT_MODULES = ("app.main",)
+
+# Timings may grow by this share before they count as a regression
+DEFAULT_TOLERANCE = 0.25
+# Differences below this many milliseconds are measurement noise
+NOISE_FLOOR_MS = 0.05
+
+def questionnaire(seed=0):
+    """Return a questionnaire payload with twelve answers."""
+    from app.calculations.calculate_cluster import CLUSTER_ORDER
+    return {
+        "responses": [
+            {
+                "question_id": question_id,
+                "selected_option": "A",
+                "cluster_points": [
+                    CLUSTER_ORDER[(question_id + seed) % len(CLUSTER_ORDER)],
+                    CLUSTER_ORDER[(question_id * 3 + seed) % len(CLUSTER_ORDER)],
+                ],
+            }
+            for question_id in range(1, 13)
+        ]
+    }
+
+def benchmark_cases():
+    """
+    List the requests to time.
+
+    Covers every combination of the therapists endpoint filters, the expanded
+    listing, the facets, the reference endpoints and the questionnaire scoring.
+
+    :return: Case name and request keyword arguments (method, url, params, json, content).
+    :rtype: Iterator[tuple]
+    """
+    for count in range(len(THERAPIST_FILTERS) + 1):
+        for names in itertools.combinations(THERAPIST_FILTERS, count):
+            params = {name: THERAPIST_FILTERS[name] for name in names}
+            name = "GET /therapists" + ("?" + "&".join(names) if names else "")
+            yield name, {"method": "GET", "url": "/therapists", "params": params}
+
+    expand = {"limit": "100", "expand": "address,contact,methods"}
+    yield "GET /therapists?limit=100&expand", {"method": "GET", "url": "/therapists", "params": expand}
+    yield "GET /therapists/facets", {"method": "GET", "url": "/therapists/facets"}
+    yield "GET /therapists/facets?state&cluster_short", {
+        "method": "GET", "url": "/therapists/facets", "params": {"state": "Wien", "cluster_short": "VT"},
+    }
+    for url in ("/therapy_methods", "/therapy_types", "/therapy_clusters"):
+        yield f"GET {url}", {"method": "GET", "url": url, "params": {"limit": "100"}}
+
+    yield "POST /calculate_results", {"method": "POST", "url": "/calculate_results", "json": questionnaire()}
+    batch = [questionnaire(seed) for seed in range(1000)]
+    yield "POST /calculate_results/batch (1000)", {"method": "POST", "url": "/calculate_results/batch", "json": batch}
+    yield "POST /calculate_results/batch (1000, ndjson)", {
+        "method": "POST",
+        "url": "/calculate_results/batch",
+        "content": "".join(json.dumps(payload) + "\n" for payload in batch),
+        "headers": {"Content-Type": "application/x-ndjson"},
+    }
+    yield "POST /recommendations", {"method": "POST", "url": "/recommendations", "json": questionnaire()}
+
+def summarize(durations):
+    """
+    Summarize the durations of a case.
+
+    :param durations: Durations in milliseconds.
+    :type durations: list
+    :return: ``min_ms``, ``median_ms``, ``p95_ms``, ``mean_ms`` and ``runs``.
+    :rtype: dict
+    """
+    return {
+        "min_ms": round(min(durations), 4),
+        "median_ms": round(statistics.median(durations), 4),
+        "p95_ms": round(statistics.quantiles(durations, n=20)[18] if len(durations) > 1 else durations[0], 4),
+        "mean_ms": round(statistics.fmean(durations), 4),
+        "runs": len(durations),
+    }
+
+def time_request(client, request):
+    """
+    Send a request and return its duration.
+
+    :param client: Test client of the app.
+    :param request: Keyword arguments of ``client.request``.
+    :type request: dict
+    :raises RuntimeError: If the request fails.
+    :return: Duration in milliseconds.
+    :rtype: float
+    """
+    started = time.perf_counter()
+    response = client.request(**request)
+    elapsed = (time.perf_counter() - started) * 1000
+    if response.status_code != 200:
+        raise RuntimeError(f"{request['method']} {request['url']} returned {response.status_code}: {response.text}")
+    return elapsed
+
+def time_imports(modules=IMPORT_MODULES, repeat=5):
+    """
+    Time the import of modules in fresh interpreters, as a worker cold start.
+
+    Only the import is timed, not the interpreter start-up. Imports must not
+    print, which also guards against side effects such as schema creation.
+
+    :param modules: Module names to import.
+    :type modules: tuple
+    :param repeat: Number of interpreters started per module.
+    :type repeat: int
+    :raises subprocess.CalledProcessError: If an import fails.
+    :return: Timings per ``import <module>`` case.
+    :rtype: dict
+    """
+    code = (
+        "import importlib, sys, time; started = time.perf_counter(); "
+        "importlib.import_module(sys.argv[1]); print(time.perf_counter() - started)"
+    )
+    results = {}
+    for module in modules:
+        durations = []
+        for _run in range(repeat):
+            output = subprocess.run(
+                [sys.executable, "-c", code, module], cwd=ROOT, check=True, capture_output=True, text=True
+            ).stdout
+            durations.append(float(output) * 1000)
+        results[f"import {module}"] = summarize(durations)
+    return results
+
+def run_endpoint_benchmarks(api_key, repeat=20, warmup=3):
+    """
+    Time every benchmark case against the app, in process.
+
+    Cases are timed in rounds of one request each, so load changes on the
+    machine during the run affect all cases alike instead of a few in a row.
+    ``DATABASE_URL`` must point at the benchmark database before the app is
+    imported, which happens here.
+
+    :param api_key: API key the app accepts.
+    :type api_key: str
+    :param repeat: Number of timed rounds.
+    :type repeat: int
+    :param warmup: Number of untimed rounds sent first.
+    :type warmup: int
+    :return: Timings per case name.
+    :rtype: dict
+    """
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    cases = list(benchmark_cases())
+    durations = {name: [] for name, _request in cases}
+    with TestClient(app, headers={"X-API-Key": api_key}) as client:
+        for round_number in range(warmup + repeat):
+            for name, request in cases:
+                elapsed = time_request(client, request)
+                if round_number >= warmup:
+                    durations[name].append(elapsed)
+    return {name: summarize(values) for name, values in durations.items()}
+
+def compare_results(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare the median endpoint and import timings and the build steps of two runs.
+
+    :param current: Results of this run.
+    :type current: dict
+    :param baseline: Results of the baseline run.
+    :type baseline: dict
+    :param tolerance: Share a timing may grow before it counts as a regression.
+    :type tolerance: float
+    :return: One row per case found in both runs: ``name``, ``baseline_ms``,
+        ``current_ms``, ``ratio`` and ``regression``.
+    :rtype: list
+    """
+    def timings(results):
+        values = {
+            name: timing["median_ms"]
+            for section in ("endpoints", "imports")
+            for name, timing in results.get(section, {}).items()
+        }
+        values.update({f"build: {step}": seconds * 1000 for step, seconds in results.get("build", {}).items()})
+        return values
+
+    current_ms, baseline_ms = timings(current), timings(baseline)
+    rows = []
+    for name in current_ms.keys() & baseline_ms.keys():
+        before, after = baseline_ms[name], current_ms[name]
+        rows.append({
+            "name": name,
+            "baseline_ms": before,
+            "current_ms": after,
+            "ratio": after / before if before else float("inf"),
+            "regression": after > before * (1 + tolerance) and after - before > NOISE_FLOOR_MS,
+        })
+    return sorted(rows, key=lambda row: -row["ratio"])
+
+def main():
+    """Generate the registry, build the database, time the endpoints and compare with a baseline."""
+    parser = argparse.ArgumentParser(description="Benchmark the import and the API endpoints.")
+    parser.add_argument("size", choices=SIZES, help="Number of therapists in the synthetic registry")
+    parser.add_argument("--workdir", default=".benchmarks", help="Directory for the registry and database")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed rounds over all cases")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed rounds over all cases")
+    parser.add_argument("--reuse", action="store_true", help="Reuse an existing database instead of rebuilding")
+    parser.add_argument("--output", help="Results file, defaults to <workdir>/results-<size>.json")
+    parser.add_argument("--baseline", help="Results file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown share")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    csv_path = os.path.abspath(os.path.join(args.workdir, f"registry-{args.size}.csv"))
+    db_path = os.path.abspath(os.path.join(args.workdir, f"therapists-{args.size}.db"))
+    output = args.output or os.path.join(args.workdir, f"results-{args.size}.json")
+
+    # Point the scripts and the app at the benchmark database and a throwaway key before importing them
+    from app.utils.api_key_generator import generate_api_key
+    api_key = generate_api_key()
+    os.environ.update({"DATABASE_URL": database_url(db_path), "API_KEY": api_key})
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    # Rounds repeat identical requests, so time the uncached path unless RESULT_CACHE_SIZE is set
+    os.environ.setdefault("RESULT_CACHE_SIZE", "0")
+
+    # The generator and the data scripts import the database models, so they run in their own processes
+    if not os.path.exists(csv_path):
+        run_script(["-m", "benchmarks.generate_registry", args.size, csv_path])
+    build = {}
+    if not (args.reuse and os.path.exists(db_path)):
+        build = build_database(csv_path, db_path)
+
+    results = {
+        "size": args.size,
+        "therapists": SIZES[args.size],
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "repeat": args.repeat,
+        "build": build,
+        "imports": time_imports(),
+        "endpoints": run_endpoint_benchmarks(api_key, args.repeat, args.warmup),
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Timed {len(results['endpoints'])} cases, results written to {output}")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        rows = compare_results(results, json.load(f), args.tolerance)
+    for row in rows:
+        marker = "REGRESSION" if row["regression"] else ""
+        print(f"{row['ratio']:6.2f}x  {row['baseline_ms']:10.3f} -> {row['current_ms']:10.3f} ms  {row['name']}  {marker}")
+    regressions = sum(row["regression"] for row in rows)
+    print(f"{regressions} of {len(rows)} cases slower than the baseline by more than {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
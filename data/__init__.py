@@ -10,6 +10,10 @@ Modules:
 * **import_data**: Utilities for importing external data sources
 * **populate_tables**: Scripts for populating database tables
 * **run_mappings**: Mapping utilities for data transformation
+* **migrate**: Schema creation and migrations (indexes)
+* **search_index**: Full-text therapist name search index
+* **snapshot**: Memory-mapped catalogue snapshot shared by the API workers
+* **refresh**: Blue/green refresh of the registry into a new database file
 
 Author: Vajo Sekulic
 Version: 0.1.0
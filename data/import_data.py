@@ -1,75 +1,423 @@
 """This module contains utilities for importing external data sources."""
-from datetime import datetime
-import pandas as pd
-from .models import SessionLocal, Therapist, TherapistAddress, TherapistContact, TherapyMethod
+import argparse
+import time
+from sqlalchemy import bindparam, delete, func, select, text, update
+from .models import (
+    SessionLocal, Therapist, TherapistAddress, TherapistContact, TherapyMethod,
+    TherapyMethodCluster, therapist_therapy_method, bump_dataset_version, notify_dataset_change
+)
+from .run_mappings import THERAPY_METHODS_TO_CLUSTERS
+from .search_index import refresh_search_index
 
-def parse_date(date_str):
-    """Parse a date string in 'dd.mm.yy' format to a datetime.date object."""
-    return datetime.strptime(date_str, '%d.%m.%y').date()
+CSV_PATH = "datafiles/PTH-CSV-Liste-2025-09-13.csv"
+BATCH_SIZE = 5000
+CSV_COLUMNS = (
+    'Familien-/Nachname', 'Vorname', 'Titel', 'Eintragungdatum', 'Eintragungs Nummer',
+    'Email1', 'Website', 'Berufssitz Bundesland 1', 'Berufssitz PLZ 1', 'PTH-Methoden'
+)
+
+def read_registry_csv(csv_path=CSV_PATH):
+    """
+    Read a registry CSV export into a DataFrame with normalised columns.
+
+    All columns are read as strings with empty cells kept as ``''``, dates are
+    parsed column-wise and the therapy method list is split once per row.
+
+    :param csv_path: Path to the ``PTH-CSV-Liste`` file.
+    :type csv_path: str
+    :return: Registry rows, one per therapist.
+    :rtype: pandas.DataFrame
+    """
+    # Imported here so that importing the module, e.g. for CSV_COLUMNS, does not load pandas
+    import pandas as pd
 
-def import_csv_data():
-    """Import therapist data from a CSV file into the database."""
     df = pd.read_csv(
-        "datafiles/PTH-CSV-Liste-2025-09-13.csv", 
+        csv_path,
         sep=';',
-        encoding='cp1252'
+        encoding='cp1252',
+        dtype=str,
+        keep_default_na=False
+    )
+    if 'Website' not in df.columns:
+        df['Website'] = ''
+
+    df['Eintragungdatum'] = pd.to_datetime(df['Eintragungdatum'], format='%d.%m.%y').dt.date
+    df['Eintragungs Nummer'] = df['Eintragungs Nummer'].astype(int)
+    df['PTH-Methoden'] = df['PTH-Methoden'].map(
+        lambda methods: list(dict.fromkeys(m.strip() for m in methods.split(',') if m.strip()))
+    )
+    return df
+
+def load_method_ids(session):
+    """
+    Load the therapy method name to id map, keeping the lowest id per name.
+
+    :param session: Database session.
+    :return: Mapping of method name to therapy method id.
+    :rtype: dict
+    """
+    rows = session.execute(
+        select(TherapyMethod.method_name, func.min(TherapyMethod.id)).group_by(TherapyMethod.method_name)
     )
+    return dict(rows.all())
+
+def insert_missing_methods(session, method_names, method_ids):
+    """
+    Insert therapy methods that are not yet in the database.
+
+    New methods are assigned their cluster from ``THERAPY_METHODS_TO_CLUSTERS``
+    when the cluster table is already populated.
+
+    :param session: Database session.
+    :param method_names: Method names referenced by the import.
+    :type method_names: iterable
+    :param method_ids: Method name to id map, updated in place.
+    :type method_ids: dict
+    :return: Number of inserted methods.
+    :rtype: int
+    """
+    missing = sorted(set(method_names) - method_ids.keys())
+    if not missing:
+        return 0
+
+    cluster_ids = dict(session.execute(select(TherapyMethodCluster.cluster_short, TherapyMethodCluster.id)).all())
+    next_id = (session.scalar(select(func.max(TherapyMethod.id))) or 0) + 1
+    rows = []
+    for method_id, method_name in enumerate(missing, start=next_id):
+        cluster_short = THERAPY_METHODS_TO_CLUSTERS.get(method_name)
+        rows.append({
+            "id": method_id,
+            "method_name": method_name,
+            "cluster_id": cluster_ids.get(cluster_short)
+        })
+        method_ids[method_name] = method_id
+
+    session.execute(TherapyMethod.__table__.insert(), rows)
+    return len(rows)
+
+def registry_records(df, method_ids):
+    """
+    Convert registry rows into table records, one tuple per therapist.
+
+    :param df: Registry rows as returned by :func:`read_registry_csv`.
+    :type df: pandas.DataFrame
+    :param method_ids: Method name to id map covering every method in ``df``.
+    :type method_ids: dict
+    :return: Tuples of (therapist, contact, address, method ids) without therapist ids.
+    :rtype: generator
+    """
+    for row in df[list(CSV_COLUMNS)].itertuples(index=False, name=None):
+        (last_name, first_name, title, registration_date, registration_number,
+         email, website, state, postal_code, methods) = row
+        therapist = {
+            "last_name": last_name,
+            "first_name": first_name,
+            "title": title,
+            "registration_date": registration_date,
+            "registration_number": registration_number,
+        }
+        contact = {"email": email, "website": website or None}
+        address = {"state": state, "postal_code": postal_code}
+        yield therapist, contact, address, frozenset(method_ids[method] for method in methods)
+
+def execute_batched(session, statement, rows, batch_size=BATCH_SIZE):
+    """Execute a statement as executemany over fixed-size batches of rows."""
+    for start in range(0, len(rows), batch_size):
+        session.execute(statement, rows[start:start + batch_size])
+
+def next_therapist_id(session):
+    """
+    Return the next unused therapist id.
+
+    Ids are never reused: on SQLite the ``AUTOINCREMENT`` high-water mark is
+    honoured, so therapists deleted from the end of the table keep their ids
+    retired for clients that cache or mirror rows by id.
+
+    :param session: Database session.
+    :return: First id to assign to new therapists.
+    :rtype: int
+    """
+    last_id = session.scalar(select(func.max(Therapist.id))) or 0
+    if session.get_bind().dialect.name == "sqlite" and session.scalar(
+        text("SELECT count(*) FROM sqlite_master WHERE name = 'sqlite_sequence'")
+    ):
+        sequence = session.scalar(
+            text("SELECT seq FROM sqlite_sequence WHERE name = :name"), {"name": Therapist.__tablename__}
+        )
+        last_id = max(last_id, sequence or 0)
+    return last_id + 1
+
+def insert_therapists(session, records, batch_size=BATCH_SIZE):
+    """
+    Insert therapists with their contact, address and method links.
+
+    Therapist ids are assigned up front from :func:`next_therapist_id` so no
+    flush per row is needed.
+
+    :param session: Database session.
+    :param records: Records as yielded by :func:`registry_records`.
+    :type records: list
+    :param batch_size: Number of rows per executemany batch.
+    :type batch_size: int
+    :return: Number of inserted method links.
+    :rtype: int
+    """
+    next_id = next_therapist_id(session)
+
+    therapists, contacts, addresses, links = [], [], [], []
+    for therapist_id, (therapist, contact, address, method_ids) in enumerate(records, start=next_id):
+        therapists.append({"id": therapist_id, **therapist})
+        contacts.append({"therapist_id": therapist_id, **contact})
+        addresses.append({"therapist_id": therapist_id, **address})
+        links.extend({"therapist_id": therapist_id, "therapy_method_id": method_id} for method_id in method_ids)
+
+    execute_batched(session, Therapist.__table__.insert(), therapists, batch_size)
+    execute_batched(session, TherapistContact.__table__.insert(), contacts, batch_size)
+    execute_batched(session, TherapistAddress.__table__.insert(), addresses, batch_size)
+    execute_batched(session, therapist_therapy_method.insert(), links, batch_size)
+    return len(links)
+
+def import_csv_data(csv_path=CSV_PATH, batch_size=BATCH_SIZE):
+    """
+    Import therapist data from a CSV file into the database.
+
+    Therapists, contacts, addresses and method links are inserted with batched
+    executemany statements in a single transaction, which also rebuilds the
+    name search index.
+
+    :param csv_path: Path to the ``PTH-CSV-Liste`` file.
+    :type csv_path: str
+    :param batch_size: Number of rows per executemany batch.
+    :type batch_size: int
+    :return: Number of imported therapists.
+    :rtype: int
+    """
+    started = time.perf_counter()
+    df = read_registry_csv(csv_path)
     session = SessionLocal()
 
-    # Add therapists
-    for _, row in df.iterrows():
-        therapist = Therapist(
-            last_name=row['Familien-/Nachname'],
-            first_name=row['Vorname'] or '',
-            title=row['Titel'] or '',
-            registration_date=parse_date(row['Eintragungdatum']),
-            registration_number=int(row['Eintragungs Nummer']),
+    try:
+        # Resolve therapy methods from an in-memory name -> id map
+        method_ids = load_method_ids(session)
+        new_methods = insert_missing_methods(
+            session, (m for methods in df['PTH-Methoden'] for m in methods), method_ids
         )
-        session.add(therapist)
-        session.flush()  # Flush to get therapist.id
-
-        # Add therapist contact
-        contact = TherapistContact(
-            email=row['Email1'],
-            website=row.get('Website', None),  # Handle missing website gracefully
-            therapist=therapist  # Associate contact with therapist
+        links = insert_therapists(session, list(registry_records(df, method_ids)), batch_size)
+        refresh_search_index(session)
+        bump_dataset_version(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    notify_dataset_change()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Imported {len(df)} therapist records ({links} method links, {new_methods} new methods) "
+        f"in {elapsed:.2f}s ({len(df) / elapsed:.0f} rows/sec)"
+    )
+    return len(df)
+
+def load_registry_state(session):
+    """
+    Load the current therapists with contact, address and method links.
+
+    :param session: Database session.
+    :return: Mapping of registration number to (therapist id, record) where the
+        record has the same shape as yielded by :func:`registry_records`.
+    :rtype: dict
+    """
+    links = {}
+    for therapist_id, method_id in session.execute(select(therapist_therapy_method)):
+        links.setdefault(therapist_id, set()).add(method_id)
+
+    rows = session.execute(
+        select(
+            Therapist.id, Therapist.last_name, Therapist.first_name, Therapist.title,
+            Therapist.registration_date, Therapist.registration_number,
+            TherapistContact.email, TherapistContact.website,
+            TherapistAddress.state, TherapistAddress.postal_code
         )
-        session.add(contact)
+        .outerjoin(TherapistContact, TherapistContact.therapist_id == Therapist.id)
+        .outerjoin(TherapistAddress, TherapistAddress.therapist_id == Therapist.id)
+    )
 
-        # Add therapist address
-        address = TherapistAddress(
-            state=row['Berufssitz Bundesland 1'],
-            postal_code=row['Berufssitz PLZ 1'],
-            therapist=therapist
+    state = {}
+    for (therapist_id, last_name, first_name, title, registration_date, registration_number,
+         email, website, address_state, postal_code) in rows:
+        therapist = {
+            "last_name": last_name,
+            "first_name": first_name,
+            "title": title,
+            "registration_date": registration_date,
+            "registration_number": registration_number,
+        }
+        contact = {"email": email, "website": website} if email is not None else None
+        address = {"state": address_state, "postal_code": postal_code} if address_state is not None else None
+        state[registration_number] = (
+            therapist_id, (therapist, contact, address, frozenset(links.get(therapist_id, ())))
         )
-        session.add(address)
-
-        # Add therapy methods
-        methods = row['PTH-Methoden'].split(',')
-        for method in methods:
-            # Check if method already exists
-            therapy_method = session.query(
-                TherapyMethod
-                ).filter_by(
-                    method_name=method.strip()
-            ).first()
-            if not therapy_method:
-                therapy_method = TherapyMethod(method_name=method.strip())
-                session.add(therapy_method)
-                session.flush()  # Flush to get therapy_method.id
-
-            # Check if the relationship already exists
-            if therapy_method not in therapist.therapy_methods:
-                therapist.therapy_methods.append(therapy_method)
-
-        print(f"Inserting therapist: {row['Familien-/Nachname']}, {row['Vorname']}")
-        print(f"Inserting contact: {row['Email1']}")
-        print(f"Inserting address: {row['Berufssitz Bundesland 1']}, {row['Berufssitz PLZ 1']}")
-        print(f"Inserting therapy methods: {methods}")
-
-    session.commit()
-    session.close()
-    print(f"Imported {len(df)} therapist records")
+    return state
+
+def delete_therapists(session, therapist_ids, batch_size=BATCH_SIZE):
+    """Delete therapists together with their contacts, addresses and method links."""
+    for start in range(0, len(therapist_ids), batch_size):
+        batch = therapist_ids[start:start + batch_size]
+        session.execute(delete(therapist_therapy_method).where(therapist_therapy_method.c.therapist_id.in_(batch)))
+        session.execute(delete(TherapistContact.__table__).where(TherapistContact.therapist_id.in_(batch)))
+        session.execute(delete(TherapistAddress.__table__).where(TherapistAddress.therapist_id.in_(batch)))
+        session.execute(delete(Therapist.__table__).where(Therapist.id.in_(batch)))
+
+def upsert_by_therapist(session, table, rows, batch_size=BATCH_SIZE):
+    """
+    Update one-per-therapist rows (contacts, addresses) and insert missing ones.
+
+    :param session: Database session.
+    :param table: Table keyed by ``therapist_id``.
+    :param rows: Pairs of (row exists, values including ``therapist_id``).
+    :type rows: list
+    :param batch_size: Number of rows per executemany batch.
+    :type batch_size: int
+    """
+    updates = [
+        {"b_therapist_id": values["therapist_id"], **{k: v for k, v in values.items() if k != "therapist_id"}}
+        for exists, values in rows if exists
+    ]
+    inserts = [values for exists, values in rows if not exists]
+    if updates:
+        statement = update(table).where(table.c.therapist_id == bindparam("b_therapist_id"))
+        execute_batched(session, statement, updates, batch_size)
+    if inserts:
+        execute_batched(session, table.insert(), inserts, batch_size)
+
+def import_csv_delta(csv_path=CSV_PATH, delete_missing=True, batch_size=BATCH_SIZE):
+    """
+    Apply a registry CSV as a delta against the existing therapists.
+
+    Rows are matched on ``registration_number``. New therapists are inserted,
+    changed therapist fields (name, title, registration date), contacts,
+    addresses and method links are updated, and
+    therapists missing from the CSV are deleted. Unchanged rows are not touched.
+    All changes, including the name search index entries of the affected
+    therapists, are applied in a single transaction.
+
+    :param csv_path: Path to the ``PTH-CSV-Liste`` file.
+    :type csv_path: str
+    :param delete_missing: Delete therapists that are no longer in the registry.
+    :type delete_missing: bool
+    :param batch_size: Number of rows per executemany batch.
+    :type batch_size: int
+    :return: Number of affected therapists per change type.
+    :rtype: dict
+    """
+    started = time.perf_counter()
+    df = read_registry_csv(csv_path)
+    session = SessionLocal()
+    counts = dict.fromkeys(
+        ("inserted", "therapists_updated", "contacts_updated", "addresses_updated",
+         "methods_updated", "deleted", "unchanged"), 0
+    )
+
+    try:
+        method_ids = load_method_ids(session)
+        insert_missing_methods(session, (m for methods in df['PTH-Methoden'] for m in methods), method_ids)
+        existing = load_registry_state(session)
+
+        new_records, therapist_updates, contact_rows, address_rows, relinked = [], [], [], [], {}
+        for record in registry_records(df, method_ids):
+            therapist, contact, address, methods = record
+            match = existing.pop(therapist["registration_number"], None)
+            if match is None:
+                new_records.append(record)
+                continue
+
+            therapist_id, (old_therapist, old_contact, old_address, old_methods) = match
+            changed = False
+            if therapist != old_therapist:
+                therapist_updates.append({"b_id": therapist_id, **therapist})
+                counts["therapists_updated"] += 1
+                changed = True
+            if contact != old_contact:
+                contact_rows.append((old_contact is not None, {"therapist_id": therapist_id, **contact}))
+                counts["contacts_updated"] += 1
+                changed = True
+            if address != old_address:
+                address_rows.append((old_address is not None, {"therapist_id": therapist_id, **address}))
+                counts["addresses_updated"] += 1
+                changed = True
+            if methods != old_methods:
+                relinked[therapist_id] = methods
+                counts["methods_updated"] += 1
+                changed = True
+            if not changed:
+                counts["unchanged"] += 1
+
+        # Insert before deleting so new therapists never take over the ids of departed ones
+        first_new_id = next_therapist_id(session)
+        insert_therapists(session, new_records, batch_size)
+        counts["inserted"] = len(new_records)
+
+        # Therapists left in the map are no longer in the registry
+        if delete_missing and existing:
+            delete_therapists(session, [therapist_id for therapist_id, _ in existing.values()], batch_size)
+            counts["deleted"] = len(existing)
+
+        if therapist_updates:
+            statement = update(Therapist.__table__).where(Therapist.id == bindparam("b_id"))
+            execute_batched(session, statement, therapist_updates, batch_size)
+        upsert_by_therapist(session, TherapistContact.__table__, contact_rows, batch_size)
+        upsert_by_therapist(session, TherapistAddress.__table__, address_rows, batch_size)
+
+        if relinked:
+            therapist_ids = list(relinked)
+            for start in range(0, len(therapist_ids), batch_size):
+                session.execute(
+                    delete(therapist_therapy_method)
+                    .where(therapist_therapy_method.c.therapist_id.in_(therapist_ids[start:start + batch_size]))
+                )
+            links = [
+                {"therapist_id": therapist_id, "therapy_method_id": method_id}
+                for therapist_id, methods in relinked.items() for method_id in methods
+            ]
+            execute_batched(session, therapist_therapy_method.insert(), links, batch_size)
+
+        # Re-index new, renamed, relinked and deleted therapists in the same transaction
+        refresh_search_index(session, [
+            *range(first_new_id, first_new_id + len(new_records)),
+            *(row["b_id"] for row in therapist_updates),
+            *relinked,
+            *(therapist_id for therapist_id, _ in existing.values() if delete_missing),
+        ])
+
+        dataset_changed = any(count for change, count in counts.items() if change != "unchanged")
+        if dataset_changed:
+            bump_dataset_version(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    if dataset_changed:
+        notify_dataset_change()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Applied registry delta from {len(df)} rows in {elapsed:.2f}s: "
+        + ", ".join(f"{count} {change.replace('_', ' ')}" for change, count in counts.items())
+    )
+    return counts
 
 if __name__ == "__main__":
-    import_csv_data()
+    parser = argparse.ArgumentParser(description="Import a therapist registry CSV into the database.")
+    parser.add_argument("csv_path", nargs="?", default=CSV_PATH, help="Path to the PTH-CSV-Liste file")
+    parser.add_argument("--delta", action="store_true", help="Apply the CSV as a delta keyed on registration number")
+    parser.add_argument("--keep-missing", action="store_true", help="Do not delete therapists missing from the CSV")
+    args = parser.parse_args()
+
+    if args.delta:
+        import_csv_delta(args.csv_path, delete_missing=not args.keep_missing)
+    else:
+        import_csv_data(args.csv_path)
@@ -0,0 +1,46 @@
+"""This module creates the database schema and applies schema changes, such as new indexes, to existing databases."""
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+from .models import Base, create_schema, get_engine
+from .search_index import SEARCH_TABLE, ensure_search_index, refresh_search_index
+
+def migrate(bind=None):
+    """
+    Create missing tables and indexes and refresh the query planner statistics.
+
+    ``create_all`` only creates indexes together with new tables, so indexes
+    declared on existing tables are created here one by one. The name search
+    index is created and filled if it is missing or empty.
+
+    :param bind: Engine of the database to migrate, defaults to the engine of ``DATABASE_URL``.
+    :return: Names of the created indexes.
+    :rtype: list
+    """
+    bind = bind or get_engine()
+    create_schema(bind)
+
+    created = []
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                index.create(bind=bind)
+                created.append(index.name)
+
+    # Fill the name search index of databases imported before it existed
+    with Session(bind) as session:
+        ensure_search_index(session)
+        if not session.scalar(text(f"SELECT count(*) FROM {SEARCH_TABLE}")):
+            if refresh_search_index(session):
+                created.append(SEARCH_TABLE)
+            session.commit()
+
+    with bind.begin() as connection:
+        connection.execute(text("ANALYZE"))
+
+    print(f"Created {len(created)} indexes: {', '.join(created) or 'none'}")
+    return created
+
+if __name__ == "__main__":
+    migrate()
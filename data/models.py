@@ -1,5 +1,10 @@
 """This module contains SQLAlchemy database models for therapy data."""
-from sqlalchemy import Table, Column, Integer, String, Date, ForeignKey, create_engine
+import os
+import threading
+from sqlalchemy import Table, Column, Index, Integer, Float, String, Date, DateTime, ForeignKey, create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base
 
 Base = declarative_base()
@@ -9,18 +14,22 @@ therapist_therapy_method = Table(
     'therapist_therapy_method',
     Base.metadata,
     Column('therapist_id', Integer, ForeignKey('therapists.id'), primary_key=True),
-    Column('therapy_method_id', Integer, ForeignKey('therapy_methods.id'), primary_key=True)
+    Column('therapy_method_id', Integer, ForeignKey('therapy_methods.id'), primary_key=True),
+    # Reverse direction of the primary key, for lookups by method
+    Index('ix_therapist_therapy_method_method_therapist', 'therapy_method_id', 'therapist_id')
 )
 
 class Therapist(Base):
     """Data model for therapists."""
     __tablename__ = "therapists"
+    # Never reuse the ids of deleted therapists
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     last_name = Column(String, nullable=False)
     first_name = Column(String, nullable=False)
     title = Column(String, nullable=True)
-    registration_date = Column(Date, nullable=False)
+    registration_date = Column(Date, nullable=False, index=True)
     registration_number = Column(Integer, nullable=False, unique=True)
     therapy_methods = relationship("TherapyMethod", secondary=therapist_therapy_method, back_populates="therapist")
     contacts = relationship("TherapistContact", back_populates="therapist", uselist=False)
@@ -33,7 +42,7 @@ class TherapistContact(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     email = Column(String, nullable=False)
     website = Column(String, nullable=True) # until we have more data
-    therapist_id = Column(Integer, ForeignKey("therapists.id"), nullable=False)
+    therapist_id = Column(Integer, ForeignKey("therapists.id"), nullable=False, index=True)
     therapist = relationship("Therapist", back_populates="contacts")
 
 class TherapistAddress(Base):
@@ -41,9 +50,9 @@ class TherapistAddress(Base):
     __tablename__ = "therapist_addresses"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    state = Column(String, nullable=False)
-    postal_code = Column(String, nullable=False)
-    therapist_id = Column(Integer, ForeignKey("therapists.id"), nullable=False)
+    state = Column(String, nullable=False, index=True)
+    postal_code = Column(String, nullable=False, index=True)
+    therapist_id = Column(Integer, ForeignKey("therapists.id"), nullable=False, index=True)
     therapist = relationship("Therapist", back_populates="addresses") # one-to-many
 
 class TherapyMethod(Base):
@@ -51,8 +60,8 @@ class TherapyMethod(Base):
     __tablename__ = "therapy_methods"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    method_name = Column(String, nullable=False, unique=False)
-    cluster_id = Column(Integer, ForeignKey("therapy_method_clusters.id"), nullable=False)
+    method_name = Column(String, nullable=False, unique=False, index=True)
+    cluster_id = Column(Integer, ForeignKey("therapy_method_clusters.id"), nullable=False, index=True)
     therapy_cluster = relationship("TherapyMethodCluster", back_populates="methods", uselist=False)
     therapist = relationship("Therapist", secondary=therapist_therapy_method, back_populates="therapy_methods")
 
@@ -77,12 +86,271 @@ class TherapyType(Base):
     cluster_id = Column(Integer, ForeignKey("therapy_method_clusters.id"), nullable=False)
     therapy_cluster = relationship("TherapyMethodCluster", uselist=False)
 
+class ApiKey(Base):
+    """Data model for API keys issued to integrations; only a hash of each key is stored."""
+    __tablename__ = "api_keys"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False)
+    key_hash = Column(String, nullable=False, unique=True)
+    rate_limit = Column(Float, nullable=True) # requests per second, unlimited if NULL
+    burst = Column(Integer, nullable=True) # bucket size, defaults to the rate limit
+    max_concurrency = Column(Integer, nullable=True) # requests in flight, unlimited if NULL
+    created_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+
+
+# Database configuration, overridable through the environment
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./therapists.db")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+# SQLite pragmas applied to every new connection, per profile
+SQLITE_PROFILES = {
+    "default": {},
+    # API workers: WAL readers never block on the writer, reads served from mmap and cache
+    "read": {
+        "journal_mode": "WAL",
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative values are KiB
+        "temp_store": "MEMORY",
+        "query_only": "ON",
+    },
+    # Import and mapping scripts: WAL with fewer fsyncs
+    "write": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+        "temp_store": "MEMORY",
+    },
+}
+DB_PROFILE = os.getenv("DB_PROFILE", "write")
+ASYNC_DB_PROFILE = os.getenv("ASYNC_DB_PROFILE", "read")
+
+# Suffix of the file naming the live generation of a database, written by python -m data.refresh
+RELEASE_SUFFIX = ".current"
+
+def release_pointer(url):
+    """
+    Return the file naming the live generation of a SQLite database.
+
+    :param url: Database URL.
+    :type url: str
+    :return: Pointer file path, or None for databases that are not SQLite files.
+    :rtype: str
+    """
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return os.path.abspath(url.database) + RELEASE_SUFFIX
+
+def current_database_url(url):
+    """
+    Resolve a database URL to its live generation.
+
+    Refreshed databases are built into new files next to the configured one,
+    and a pointer file names the live one. Without a pointer the configured
+    file is used.
+
+    :param url: Configured database URL.
+    :type url: str
+    :return: URL of the live database file.
+    :rtype: sqlalchemy.engine.URL
+    """
+    url = make_url(url)
+    pointer = release_pointer(url)
+    try:
+        with open(pointer, encoding="utf-8") as f:
+            generation = f.read().strip()
+    except (TypeError, FileNotFoundError):
+        return url
+    return url.set(database=os.path.join(os.path.dirname(pointer), generation))
+
+def apply_sqlite_profile(engine, profile):
+    """
+    Apply the pragmas of a SQLite profile to every new connection of an engine.
+
+    :param engine: Engine to configure (the sync engine of an async engine).
+    :param profile: Profile name, see ``SQLITE_PROFILES``.
+    :type profile: str
+    """
+    pragmas = SQLITE_PROFILES[profile]
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+def create_db_engine(url=None, profile=None, is_async=False, pool_size=None, max_overflow=None):
+    """
+    Create a database engine configured from the environment.
+
+    File-based SQLite engines get a queue pool of ``pool_size`` connections plus
+    ``max_overflow`` and the pragmas of the given profile on every connection.
+
+    :param url: Database URL, defaults to the live generation of ``DATABASE_URL`` or ``ASYNC_DATABASE_URL``.
+    :type url: str
+    :param profile: SQLite profile name, defaults to ``DB_PROFILE`` or ``ASYNC_DB_PROFILE``.
+    :type profile: str
+    :param is_async: Create an ``AsyncEngine``.
+    :type is_async: bool
+    :param pool_size: Number of pooled connections, defaults to ``DB_POOL_SIZE``.
+    :type pool_size: int
+    :param max_overflow: Connections allowed above the pool size, defaults to ``DB_MAX_OVERFLOW``.
+    :type max_overflow: int
+    :return: The configured engine.
+    """
+    url = make_url(url) if url else current_database_url(ASYNC_DATABASE_URL if is_async else DATABASE_URL)
+    profile = profile or (ASYNC_DB_PROFILE if is_async else DB_PROFILE)
+    is_sqlite = url.get_backend_name() == "sqlite"
+
+    options = {}
+    if not is_sqlite or url.database not in (None, "", ":memory:"):
+        options["pool_size"] = DB_POOL_SIZE if pool_size is None else pool_size
+        options["max_overflow"] = DB_MAX_OVERFLOW if max_overflow is None else max_overflow
+        if is_async:
+            options["poolclass"] = AsyncAdaptedQueuePool
+
+    if is_async:
+        engine = create_async_engine(url, **options)
+        sync_engine = engine.sync_engine
+    else:
+        engine = sync_engine = create_engine(url, **options)
+
+    if is_sqlite:
+        apply_sqlite_profile(sync_engine, profile)
+    return engine
+
+# Engines are created on first use, so importing the models opens no database
+_engines = {}
+_engines_lock = threading.Lock()
+
+def _get_or_create_engine(is_async):
+    """Return the process-wide engine of a kind, creating it on first use."""
+    engine = _engines.get(is_async)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(is_async)
+            if engine is None:
+                engine = _engines[is_async] = create_db_engine(is_async=is_async)
+    return engine
+
+def get_engine():
+    """
+    Return the engine of the import, population and mapping scripts.
+
+    :return: Engine for ``DATABASE_URL`` with the ``DB_PROFILE`` pragmas.
+    """
+    return _get_or_create_engine(False)
+
+def get_async_engine():
+    """
+    Return the async engine of the API read path (aiosqlite driver).
+
+    :return: Async engine for ``ASYNC_DATABASE_URL`` with the ``ASYNC_DB_PROFILE`` pragmas.
+    """
+    return _get_or_create_engine(True)
+
+def bind_engine(engine, is_async=False):
+    """
+    Make an engine the process-wide engine of its kind and bind new sessions to it.
+
+    Sessions created before keep their engine, so they finish on the previous
+    database; the caller disposes the returned engine once they are done.
+
+    :param engine: Engine, or async engine with ``is_async``.
+    :param is_async: Replace the async engine of the API read path.
+    :type is_async: bool
+    :return: The previous engine, or None if none was created yet.
+    """
+    with _engines_lock:
+        previous = _engines.get(is_async)
+        _engines[is_async] = engine
+        (AsyncSessionLocal if is_async else SessionLocal).configure(bind=engine)
+    return previous
+
+class _BindOnFirstUse:
+    """Session factory mixin binding the factory to its engine when the first session is made."""
+
+    def __init__(self, get_bind, **kw):
+        super().__init__(**kw)
+        self._get_bind = get_bind
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=self._get_bind())
+        return super().__call__(**local_kw)
+
+class LazySessionmaker(_BindOnFirstUse, sessionmaker):
+    """``sessionmaker`` creating its engine with the first session."""
+
+class LazyAsyncSessionmaker(_BindOnFirstUse, async_sessionmaker):
+    """``async_sessionmaker`` creating its engine with the first session."""
 
 # Database setup
-DATABASE_URL = "sqlite:///./therapists.db"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = LazySessionmaker(get_engine, autocommit=False, autoflush=False)
+
+# Async database setup for the API read path
+AsyncSessionLocal = LazyAsyncSessionmaker(get_async_engine, autoflush=False, expire_on_commit=False)
+
+def create_schema(bind=None):
+    """
+    Create the missing tables with their indexes.
+
+    Called by ``python -m data.migrate``, which also adds indexes to existing
+    tables; importing this module no longer creates the schema.
+
+    :param bind: Engine of the database, defaults to :func:`get_engine`.
+    """
+    Base.metadata.create_all(bind=bind or get_engine())
+
+
+# Dataset version, stored in the SQLite header and bumped by every data change
+_dataset_listeners = []
+
+def get_dataset_version(session):
+    """
+    Return the current dataset version of the database.
+
+    :param session: Database session or connection.
+    :return: Dataset version, incremented by :func:`bump_dataset_version`.
+    :rtype: int
+    """
+    return session.execute(text("PRAGMA user_version")).scalar()
+
+def bump_dataset_version(session):
+    """
+    Increment the dataset version as part of the current transaction.
+
+    Import, population and mapping scripts call this before committing so that
+    running API workers rebuild their in-memory indexes and caches.
+
+    :param session: Database session or connection.
+    :return: The new dataset version.
+    :rtype: int
+    """
+    version = get_dataset_version(session) + 1
+    session.execute(text(f"PRAGMA user_version = {int(version)}"))
+    return version
+
+def on_dataset_change(listener):
+    """
+    Register a callable to run when this process changes the dataset.
+
+    :param listener: Callable without arguments.
+    :type listener: callable
+    :return: The listener, so this can be used as a decorator.
+    :rtype: callable
+    """
+    _dataset_listeners.append(listener)
+    return listener
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-print("Database tables created successfully.")
+def notify_dataset_change():
+    """Reload hook called by the import, population and mapping scripts after committing."""
+    for listener in _dataset_listeners:
+        listener()
@@ -1,21 +1,13 @@
 """This module populates the database with therapy clusters based on existing therapy methods."""
-from .models import SessionLocal, TherapyMethodCluster, TherapyType
-from .run_mappings import THERAPY_CLUSTERS, THERAPY_TYPES
+from .models import SessionLocal, TherapyMethodCluster, TherapyType, bump_dataset_version, notify_dataset_change
+from .run_mappings import THERAPY_CLUSTERS, THERAPY_TYPES, THERAPY_TYPE_TO_CLUSTERS
 
 def populate_tables():
     """Populate the database with predefined therapy clusters and types."""
     session = SessionLocal()
 
-    # Populate types
-    for type_short, type_name in THERAPY_TYPES.items():
-        therapy_type = TherapyType(
-            type_short=type_short,
-            type_name=type_name,
-            description=f"{type_name} type description"
-        )
-        session.add(therapy_type)
-
     # Populate clusters
+    clusters = {}
     for cluster_short, cluster_name in THERAPY_CLUSTERS.items():
         cluster = TherapyMethodCluster(
             cluster_short=cluster_short,
@@ -23,9 +15,26 @@ def populate_tables():
             description=f"{cluster_name} cluster description"
         )
         session.add(cluster)
+        clusters[cluster_short] = cluster
+
+    # Flush the clusters first, every type needs the id of its cluster
+    session.flush()
+
+    # Populate types
+    for type_short, type_name in THERAPY_TYPES.items():
+        therapy_type = TherapyType(
+            type_short=type_short,
+            type_name=type_name,
+            description=f"{type_name} type description",
+            cluster_id=clusters[THERAPY_TYPE_TO_CLUSTERS[type_short]].id
+        )
+        session.add(therapy_type)
 
-    # Commit all changes at once
+    # Flush first so the version bump is part of the same transaction as the changes
+    session.flush()
+    bump_dataset_version(session)
     session.commit()
+    notify_dataset_change()
     print(f"Inserted {len(THERAPY_CLUSTERS)} therapy clusters and {len(THERAPY_TYPES)} therapy types into the database.")
 
 if __name__ == "__main__":
@@ -0,0 +1,259 @@
+"""This module refreshes the registry into a new database file and switches the API to it once it is valid."""
+import argparse
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+from sqlalchemy import func, insert, inspect, select, text
+from sqlalchemy.orm import Session
+from .models import (
+    DATABASE_URL, RELEASE_SUFFIX, ApiKey, Therapist, TherapyMethodCluster, TherapyType, bind_engine,
+    create_db_engine, current_database_url, get_dataset_version, release_pointer
+)
+from .import_data import CSV_PATH, import_csv_data, import_csv_delta
+from .migrate import migrate
+from .populate_tables import populate_tables
+from .run_mappings import THERAPY_CLUSTERS, THERAPY_TYPES, map_methods_to_clusters, map_types_to_clusters
+from .search_index import SEARCH_TABLE
+from .snapshot import CatalogueSnapshot, write_snapshot
+
+# A refresh may shrink the registry by at most this share before it is refused
+MAX_SHRINK = float(os.getenv("REFRESH_MAX_SHRINK", "0.2"))
+# Generations kept on disk: the live one and the previous one, which API workers may still be draining
+KEEP_GENERATIONS = 2
+
+# Files that belong to a generation, next to the database file itself
+SNAPSHOT_SUFFIX = ".snapshot"
+GENERATION_FILES = ("", "-wal", "-shm", "-journal", SNAPSHOT_SUFFIX)
+
+# Tables maintained through the API rather than the registry, copied from the live generation
+CARRIED_TABLES = (ApiKey.__table__,)
+
+class RefreshError(Exception):
+    """Raised when a new database generation fails validation; the live database is left untouched."""
+
+def generation_path(live_path, now=None):
+    """
+    Return the file of a new generation of a database.
+
+    :param live_path: Configured database file, e.g. ``therapists.db``.
+    :type live_path: str
+    :param now: Build time, defaults to now.
+    :type now: datetime
+    :return: ``<live_path>.<timestamp>``.
+    :rtype: str
+    """
+    return f"{live_path}.{(now or datetime.now()).strftime('%Y%m%dT%H%M%S%f')}"
+
+def _generations(live_path):
+    """Return the generation files of a database, oldest first."""
+    directory, name = os.path.split(live_path)
+    pattern = re.compile(re.escape(name) + r"\.\d{8}T\d{12}$")
+    return sorted(os.path.join(directory, entry) for entry in os.listdir(directory or ".") if pattern.match(entry))
+
+def _count(session, table):
+    """Count the rows of a table."""
+    return session.scalar(select(func.count()).select_from(table))
+
+def validate_database(engine, live_engine=None, max_shrink=MAX_SHRINK):
+    """
+    Check a new database generation before it goes live.
+
+    :param engine: Engine of the new generation.
+    :param live_engine: Engine of the live generation, to compare the registry size with.
+    :param max_shrink: Share of therapists the registry may lose.
+    :type max_shrink: float
+    :raises RefreshError: If a check fails.
+    :return: Number of therapists in the new generation.
+    :rtype: int
+    """
+    with Session(engine) as session:
+        result = session.scalar(text("PRAGMA quick_check"))
+        if result != "ok":
+            raise RefreshError(f"Integrity check failed: {result}")
+        therapists = _count(session, Therapist)
+        if not therapists:
+            raise RefreshError("The new database holds no therapists")
+        if _count(session, TherapyMethodCluster) != len(THERAPY_CLUSTERS) or _count(session, TherapyType) != len(THERAPY_TYPES):
+            raise RefreshError("Therapy clusters or types are incomplete")
+        if session.scalar(text(f"SELECT count(*) FROM {SEARCH_TABLE}")) != therapists:
+            raise RefreshError("The name search index does not cover every therapist")
+
+    if live_engine is not None and inspect(live_engine).has_table(Therapist.__tablename__):
+        with Session(live_engine) as session:
+            live_therapists = _count(session, Therapist)
+        if therapists < live_therapists * (1 - max_shrink):
+            raise RefreshError(
+                f"The registry would shrink from {live_therapists} to {therapists} therapists, "
+                f"more than {max_shrink:.0%}"
+            )
+    return therapists
+
+def carry_over(engine, live_engine):
+    """
+    Copy the tables maintained through the API, such as issued API keys, from the live generation.
+
+    :param engine: Engine of the new generation.
+    :param live_engine: Engine of the live generation.
+    :return: Number of copied rows.
+    :rtype: int
+    """
+    copied = 0
+    live_tables = set(inspect(live_engine).get_table_names())
+    with live_engine.connect() as live, engine.begin() as connection:
+        for table in CARRIED_TABLES:
+            if table.name not in live_tables:
+                continue
+            rows = [dict(row) for row in live.execute(select(table)).mappings()]
+            connection.execute(table.delete())
+            if rows:
+                connection.execute(insert(table), rows)
+            copied += len(rows)
+    return copied
+
+def publish(live_path, path):
+    """
+    Make a generation the live database by atomically replacing the pointer file.
+
+    :param live_path: Configured database file.
+    :type live_path: str
+    :param path: Generation file in the same directory.
+    :type path: str
+    """
+    pointer = live_path + RELEASE_SUFFIX
+    temporary = f"{pointer}.{os.getpid()}"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(path))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, pointer)
+
+def prune_generations(live_path, keep=KEEP_GENERATIONS):
+    """
+    Remove old generations with their WAL, shared memory and snapshot files.
+
+    The live generation and the ones before it, up to ``keep`` in total, are
+    kept so API workers can finish the requests they started on them.
+
+    :param live_path: Configured database file.
+    :type live_path: str
+    :param keep: Number of generations to keep.
+    :type keep: int
+    :return: Removed generation files.
+    :rtype: list
+    """
+    current = current_database_url(f"sqlite:///{live_path}").database
+    generations = _generations(live_path)
+    if current in generations:
+        generations = generations[:generations.index(current) + 1]
+    removed = generations[:-keep] if keep else generations
+    for path in removed:
+        for suffix in GENERATION_FILES:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return removed
+
+def refresh(csv_path=CSV_PATH, live_url=None, delta=False, max_shrink=MAX_SHRINK):
+    """
+    Build the registry into a new database file, validate it and switch to it.
+
+    A full refresh runs the migration, population, import and mapping steps
+    on an empty file. A delta refresh copies the live generation and applies
+    the CSV as a delta. The dataset version of the new generation is raised
+    above the live one, its catalogue snapshot is built, and the pointer file
+    is replaced only if validation passes. API workers pick the new file up
+    within ``DATASET_CHECK_INTERVAL`` seconds, finish the requests they started
+    on the previous one and then close it.
+
+    :param csv_path: Path to the ``PTH-CSV-Liste`` file.
+    :type csv_path: str
+    :param live_url: Configured database URL, defaults to ``DATABASE_URL``.
+    :type live_url: str
+    :param delta: Apply the CSV as a delta to a copy of the live generation.
+    :type delta: bool
+    :param max_shrink: Share of therapists the registry may lose.
+    :type max_shrink: float
+    :raises RefreshError: If the new generation is invalid; it is removed and the live one kept.
+    :return: The new generation file.
+    :rtype: str
+    """
+    live_url = live_url or DATABASE_URL
+    pointer = release_pointer(live_url)
+    if pointer is None:
+        raise RefreshError("Refreshes need a SQLite database file")
+    live_path = pointer[:-len(RELEASE_SUFFIX)]
+    current_path = current_database_url(live_url).database
+    path = generation_path(live_path)
+
+    live_engine = create_db_engine(f"sqlite:///{current_path}", profile="default") if os.path.exists(current_path) else None
+    engine = create_db_engine(f"sqlite:///{path}", profile="write")
+    previous = bind_engine(engine)
+    started = time.perf_counter()
+    try:
+        if delta:
+            if live_engine is None:
+                raise RefreshError("A delta refresh needs a live database")
+            # The backup API copies a consistent state even while the API reads the live file
+            source, target = sqlite3.connect(current_path), sqlite3.connect(path)
+            try:
+                source.backup(target)
+            finally:
+                source.close()
+                target.close()
+            migrate(engine)
+            import_csv_delta(csv_path)
+        else:
+            migrate(engine)
+            populate_tables()
+            import_csv_data(csv_path)
+            map_methods_to_clusters()
+            map_types_to_clusters()
+        migrate(engine)
+
+        with Session(engine) as session:
+            version = get_dataset_version(session)
+            if live_engine is not None:
+                with Session(live_engine) as live:
+                    version = max(version, get_dataset_version(live) + 1)
+            # Dataset versions only grow across generations, so API caches rebuild on the switch
+            session.execute(text(f"PRAGMA user_version = {int(version)}"))
+            session.commit()
+        therapists = validate_database(engine, live_engine, max_shrink)
+
+        if live_engine is not None:
+            carry_over(engine, live_engine)
+        with Session(engine) as session:
+            write_snapshot(session, path + SNAPSHOT_SUFFIX)
+        if len(CatalogueSnapshot(path + SNAPSHOT_SUFFIX)) != therapists:
+            raise RefreshError("The catalogue snapshot does not cover every therapist")
+        with engine.connect() as connection:
+            connection.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    except BaseException:
+        engine.dispose()
+        for suffix in GENERATION_FILES:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        raise
+    finally:
+        bind_engine(previous)
+        if live_engine is not None:
+            live_engine.dispose()
+    engine.dispose()
+
+    publish(live_path, path)
+    removed = prune_generations(live_path)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Published {os.path.basename(path)} with {therapists} therapists (dataset version {version}) "
+        f"in {elapsed:.2f}s, removed {len(removed)} old generations"
+    )
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the registry into a new database file and switch to it.")
+    parser.add_argument("csv_path", nargs="?", default=CSV_PATH, help="Path to the PTH-CSV-Liste file")
+    parser.add_argument("--delta", action="store_true", help="Apply the CSV as a delta to a copy of the live database")
+    parser.add_argument("--max-shrink", type=float, default=MAX_SHRINK, help="Share of therapists the registry may lose")
+    args = parser.parse_args()
+    refresh(args.csv_path, delta=args.delta, max_shrink=args.max_shrink)
@@ -1,5 +1,6 @@
-"""This module maps therapy types to therapy methods."""
-from .models import SessionLocal, TherapyMethod, TherapyMethodCluster, TherapyType
+"""This module maps therapy methods and therapy types to their clusters."""
+from sqlalchemy import case, select, update
+from .models import SessionLocal, TherapyMethod, TherapyMethodCluster, TherapyType, bump_dataset_version, notify_dataset_change
 
 #---------------------
 # MAPPINGS
@@ -55,62 +56,108 @@ THERAPY_TYPE_TO_CLUSTERS = {
 # MAPPING FUNCTIONS
 #---------------------
 
-def map_methods_to_clusters():
-    """Function to map therapy methods to their respective clusters."""
+def load_cluster_ids(session):
+    """
+    Load the cluster short code to id map.
+
+    :param session: Database session.
+    :return: Mapping of cluster short code to cluster id.
+    :rtype: dict
+    """
+    return dict(session.execute(select(TherapyMethodCluster.cluster_short, TherapyMethodCluster.id)).all())
+
+def _resolve_clusters(mapping, cluster_ids, label):
+    """
+    Resolve the cluster short codes of a mapping to ids, skipping clusters that do not exist.
+
+    :return: Key to cluster id map.
+    :rtype: dict
+    """
+    resolved = {}
+    for key, cluster_short in mapping.items():
+        if cluster_short in cluster_ids:
+            resolved[key] = cluster_ids[cluster_short]
+        else:
+            print(f"Cluster {cluster_short} not found for {label} {key}")
+    return resolved
+
+def apply_method_clusters(session, cluster_ids=None):
+    """
+    Assign every therapy method its cluster from ``THERAPY_METHODS_TO_CLUSTERS`` in one statement.
+
+    The mapping is applied as a single ``UPDATE`` with a ``CASE`` over the
+    method name, so every row of a duplicated method name is updated. The
+    caller's session is used, so the mapping can run inside an import
+    transaction; the caller commits.
+
+    :param session: Database session.
+    :param cluster_ids: Cluster short code to id map, loaded if not given.
+    :type cluster_ids: dict
+    :return: Number of updated rows and the sorted names of methods without a mapping.
+    :rtype: tuple
+    """
+    if cluster_ids is None:
+        cluster_ids = load_cluster_ids(session)
+    mapping = _resolve_clusters(THERAPY_METHODS_TO_CLUSTERS, cluster_ids, "method")
+
+    updated = 0
+    if mapping:
+        updated = session.execute(
+            update(TherapyMethod)
+            .where(TherapyMethod.method_name.in_(mapping))
+            .values(cluster_id=case(mapping, value=TherapyMethod.method_name))
+        ).rowcount
+    names = session.scalars(select(TherapyMethod.method_name).distinct()).all()
+    return updated, sorted(set(names) - mapping.keys())
+
+def apply_type_clusters(session, cluster_ids=None):
+    """
+    Assign every therapy type its cluster from ``THERAPY_TYPE_TO_CLUSTERS`` in one statement.
+
+    :param session: Database session; the caller commits.
+    :param cluster_ids: Cluster short code to id map, loaded if not given.
+    :type cluster_ids: dict
+    :return: Number of updated rows and the sorted short codes of types without a mapping.
+    :rtype: tuple
+    """
+    if cluster_ids is None:
+        cluster_ids = load_cluster_ids(session)
+    mapping = _resolve_clusters(THERAPY_TYPE_TO_CLUSTERS, cluster_ids, "therapy type")
+
+    updated = 0
+    if mapping:
+        updated = session.execute(
+            update(TherapyType)
+            .where(TherapyType.type_short.in_(mapping))
+            .values(cluster_id=case(mapping, value=TherapyType.type_short))
+        ).rowcount
+    shorts = session.scalars(select(TherapyType.type_short)).all()
+    return updated, sorted(set(shorts) - mapping.keys())
+
+def _run_mapping(apply, label):
+    """Apply a mapping in its own transaction, bump the dataset version and report unmapped entries."""
     session = SessionLocal()
+    try:
+        updated, unmapped = apply(session)
+        # Flush first so the version bump is part of the same transaction as the changes
+        session.flush()
+        bump_dataset_version(session)
+        session.commit()
+    finally:
+        session.close()
+    notify_dataset_change()
+    if unmapped:
+        print(f"No cluster mapping for {len(unmapped)} {label}: {', '.join(unmapped)}")
+    print(f"Mapped {updated} {label} to clusters successfully.")
+    return updated, unmapped
 
-    # Map therapy methods to clusters
-    for method_name, cluster_short in THERAPY_METHODS_TO_CLUSTERS.items():
-        # Find the cluster by its short code
-        cluster = session.query(TherapyMethodCluster).filter_by(cluster_short=cluster_short).first()
-        if not cluster:
-            print(f"Cluster {cluster_short} not found for method {method_name}")
-            continue
-
-        # Find the therapy method by its name
-        method = session.query(TherapyMethod).filter_by(method_name=method_name).first()
-        if not method:
-            print(f"Therapy method {method_name} not found")
-            continue
-
-        # Assign the cluster to the therapy method
-        method.cluster_id = cluster.id
-        method.name = cluster.cluster_name
-        session.add(method)
-
-    # Commit changes
-    session.commit()
-    print("Mapped therapy methods to clusters successfully.")
-    session.close()
+def map_methods_to_clusters():
+    """Function to map therapy methods to their respective clusters."""
+    return _run_mapping(apply_method_clusters, "therapy methods")
 
 def map_types_to_clusters():
     """Function to map therapy types to their respective clusters."""
-    session = SessionLocal()
-
-    # Iterate over therapy types and their corresponding clusters
-    for type_short, cluster_short in THERAPY_TYPE_TO_CLUSTERS.items():
-        # Find the cluster by its short code
-        cluster = session.query(TherapyMethodCluster).filter_by(cluster_short=cluster_short).first()
-        if not cluster:
-            print(f"Cluster {cluster_short} not found for therapy type {type_short}")
-            continue
-
-        # Find the therapy type by its short code
-        therapy_type = session.query(TherapyType).filter_by(type_short=type_short).first()
-        if not therapy_type:
-            print(f"Therapy type {type_short} not found")
-            continue
-
-        # Assign the cluster ID to the therapy type
-        therapy_type.cluster_id = cluster.id
-        session.add(therapy_type)
-
-        print(f"Mapped therapy type {type_short} to cluster {cluster.cluster_name} (ID: {cluster.id})")
-
-    # Commit changes
-    session.commit()
-    print("Mapped therapy types to clusters successfully.")
-    session.close()
+    return _run_mapping(apply_type_clusters, "therapy types")
 
 if __name__ == "__main__":
     map_methods_to_clusters()
@@ -0,0 +1,148 @@
+"""This module maintains the full-text therapist name search index (SQLite FTS5)."""
+import re
+from sqlalchemy import select, text
+from .models import Therapist, TherapyMethod, therapist_therapy_method
+
+SEARCH_TABLE = "therapist_search"
+
+# Number of therapist ids refreshed per statement (SQLite variable limit)
+REFRESH_BATCH_SIZE = 500
+
+# German umlauts spelled out, so "Müller" and "Mueller" index and search alike
+UMLAUT_FOLDING = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+_TOKEN = re.compile(r"\w+")
+
+def fold_text(value):
+    """
+    Lowercase a text and spell out German umlauts.
+
+    :param value: Text to fold, or None.
+    :type value: str
+    :return: Folded text.
+    :rtype: str
+    """
+    return (value or "").lower().translate(UMLAUT_FOLDING)
+
+def ensure_search_index(connection):
+    """
+    Create the search index table if it does not exist.
+
+    The table holds the therapist names (with title) and therapy method names
+    per therapist id. Every text is stored folded and as is; the tokenizer
+    strips diacritics, so "Müller" matches "Mueller" and "Muller".
+
+    :param connection: Database connection or session.
+    """
+    connection.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        "name, methods, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    ))
+
+def _search_rows(session, therapist_ids):
+    """Build the search rows of the given therapists, or of all therapists."""
+    names = select(Therapist.id, Therapist.title, Therapist.first_name, Therapist.last_name)
+    methods = (
+        select(therapist_therapy_method.c.therapist_id, TherapyMethod.method_name)
+        .join(TherapyMethod, TherapyMethod.id == therapist_therapy_method.c.therapy_method_id)
+    )
+    if therapist_ids is not None:
+        names = names.where(Therapist.id.in_(therapist_ids))
+        methods = methods.where(therapist_therapy_method.c.therapist_id.in_(therapist_ids))
+
+    method_names = {}
+    for therapist_id, method_name in session.execute(methods):
+        method_names.setdefault(therapist_id, []).append(method_name)
+
+    rows = []
+    for therapist_id, title, first_name, last_name in session.execute(names):
+        name = " ".join(part for part in (title, first_name, last_name) if part)
+        method_text = " ".join(method_names.get(therapist_id, ()))
+        rows.append({
+            "rowid": therapist_id,
+            "name": f"{fold_text(name)} {name}",
+            "methods": f"{fold_text(method_text)} {method_text}",
+        })
+    return rows
+
+def refresh_search_index(session, therapist_ids=None):
+    """
+    Bring the search index up to date for some or all therapists.
+
+    Rows of the given therapists are replaced with their current names and
+    methods, and removed for therapists that no longer exist. Runs in the
+    caller's transaction, so it commits together with the data changes.
+
+    :param session: Database session.
+    :param therapist_ids: Therapist ids to refresh, or None to rebuild the whole index.
+    :type therapist_ids: iterable
+    :return: Number of indexed therapists.
+    :rtype: int
+    """
+    ensure_search_index(session)
+    insert = text(f"INSERT INTO {SEARCH_TABLE} (rowid, name, methods) VALUES (:rowid, :name, :methods)")
+
+    if therapist_ids is None:
+        session.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+        rows = _search_rows(session, None)
+        if rows:
+            session.execute(insert, rows)
+        return len(rows)
+
+    therapist_ids = sorted(set(therapist_ids))
+    indexed = 0
+    for start in range(0, len(therapist_ids), REFRESH_BATCH_SIZE):
+        batch = therapist_ids[start:start + REFRESH_BATCH_SIZE]
+        session.execute(
+            text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({', '.join(map(str, batch))})")
+        )
+        rows = _search_rows(session, batch)
+        if rows:
+            session.execute(insert, rows)
+        indexed += len(rows)
+    return indexed
+
+def match_expression(query):
+    """
+    Build an FTS5 match expression from a user query.
+
+    Every word must match as a prefix, in its umlaut-folded or its original
+    spelling. Words are quoted, so the query cannot inject FTS5 syntax.
+
+    :param query: Search text, e.g. ``"Dr. Müll"``.
+    :type query: str
+    :return: Match expression, or None if the query has no words.
+    :rtype: str
+    """
+    terms = []
+    for word in _TOKEN.findall(query.lower()):
+        variants = sorted({fold_text(word), word})
+        terms.append("(" + " OR ".join(f'"{variant}"*' for variant in variants) + ")")
+    return " AND ".join(terms) or None
+
+def search_therapist_ids(session, query, limit=None):
+    """
+    Return the ids of therapists matching a name or method search, best match first.
+
+    Matches in the name count ten times as much as matches in the method names.
+
+    :param session: Database session.
+    :param query: Search text.
+    :type query: str
+    :param limit: Maximum number of ids to return, or None for all matches.
+    :type limit: int
+    :return: Matching therapist ids ordered by relevance.
+    :rtype: list
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    statement = (
+        f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :expression "
+        f"ORDER BY bm25({SEARCH_TABLE}, 10.0, 1.0), rowid"
+    )
+    parameters = {"expression": expression}
+    if limit is not None:
+        statement += " LIMIT :limit"
+        parameters["limit"] = limit
+    return session.execute(text(statement), parameters).scalars().all()
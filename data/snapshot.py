@@ -0,0 +1,354 @@
+"""This module compiles the therapist catalogue into a read-only snapshot file that API workers memory-map."""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_left
+from datetime import date
+from sqlalchemy import select
+from .models import (
+    DATABASE_URL, SessionLocal, Therapist, TherapistAddress, TherapistContact, TherapyMethod,
+    TherapyMethodCluster, current_database_url, get_dataset_version, therapist_therapy_method
+)
+
+MAGIC = b"ELISCAT1"
+FORMAT_VERSION = 1
+
+# Magic, format version, little-endian flag, dataset version, therapist count, section count
+HEADER = struct.Struct("<8sIIqII")
+# Section name, offset and length in bytes
+SECTION = struct.Struct("<24sQQ")
+# Sections start on multiples of this many bytes
+ALIGNMENT = 8
+
+# String reference of NULL values
+NULL = 0xFFFFFFFF
+
+# Columns indexed by therapist position: ids ascending, dates as ordinals and strings as string table references
+THERAPIST_SECTIONS = {
+    "id": "i",
+    "registration_number": "q",
+    "registration_date": "i",
+    "last_name": "I",
+    "first_name": "I",
+    "title": "I",
+    "state": "I",
+    "postal_code": "I",
+    "email": "I",
+    "website": "I",
+}
+# Therapy methods per therapist as offsets into method_refs, and the method table
+METHOD_SECTIONS = {
+    "method_offsets": "I",
+    "method_refs": "I",
+    "method_id": "i",
+    "method_name": "I",
+    "cluster_short": "I",
+}
+# String table: UTF-8 strings concatenated, with start offsets and the end offset
+STRING_SECTIONS = {
+    "string_offsets": "I",
+    "strings": "B",
+}
+SECTIONS = {**THERAPIST_SECTIONS, **METHOD_SECTIONS, **STRING_SECTIONS}
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file cannot be read."""
+
+def snapshot_path(url=None):
+    """
+    Return the snapshot file of a database.
+
+    :param url: Database URL, defaults to ``DATABASE_URL``.
+    :type url: str
+    :return: ``CATALOGUE_SNAPSHOT`` if set, otherwise the live generation of the
+        database file with a ``.snapshot`` suffix, or None for databases that are
+        not SQLite files.
+    :rtype: str
+    """
+    if os.getenv("CATALOGUE_SNAPSHOT"):
+        return os.getenv("CATALOGUE_SNAPSHOT")
+    url = current_database_url(url or DATABASE_URL)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return os.path.abspath(url.database) + ".snapshot"
+
+class _StringTable:
+    """Deduplicated strings referenced by position."""
+
+    def __init__(self):
+        self.refs = {}
+        self.offsets = array("I", [0])
+        self.data = bytearray()
+
+    def ref(self, value):
+        """Return the reference of a string, adding it on first use."""
+        if value is None:
+            return NULL
+        ref = self.refs.get(value)
+        if ref is None:
+            ref = self.refs[value] = len(self.refs)
+            self.data += value.encode("utf-8")
+            self.offsets.append(len(self.data))
+        return ref
+
+def _collect_sections(db):
+    """Load the catalogue and return its sections as arrays, with the therapist count."""
+    strings = _StringTable()
+    therapists = db.execute(
+        select(
+            Therapist.id, Therapist.registration_number, Therapist.registration_date,
+            Therapist.last_name, Therapist.first_name, Therapist.title
+        ).order_by(Therapist.id)
+    ).all()
+    positions = {row.id: position for position, row in enumerate(therapists)}
+    count = len(therapists)
+
+    sections = {name: array(typecode) for name, typecode in SECTIONS.items()}
+    for row in therapists:
+        sections["id"].append(row.id)
+        sections["registration_number"].append(row.registration_number)
+        sections["registration_date"].append(row.registration_date.toordinal())
+        for name in ("last_name", "first_name", "title"):
+            sections[name].append(strings.ref(getattr(row, name)))
+
+    # Therapists without an address or contact keep NULL references; the last row wins, as in the projections
+    for names, rows in (
+        (("state", "postal_code"), db.execute(
+            select(TherapistAddress.therapist_id, TherapistAddress.state, TherapistAddress.postal_code)
+        )),
+        (("email", "website"), db.execute(
+            select(TherapistContact.therapist_id, TherapistContact.email, TherapistContact.website)
+        )),
+    ):
+        columns = [array("I", [NULL]) * count for _ in names]
+        for therapist_id, *values in rows:
+            position = positions.get(therapist_id)
+            if position is not None:
+                for column, value in zip(columns, values):
+                    column[position] = strings.ref(value)
+        for name, column in zip(names, columns):
+            sections[name] = column
+
+    methods = db.execute(
+        select(TherapyMethod.id, TherapyMethod.method_name, TherapyMethodCluster.cluster_short)
+        .outerjoin(TherapyMethodCluster, TherapyMethodCluster.id == TherapyMethod.cluster_id)
+        .order_by(TherapyMethod.id)
+    ).all()
+    method_positions = {}
+    for position, (method_id, method_name, cluster_short) in enumerate(methods):
+        method_positions[method_id] = position
+        sections["method_id"].append(method_id)
+        sections["method_name"].append(strings.ref(method_name))
+        sections["cluster_short"].append(strings.ref(cluster_short))
+
+    per_therapist = [[] for _ in range(count)]
+    for therapist_id, method_id in db.execute(
+        select(therapist_therapy_method.c.therapist_id, therapist_therapy_method.c.therapy_method_id)
+        .order_by(therapist_therapy_method.c.therapist_id, therapist_therapy_method.c.therapy_method_id)
+    ):
+        position = positions.get(therapist_id)
+        if position is not None and method_id in method_positions:
+            per_therapist[position].append(method_positions[method_id])
+    sections["method_offsets"].append(0)
+    for refs in per_therapist:
+        sections["method_refs"].extend(refs)
+        sections["method_offsets"].append(len(sections["method_refs"]))
+
+    sections["string_offsets"] = strings.offsets
+    sections["strings"] = array("B", strings.data)
+    return sections, count
+
+def write_snapshot(db, path):
+    """
+    Compile the catalogue of a database into a snapshot file.
+
+    The file is written next to ``path`` and renamed over it, so workers that
+    still map the previous file keep reading it undisturbed.
+
+    :param db: Database session; the catalogue is read in its transaction.
+    :param path: Snapshot file to create or replace.
+    :type path: str
+    :return: Dataset version and therapist count of the snapshot.
+    :rtype: tuple
+    """
+    dataset_version = get_dataset_version(db)
+    sections, count = _collect_sections(db)
+
+    # Lay out the sections after the header and section table
+    offset = HEADER.size + SECTION.size * len(sections)
+    layout = []
+    for name, values in sections.items():
+        offset += -offset % ALIGNMENT
+        length = len(values) * values.itemsize
+        layout.append((name, offset, length))
+        offset += length
+
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, sys.byteorder == "little", dataset_version, count, len(layout)))
+            for name, section_offset, length in layout:
+                f.write(SECTION.pack(name.encode(), section_offset, length))
+            for name, section_offset, _length in layout:
+                f.write(b"\0" * (section_offset - f.tell()))
+                sections[name].tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        # Temporary files are private; API workers may run as another user
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return dataset_version, count
+
+class CatalogueSnapshot:
+    """
+    Read-only view of a snapshot file.
+
+    The file is memory-mapped and its sections are read in place through
+    typed memoryviews, so all processes mapping the same file share its pages.
+    Rows are decoded per request.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Snapshot file.
+        :type path: str
+        :raises SnapshotError: If the file is not a snapshot this version can read.
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise SnapshotError(f"{path} is not a catalogue snapshot")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, format_version, little_endian, self.dataset_version, self.count, section_count = HEADER.unpack_from(view)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise SnapshotError(f"{path} is not a catalogue snapshot of format {FORMAT_VERSION}")
+        if bool(little_endian) != (sys.byteorder == "little"):
+            raise SnapshotError(f"{path} was built on a machine with a different byte order")
+
+        self.sections = {}
+        for number in range(section_count):
+            name, offset, length = SECTION.unpack_from(view, HEADER.size + SECTION.size * number)
+            name = name.rstrip(b"\0").decode()
+            if name in SECTIONS:
+                self.sections[name] = view[offset:offset + length].cast(SECTIONS[name])
+        missing = SECTIONS.keys() - self.sections.keys()
+        if missing:
+            raise SnapshotError(f"{path} lacks the sections {', '.join(sorted(missing))}")
+        self._ids = self.sections["id"]
+
+    def __len__(self):
+        return self.count
+
+    def string(self, ref):
+        """
+        Decode a string of the string table.
+
+        :param ref: String reference.
+        :type ref: int
+        :return: The string, or None for the NULL reference.
+        :rtype: str
+        """
+        if ref == NULL:
+            return None
+        offsets = self.sections["string_offsets"]
+        return str(self.sections["strings"][offsets[ref]:offsets[ref + 1]], "utf-8")
+
+    def position(self, therapist_id):
+        """
+        Return the position of a therapist in the columns.
+
+        :param therapist_id: Therapist id.
+        :type therapist_id: int
+        :return: Position, or None if the therapist is not in the snapshot.
+        :rtype: int
+        """
+        position = bisect_left(self._ids, therapist_id)
+        if position < self.count and self._ids[position] == therapist_id:
+            return position
+        return None
+
+    def _row(self, position, expand):
+        """Decode the row of a therapist with the requested nested data."""
+        sections, string = self.sections, self.string
+        row = {
+            "id": sections["id"][position],
+            "last_name": string(sections["last_name"][position]),
+            "first_name": string(sections["first_name"][position]),
+            "title": string(sections["title"][position]),
+            "registration_date": date.fromordinal(sections["registration_date"][position]),
+            "registration_number": sections["registration_number"][position],
+        }
+        if "address" in expand:
+            state = sections["state"][position]
+            row["address"] = None if state == NULL else {
+                "state": string(state), "postal_code": string(sections["postal_code"][position])
+            }
+        if "contact" in expand:
+            email = sections["email"][position]
+            row["contact"] = None if email == NULL else {
+                "email": string(email), "website": string(sections["website"][position])
+            }
+        if "methods" in expand:
+            offsets, refs = sections["method_offsets"], sections["method_refs"]
+            row["methods"] = [
+                {
+                    "id": sections["method_id"][method],
+                    "method_name": string(sections["method_name"][method]),
+                    "cluster_short": string(sections["cluster_short"][method]),
+                }
+                for method in refs[offsets[position]:offsets[position + 1]]
+            ]
+        return row
+
+    def load_therapists(self, ids, expand=()):
+        """
+        Load therapist rows by id, like :func:`app.utils.projections.load_therapists` does from the database.
+
+        :param ids: Therapist ids in the order they should be returned.
+        :type ids: list
+        :param expand: Expansion names, e.g. ``("address", "methods")``.
+        :type expand: tuple
+        :return: Therapist rows in the order of ``ids``; unknown ids are left out.
+        :rtype: list
+        """
+        rows = []
+        for therapist_id in ids:
+            position = self.position(therapist_id)
+            if position is not None:
+                rows.append(self._row(position, expand))
+        return rows
+
+def build_snapshot(path=None):
+    """
+    Compile the catalogue of the ``DATABASE_URL`` database into its snapshot file.
+
+    :param path: Snapshot file, defaults to :func:`snapshot_path`.
+    :type path: str
+    :return: Dataset version and therapist count of the snapshot.
+    :rtype: tuple
+    """
+    path = path or snapshot_path()
+    if path is None:
+        raise SnapshotError("Snapshots need a SQLite database file or CATALOGUE_SNAPSHOT")
+    started = time.perf_counter()
+    with SessionLocal() as session:
+        dataset_version, count = write_snapshot(session, path)
+    elapsed = time.perf_counter() - started
+    print(f"Wrote snapshot of {count} therapists (dataset version {dataset_version}) to {path} in {elapsed:.2f}s")
+    return dataset_version, count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the therapist catalogue into a snapshot file.")
+    parser.add_argument("path", nargs="?", help="Snapshot file, defaults to the database file with .snapshot")
+    args = parser.parse_args()
+    build_snapshot(args.path)
@@ -6,45 +6,79 @@ across all test modules in the tests/ directory.
 """
 import json
 import os
+import shutil
+import tempfile
 import pytest
 from dotenv import load_dotenv
 from fastapi.testclient import TestClient
-from app.main import app
 
 # ------------------------------
 # Environment Setup
 # ------------------------------
 load_dotenv()
 
+# The app and the data scripts read the database URL and the API key on import, so they are
+# pointed at a temporary database and a static key first; the tests never touch therapists.db
+TEST_DIR = tempfile.mkdtemp(prefix="elis-tests-")
+TEST_API_KEY = "elis-test-key"
+TEST_REGISTRY_SIZE = 500
+os.environ.update({"DATABASE_URL": f"sqlite:///{os.path.join(TEST_DIR, 'therapists.db')}", "API_KEY": TEST_API_KEY})
+for name in ("ASYNC_DATABASE_URL", "CATALOGUE_SNAPSHOT", "API_KEY_RATE_LIMIT", "API_KEY_BURST", "API_KEY_MAX_CONCURRENCY"):
+    os.environ.pop(name, None)
+
+# pylint: disable=wrong-import-position
+from app.main import app
+from app.utils.catalogue_snapshot import catalogue_snapshot
+from data.models import ASYNC_DATABASE_URL
+from data.refresh import refresh
+from data.snapshot import snapshot_path
+from benchmarks.generate_registry import generate_registry_csv
+
+def pytest_sessionfinish(session, exitstatus):
+    """Remove the temporary database after the test run."""
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
 # ------------------------------
 # Fixtures
 # ------------------------------
 
+@pytest.fixture(scope="session")
+def test_database():
+    """
+    Build the temporary database from a synthetic registry, once per test run.
+
+    The database is built with ``python -m data.refresh``, so it is complete
+    with clusters, types, mappings, the name search index and the snapshot.
+
+    Returns:
+        str: Path of the live database file.
+    """
+    csv_path = generate_registry_csv(os.path.join(TEST_DIR, "registry.csv"), TEST_REGISTRY_SIZE)
+    path = refresh(csv_path)
+    catalogue_snapshot.path = snapshot_path(ASYNC_DATABASE_URL)
+    catalogue_snapshot.expire()
+    return path
+
 @pytest.fixture
-def test_client():
+def test_client(test_database):
     """
-    Create a test client for the FastAPI app.
+    Create a test client for the FastAPI app on the test database, running its startup and shutdown.
     
-    Returns:
+    Yields:
         TestClient: A FastAPI test client instance for making HTTP requests.
     """
-    return TestClient(app)
+    with TestClient(app) as client:
+        yield client
 
 @pytest.fixture
 def auth_headers():
     """
-    Provide authentication headers with API key from environment.
+    Provide authentication headers with the static API key of the test run.
     
     Returns:
         dict: Headers dictionary containing the X-API-Key header.
-        
-    Raises:
-        pytest.skip: If API_KEY environment variable is not set.
     """
-    api_key = os.getenv("API_KEY")
-    if not api_key:
-        pytest.skip("API_KEY environment variable not set")
-    return {"X-API-Key": api_key}
+    return {"X-API-Key": TEST_API_KEY}
 
 @pytest.fixture
 def sample_questionnaire_payload():
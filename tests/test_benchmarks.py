@@ -0,0 +1,35 @@
+"""
+Unit tests for the benchmark registry generator and the comparison of benchmark runs.
+"""
+from data.import_data import read_registry_csv
+from data.run_mappings import THERAPY_METHODS_TO_CLUSTERS
+from benchmarks.generate_registry import STATES, generate_registry_csv, registry_rows
+from benchmarks.run import THERAPIST_FILTERS, benchmark_cases, compare_results
+
+def test_generated_registry_is_importable(tmp_path):
+    """Test that the importer reads a generated registry with known methods and matching postal codes."""
+    df = read_registry_csv(generate_registry_csv(tmp_path / "registry.csv", 200))
+    assert len(df) == 200
+    assert df['Eintragungs Nummer'].is_unique
+    assert all(set(methods) <= THERAPY_METHODS_TO_CLUSTERS.keys() and methods for methods in df['PTH-Methoden'])
+    assert all(code.startswith(STATES[state][0]) for state, code in zip(df['Berufssitz Bundesland 1'], df['Berufssitz PLZ 1']))
+    assert list(registry_rows(50, seed=1)) == list(registry_rows(50, seed=1)) != list(registry_rows(50, seed=2))
+
+def test_benchmark_cases_cover_every_filter_combination():
+    """Test that every subset of the therapists filters is timed under its own name."""
+    names = [name for name, _request in benchmark_cases()]
+    assert len(names) == len(set(names))
+    assert sum(name.startswith("GET /therapists?") or name == "GET /therapists" for name in names) >= 2 ** len(THERAPIST_FILTERS)
+
+def test_compare_results_flags_regressions():
+    """Test that slowdowns beyond the tolerance are flagged, but not noise on tiny timings."""
+    baseline = {"endpoints": {"a": {"median_ms": 10.0}, "b": {"median_ms": 0.01}, "c": {"median_ms": 5.0}},
+                "imports": {"import app.main": {"median_ms": 300.0}}, "build": {"import": 2.0}}
+    current = {"endpoints": {"a": {"median_ms": 14.0}, "b": {"median_ms": 0.05}, "d": {"median_ms": 1.0}},
+               "imports": {"import app.main": {"median_ms": 450.0}}, "build": {"import": 2.1}}
+    rows = {row["name"]: row for row in compare_results(current, baseline, tolerance=0.25)}
+    assert set(rows) == {"a", "b", "import app.main", "build: import"}
+    assert rows["import app.main"]["regression"]
+    assert rows["a"]["regression"] and rows["a"]["ratio"] == 1.4
+    assert not rows["b"]["regression"]  # Five times slower, but below the noise floor
+    assert not rows["build: import"]["regression"]
@@ -0,0 +1,72 @@
+"""
+Unit tests for questionnaire scoring.
+
+Covers the tie-break rule, the ranked output, weighted answers and the
+equivalence of single and batch scoring.
+"""
+import random
+import pytest
+from app.calculations.calculate_cluster import (
+    CLUSTER_ORDER, ScoringEngine, calculate_cluster, process_all_responses, scoring_engine
+)
+
+def responses(*cluster_points, question_id=None, selected_option=None):
+    """Build responses giving one point to each listed cluster."""
+    return [
+        {"question_id": question_id or number, "selected_option": selected_option, "cluster_points": list(points)}
+        for number, points in enumerate(cluster_points, start=1)
+    ]
+
+def test_tie_break_follows_cluster_order():
+    """Test that ties go to the cluster listed first in CLUSTER_ORDER, whatever the answer order."""
+    tied = responses(["SYS"], ["VT"], ["G", "PA"])
+    assert scoring_engine.score(tied)["recommended_cluster"] == "PA"
+    assert scoring_engine.score(tied[::-1])["recommended_cluster"] == "PA"
+    assert calculate_cluster(process_all_responses(tied)) == "PA"
+    assert scoring_engine.score(responses(["SYS", "VT"]))["recommended_cluster"] == "VT"
+
+def test_unknown_clusters_rank_after_listed_ones():
+    """Test that clusters outside CLUSTER_ORDER lose ties and tie among themselves alphabetically."""
+    assert scoring_engine.score(responses(["ZZ", "G"]))["recommended_cluster"] == "G"
+    assert scoring_engine.score(responses(["ZZ", "AA"]))["recommended_cluster"] == "AA"
+    assert scoring_engine.score_batch([responses(["ZZ", "AA"]), responses(["ZZ"])]) == ["AA", "ZZ"]
+
+def test_score_ranking():
+    """Test the ranked distribution with normalised shares."""
+    result = scoring_engine.score(responses(["VT", "SYS"], ["VT", "PA"], ["SYS"], ["VT"]))
+    assert result["recommended_cluster"] == "VT"
+    assert result["ranking"] == [
+        {"cluster": "VT", "score": 3.0, "share": 0.5},
+        {"cluster": "SYS", "score": 2.0, "share": pytest.approx(1 / 3)},
+        {"cluster": "PA", "score": 1.0, "share": pytest.approx(1 / 6)},
+    ]
+    assert scoring_engine.score(responses([])) == {"recommended_cluster": None, "ranking": []}
+
+def test_weighted_answers():
+    """Test that compiled answer weights replace the points sent with the answer."""
+    engine = ScoringEngine(CLUSTER_ORDER, {7: {"Ja": {"PZ": 3, "G": 0.5}}})
+    weighted = responses(["PA", "VT"], question_id=7, selected_option="Ja")
+    assert engine.score(weighted)["ranking"][0] == {"cluster": "PZ", "score": 3.0, "share": pytest.approx(3 / 3.5)}
+    unweighted = responses(["PA", "VT"], question_id=7, selected_option="Nein")
+    assert engine.score(unweighted)["recommended_cluster"] == "PA"
+    assert engine.score_batch([weighted, unweighted]) == ["PZ", "PA"]
+
+    with pytest.raises(ValueError):
+        ScoringEngine(CLUSTER_ORDER, {1: {"Ja": {"XX": 1}}})
+    with pytest.raises(ValueError):
+        ScoringEngine(CLUSTER_ORDER, {1: {"Ja": {"PA": -1}}})
+
+def test_batch_matches_single_scoring(sample_questionnaire_payload):
+    """Test that batch scoring agrees with single scoring on random questionnaires."""
+    rng = random.Random(7)
+    clusters = list(CLUSTER_ORDER) + ["XX"]
+    questionnaires = [sample_questionnaire_payload["responses"], []] + [
+        responses(*[rng.sample(clusters, rng.randint(0, 3)) for _ in range(rng.randint(1, 12))])
+        for _ in range(500)
+    ]
+    expected = [scoring_engine.score(questionnaire)["recommended_cluster"] for questionnaire in questionnaires]
+    assert scoring_engine.score_batch(questionnaires) == expected
+    assert expected[1] is None
+    for questionnaire, cluster in zip(questionnaires, expected):
+        scores = process_all_responses(questionnaire)
+        assert (calculate_cluster(scores) if scores else None) == cluster
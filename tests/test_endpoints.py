@@ -6,6 +6,9 @@ therapy types, methods, and clusters.
 
 Note: The test_client and auth_headers fixtures are provided by conftest.py
 """
+import json
+import pytest
+from app.utils.result_cache import cache_requests
 
 def test_unauthorized_access(test_client):
     """Test accessing protected endpoint without API key."""
@@ -25,6 +28,90 @@ def test_get_therapists(test_client, auth_headers):
     assert isinstance(data, list)
     assert len(data) > 0  # Check that the list is not empty
 
+def test_get_therapists_cursor_pagination(test_client, auth_headers):
+    """Test walking GET /therapists pages with the next cursor."""
+    first = test_client.get("/therapists", params={"limit": 5}, headers=auth_headers)
+    assert first.status_code == 200
+    if len(first.json()) < 5:
+        pytest.skip("Database holds fewer than two pages of therapists")
+    cursor = first.headers.get("X-Next-Cursor")
+    assert cursor is not None  # Full page returns a cursor
+
+    second = test_client.get("/therapists", params={"limit": 5, "cursor": cursor}, headers=auth_headers)
+    assert second.status_code == 200
+    first_ids = [therapist["id"] for therapist in first.json()]
+    second_ids = [therapist["id"] for therapist in second.json()]
+    assert first_ids == sorted(first_ids)
+    assert all(therapist_id > max(first_ids) for therapist_id in second_ids)  # Pages do not overlap
+
+def test_get_therapists_expand(test_client, auth_headers):
+    """Test GET /therapists with nested address, contact and methods."""
+    response = test_client.get(
+        "/therapists", params={"limit": 3, "expand": "address,contact,methods"}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    for therapist in response.json():
+        assert {"address", "contact", "methods"} <= therapist.keys()
+        assert isinstance(therapist["methods"], list)
+
+    response = test_client.get("/therapists", params={"expand": "unknown"}, headers=auth_headers)
+    assert response.status_code == 400
+
+def test_get_therapists_name_search(test_client, auth_headers):
+    """Test GET /therapists?q= with a name taken from the first page."""
+    first = test_client.get("/therapists", params={"limit": 1}, headers=auth_headers).json()
+    if not first:
+        pytest.skip("Database holds no therapists")
+    response = test_client.get("/therapists", params={"q": first[0]["last_name"], "limit": 100}, headers=auth_headers)
+    assert response.status_code == 200
+    assert first[0]["id"] in [therapist["id"] for therapist in response.json()]
+
+def test_export_therapists(test_client, auth_headers):
+    """Test that GET /therapists/export streams the same therapists as GET /therapists."""
+    listed = test_client.get("/therapists", params={"limit": 100000, "cluster_short": "VT"}, headers=auth_headers)
+    response = test_client.get("/therapists/export", params={"cluster_short": "VT"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert [therapist["id"] for therapist in exported] == [therapist["id"] for therapist in listed.json()]
+    assert all({"address", "contact", "methods"} <= therapist.keys() for therapist in exported)
+
+    response = test_client.get("/therapists/export", params={"format": "csv", "limit": 1}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.text.splitlines()[0].startswith("id,last_name,first_name")
+
+    response = test_client.get("/therapists/export", params={"format": "xml"}, headers=auth_headers)
+    assert response.status_code == 400
+
+def test_get_therapist_facets(test_client, auth_headers):
+    """Test that GET /therapists/facets counts the therapists GET /therapists returns."""
+    response = test_client.get("/therapists/facets", headers=auth_headers)
+    assert response.status_code == 200
+    facets = response.json()
+    assert sum(facets["experience"].values()) <= facets["total"]
+
+    for cluster_short, count in facets["cluster_short"].items():
+        listed = test_client.get(
+            "/therapists", params={"limit": 100000, "cluster_short": cluster_short}, headers=auth_headers
+        )
+        assert len(listed.json()) == count
+        narrowed = test_client.get("/therapists/facets", params={"cluster_short": cluster_short}, headers=auth_headers)
+        assert narrowed.json()["total"] == count
+
+def test_metrics(test_client, auth_headers):
+    """Test that requests report their timings and show up in GET /metrics."""
+    response = test_client.get("/therapists", params={"state": "Wien"}, headers=auth_headers)
+    assert response.headers["Server-Timing"].startswith("app;dur=")
+
+    metrics = test_client.get("/metrics")
+    assert metrics.status_code == 200
+    assert 'elis_http_requests_total{method="GET",route="/therapists",status="200"}' in metrics.text
+
+def test_invalid_cursor(test_client, auth_headers):
+    """Test that a malformed cursor is rejected."""
+    response = test_client.get("/therapists", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == 400
+
 def test_get_therapy_clusters(test_client, auth_headers):
     """Test the GET /therapy_clusters endpoint."""
     response = test_client.get("/therapy_clusters", headers=auth_headers)
@@ -57,3 +144,71 @@ def test_calculate_results(test_client, auth_headers, sample_questionnaire_paylo
     assert isinstance(data, dict)
     assert "recommended_cluster" in data # Check key presence
     assert data["recommended_cluster"] in ["PA", "VT", "SYS", "PZ", "G"]
+    assert data["ranking"][0]["cluster"] == data["recommended_cluster"]
+    assert abs(sum(entry["share"] for entry in data["ranking"]) - 1) < 1e-9
+
+def test_calculate_results_batch(test_client, auth_headers, sample_questionnaire_payload):
+    """Test the POST /calculate_results/batch endpoint with a JSON array."""
+    payloads = [
+        sample_questionnaire_payload, sample_questionnaire_payload, {"responses": []}, {"responses": [1]}
+    ]
+    single = test_client.post("/calculate_results", json=sample_questionnaire_payload, headers=auth_headers)
+    response = test_client.post("/calculate_results/batch", json=payloads, headers=auth_headers)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 4
+    assert results[0] == results[1] == {"recommended_cluster": single.json()["recommended_cluster"]}
+    assert results[2]["error"] == "No responses provided"
+    assert results[3]["error"] == "Malformed responses"
+
+def test_calculate_results_batch_ndjson(test_client, auth_headers, sample_questionnaire_payload):
+    """Test the POST /calculate_results/batch endpoint with an NDJSON stream."""
+    body = "\n".join([json.dumps(sample_questionnaire_payload)] * 2 + ["not json"])
+    headers = {**auth_headers, "Content-Type": "application/x-ndjson"}
+    response = test_client.post("/calculate_results/batch", content=body, headers=headers)
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 3
+    assert lines[0]["recommended_cluster"] == lines[1]["recommended_cluster"] is not None
+    assert lines[2]["error"] == "No responses provided"
+
+def test_recommendations(test_client, auth_headers, sample_questionnaire_payload):
+    """Test the POST /recommendations endpoint against the two calls it replaces."""
+    response = test_client.post(
+        "/recommendations", params={"limit": 3, "expand": "methods"},
+        json=sample_questionnaire_payload, headers=auth_headers
+    )
+    assert response.status_code == 200
+    data = response.json()
+    single = test_client.post("/calculate_results", json=sample_questionnaire_payload, headers=auth_headers)
+    assert data["recommended_cluster"] == single.json()["recommended_cluster"]
+
+    therapists = test_client.get(
+        "/therapists", params={"limit": 3, "cluster_short": data["cluster_short"], "expand": "methods"},
+        headers=auth_headers
+    )
+    assert data["therapists"] == therapists.json()
+    assert response.headers.get("X-Next-Cursor") == therapists.headers.get("X-Next-Cursor")
+
+    response = test_client.post("/recommendations", json={"responses": []}, headers=auth_headers)
+    assert response.status_code == 400
+
+def test_get_therapists_compressed(test_client, auth_headers):
+    """Test that a large GET /therapists page is compressed for clients that accept gzip."""
+    headers = {**auth_headers, "Accept-Encoding": "gzip"}
+    response = test_client.get("/therapists", params={"limit": 100, "expand": "address,contact,methods"}, headers=headers)
+    assert response.status_code == 200
+    assert "Accept-Encoding" in response.headers["vary"]
+    if len(response.content) >= 1024:
+        assert response.headers["content-encoding"] == "gzip"
+
+def test_get_therapists_cached(test_client, auth_headers):
+    """Test that identical GET /therapists requests are served from the result cache."""
+    params = {"cluster_short": "VT", "limit": 5, "state": ""}
+    first = test_client.get("/therapists", params=params, headers=auth_headers)
+    hits = cache_requests.values.get(("therapists", "hit"), 0)
+    second = test_client.get("/therapists", params={"limit": 5, "cluster_short": "VT"}, headers=auth_headers)
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers.get("x-next-cursor") == first.headers.get("x-next-cursor")
+    assert cache_requests.values.get(("therapists", "hit"), 0) == hits + 1
@@ -0,0 +1,228 @@
+"""
+Tests for the registry CSV importer against a temporary database.
+
+The importer's session factory is pointed at a fresh SQLite file with the
+declared schema and the therapy clusters, so the tests do not depend on
+``therapists.db``.
+"""
+import csv
+from datetime import date
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+from data import import_data, populate_tables, run_mappings
+from data.search_index import match_expression, search_therapist_ids
+from data.models import (
+    Base, Therapist, TherapistAddress, TherapistContact, TherapyMethod, TherapyMethodCluster, TherapyType,
+    create_db_engine, get_dataset_version, therapist_therapy_method
+)
+from data.run_mappings import THERAPY_CLUSTERS, THERAPY_TYPE_TO_CLUSTERS
+
+CSV_HEADER = (
+    'Familien-/Nachname', 'Vorname', 'Titel', 'Eintragungdatum', 'Eintragungs Nummer',
+    'Email1', 'Website', 'Berufssitz Bundesland 1', 'Berufssitz PLZ 1', 'PTH-Methoden'
+)
+
+REGISTRY_ROWS = [
+    ("Müller", "Anna", "Mag.", "01.03.15", "1001", "anna@example.com", "", "Wien", "1010",
+     "Verhaltenstherapie, Existenzanalyse"),
+    ("Huber", "Berta", "", "12.11.19", "1002", "", "https://huber.at", "Tirol", "6020", "Psychodrama"),
+    ("Gruber", "Carl", "Dr.", "30.06.08", "1003", "carl@example.com", "", "Wien", "1090",
+     "Verhaltenstherapie, Verhaltenstherapie"),
+]
+
+def write_registry_csv(path, rows):
+    """Write rows in the ``PTH-CSV-Liste`` format and return the path."""
+    with open(path, "w", newline="", encoding="cp1252") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(CSV_HEADER)
+        writer.writerows(rows)
+    return str(path)
+
+@pytest.fixture
+def registry_db(tmp_path, monkeypatch):
+    """Point the importer at an empty database that only contains the clusters."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'registry.db'}", profile="default")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(insert(TherapyMethodCluster), [
+            {"cluster_short": short, "cluster_name": name} for short, name in THERAPY_CLUSTERS.items()
+        ])
+    monkeypatch.setattr(import_data, "SessionLocal", sessionmaker(bind=engine, autoflush=False))
+    yield engine
+    engine.dispose()
+
+def registry_snapshot(engine):
+    """Return the imported therapists keyed on registration number."""
+    with engine.connect() as connection:
+        methods = {}
+        for therapist_id, method_name in connection.execute(
+            select(therapist_therapy_method.c.therapist_id, TherapyMethod.method_name)
+            .join(TherapyMethod, TherapyMethod.id == therapist_therapy_method.c.therapy_method_id)
+        ):
+            methods.setdefault(therapist_id, set()).add(method_name)
+
+        rows = connection.execute(
+            select(
+                Therapist.id, Therapist.registration_number, Therapist.last_name, Therapist.title,
+                Therapist.registration_date, TherapistContact.email, TherapistContact.website,
+                TherapistAddress.postal_code
+            )
+            .join(TherapistContact, TherapistContact.therapist_id == Therapist.id)
+            .join(TherapistAddress, TherapistAddress.therapist_id == Therapist.id)
+        )
+        return {
+            row.registration_number: {**row._asdict(), "methods": methods.get(row.id, set())}
+            for row in rows
+        }
+
+def test_import_csv_data(registry_db, tmp_path):
+    """Test that the bulk import creates therapists with contacts, addresses and methods."""
+    csv_path = write_registry_csv(tmp_path / "registry.csv", REGISTRY_ROWS)
+    assert import_data.import_csv_data(csv_path, batch_size=2) == 3
+
+    therapists = registry_snapshot(registry_db)
+    assert set(therapists) == {1001, 1002, 1003}
+    assert therapists[1001]["last_name"] == "Müller"  # cp1252 decoded
+    assert therapists[1001]["registration_date"] == date(2015, 3, 1)
+    assert therapists[1001]["methods"] == {"Verhaltenstherapie", "Existenzanalyse"}
+    assert therapists[1003]["methods"] == {"Verhaltenstherapie"}  # Duplicate method linked once
+    assert therapists[1002]["email"] == ""  # Empty cells stay empty strings (email is NOT NULL)
+    assert therapists[1001]["website"] is None
+
+    with registry_db.connect() as connection:
+        method_names = connection.execute(select(TherapyMethod.method_name)).scalars().all()
+        assert sorted(method_names) == ["Existenzanalyse", "Psychodrama", "Verhaltenstherapie"]
+        assert get_dataset_version(connection) == 1
+
+def test_import_csv_delta(registry_db, tmp_path):
+    """Test that a delta import inserts, updates, relinks and deletes by registration number."""
+    import_data.import_csv_data(write_registry_csv(tmp_path / "registry.csv", REGISTRY_ROWS))
+    ids = {number: row["id"] for number, row in registry_snapshot(registry_db).items()}
+
+    delta_rows = [
+        ("Müller", "Anna", "Dr.", "01.03.15", "1001", "anna@praxis.at", "", "Wien", "1010",
+         "Verhaltenstherapie, Existenzanalyse"),
+        ("Huber", "Berta", "", "12.11.19", "1002", "", "https://huber.at", "Tirol", "6060",
+         "Psychodrama, Systemische Familientherapie"),
+        ("Wagner", "Dora", "", "05.05.21", "1004", "dora@example.com", "", "Steiermark", "8010",
+         "Verhaltenstherapie"),
+    ]
+    delta_path = write_registry_csv(tmp_path / "delta.csv", delta_rows)
+    counts = import_data.import_csv_delta(delta_path)
+    assert counts == {
+        "inserted": 1, "therapists_updated": 1, "contacts_updated": 1, "addresses_updated": 1,
+        "methods_updated": 1, "deleted": 1, "unchanged": 0
+    }
+
+    therapists = registry_snapshot(registry_db)
+    assert set(therapists) == {1001, 1002, 1004}
+    assert therapists[1001]["id"] == ids[1001]  # Updated in place
+    assert therapists[1001]["title"] == "Dr."
+    assert therapists[1001]["email"] == "anna@praxis.at"
+    assert therapists[1002]["postal_code"] == "6060"
+    assert therapists[1002]["methods"] == {"Psychodrama", "Systemische Familientherapie"}
+    assert therapists[1004]["id"] not in ids.values()  # Deleted ids are not reused
+
+    # Applying the same delta again changes nothing and keeps the dataset version
+    with registry_db.connect() as connection:
+        version = get_dataset_version(connection)
+    counts = import_data.import_csv_delta(delta_path)
+    assert counts["unchanged"] == 3
+    assert sum(counts.values()) == 3
+    with registry_db.connect() as connection:
+        assert get_dataset_version(connection) == version
+
+    # The highest id stays retired after its therapist is deleted
+    last_id = therapists[1004]["id"]
+    replacement = [row for row in delta_rows if row[4] != "1004"] + [
+        ("Bauer", "Emil", "", "01.01.20", "1005", "emil@example.com", "", "Wien", "1020", "Psychodrama")
+    ]
+    import_data.import_csv_delta(write_registry_csv(tmp_path / "replacement.csv", replacement))
+    assert registry_snapshot(registry_db)[1005]["id"] > last_id
+
+def test_populate_tables_on_empty_database(tmp_path, monkeypatch):
+    """Test that clusters and types are populated on a new database, every type with its cluster."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'empty.db'}", profile="default")
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(populate_tables, "SessionLocal", sessionmaker(bind=engine, autoflush=False))
+    populate_tables.populate_tables()
+
+    with Session(engine) as db:
+        types = db.execute(
+            select(TherapyType.type_short, TherapyMethodCluster.cluster_short)
+            .join(TherapyMethodCluster, TherapyMethodCluster.id == TherapyType.cluster_id)
+        ).all()
+        assert dict(types) == THERAPY_TYPE_TO_CLUSTERS
+        assert get_dataset_version(db) == 1
+    engine.dispose()
+
+def test_failed_population_keeps_dataset_version(registry_db, monkeypatch):
+    """Test that a failing population script does not bump the dataset version on its own."""
+    monkeypatch.setattr(populate_tables, "SessionLocal", sessionmaker(bind=registry_db, autoflush=False))
+    with pytest.raises(IntegrityError):
+        populate_tables.populate_tables()  # Clusters already exist
+
+    with registry_db.connect() as connection:
+        assert get_dataset_version(connection) == 0
+
+def test_map_methods_to_clusters(registry_db, monkeypatch):
+    """Test that the mapping updates every row of duplicated method names and reports unmapped methods."""
+    with registry_db.begin() as connection:
+        cluster_ids = dict(connection.execute(select(TherapyMethodCluster.cluster_short, TherapyMethodCluster.id)).all())
+        connection.execute(insert(TherapyMethod), [
+            {"id": 1, "method_name": "Psychodrama", "cluster_id": cluster_ids["PA"]},
+            {"id": 2, "method_name": "Psychodrama", "cluster_id": cluster_ids["VT"]},  # Duplicate name
+            {"id": 3, "method_name": "Verhaltenstherapie", "cluster_id": cluster_ids["PA"]},
+            {"id": 4, "method_name": "Unbekannte Methode", "cluster_id": cluster_ids["ST"]},
+        ])
+    monkeypatch.setattr(run_mappings, "SessionLocal", sessionmaker(bind=registry_db, autoflush=False))
+
+    assert run_mappings.map_methods_to_clusters() == (3, ["Unbekannte Methode"])
+    with Session(registry_db) as db:
+        clusters = db.execute(
+            select(TherapyMethod.id, TherapyMethodCluster.cluster_short)
+            .join(TherapyMethodCluster, TherapyMethodCluster.id == TherapyMethod.cluster_id)
+        ).all()
+        assert dict(clusters) == {1: "HT", 2: "HT", 3: "VT", 4: "ST"}
+        assert get_dataset_version(db) == 1
+
+def search(engine, query):
+    """Return the registration numbers of a name search, best match first."""
+    with Session(engine) as db:
+        ids = search_therapist_ids(db, query)
+        numbers = dict(db.execute(select(Therapist.id, Therapist.registration_number)).all())
+    return [numbers[therapist_id] for therapist_id in ids]
+
+def test_match_expression():
+    """Test that queries become quoted prefix terms in folded and original spelling."""
+    assert match_expression("Müll") == '("muell"* OR "müll"*)'
+    assert match_expression('Dr. "Anna') == '("dr"*) AND ("anna"*)'
+    assert match_expression(" -- ") is None
+
+def test_search_index_follows_imports(registry_db, tmp_path):
+    """Test that bulk and delta imports keep the name search index in sync."""
+    import_data.import_csv_data(write_registry_csv(tmp_path / "registry.csv", REGISTRY_ROWS))
+    assert search(registry_db, "Müller") == [1001]
+    assert search(registry_db, "mueller") == [1001]
+    assert search(registry_db, "Muller") == [1001]
+    assert search(registry_db, "gru") == [1003]
+    assert search(registry_db, "Mag Anna") == [1001]
+    assert search(registry_db, "Existenz") == [1001]  # Therapy method names are searchable
+    assert set(search(registry_db, "verhaltenstherapie")) == {1001, 1003}
+
+    delta_rows = [
+        ("Maier", "Anna", "Mag.", "01.03.15", "1001", "anna@example.com", "", "Wien", "1010",
+         "Verhaltenstherapie, Existenzanalyse"),
+        ("Huber", "Berta", "", "12.11.19", "1002", "", "https://huber.at", "Tirol", "6020",
+         "Verhaltenstherapie"),
+        ("Jöchl", "Dora", "", "05.05.21", "1004", "dora@example.com", "", "Steiermark", "8010",
+         "Psychodrama"),
+    ]
+    import_data.import_csv_delta(write_registry_csv(tmp_path / "delta.csv", delta_rows))
+    assert search(registry_db, "Müller") == []  # Renamed
+    assert search(registry_db, "Maier") == [1001]
+    assert search(registry_db, "Gruber") == []  # Deleted
+    assert search(registry_db, "Joechl") == [1004]  # Inserted
+    assert set(search(registry_db, "verhaltenstherapie")) == {1001, 1002}  # Relinked
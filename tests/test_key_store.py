@@ -0,0 +1,82 @@
+"""
+Unit tests for the API key store, its token buckets and the API key dependency.
+
+Keys are issued into a temporary database and the dependency is tested on a
+small app, so these tests do not depend on ``therapists.db``.
+"""
+import asyncio
+import time
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from data.models import Base, create_db_engine
+from app.utils.api_key_generator import generate_api_key
+from app.utils.key_store import ApiKeyStore, KeyLimits, hash_api_key, issue_api_key, key_store, revoke_api_keys
+from app.utils.validate_api_key import validate_api_key
+
+def test_token_bucket_refills_over_time():
+    """Test the burst, the retry delay and the refill of a rate-limited key."""
+    limits = KeyLimits("partner", rate_limit=2.0, burst=2)
+    start = limits.updated_at
+    assert limits.acquire(start) is None
+    assert limits.acquire(start) is None
+    assert limits.acquire(start) == 0.5  # One token refills in half a second
+    assert limits.acquire(start + 0.5) is None
+    assert limits.acquire(start + 10) is None  # The bucket never holds more than the burst
+    assert limits.acquire(start + 10) is None
+    assert limits.acquire(start + 10) is not None
+    assert limits.in_flight == 5
+
+def test_concurrency_limit():
+    """Test that a key is limited to its requests in flight."""
+    limits = KeyLimits("partner", max_concurrency=2)
+    assert limits.acquire() is None and limits.acquire() is None
+    assert limits.acquire() == 1.0
+    limits.release()
+    assert limits.acquire() is None
+
+def test_store_loads_issued_keys(tmp_path):
+    """Test that issued keys are found by hash, revoked keys are not, and reloads keep the buckets."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'keys.db'}", profile="default")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as session:
+        partner_key = issue_api_key(session, "partner", rate_limit=1.0, burst=1)
+        old_key = issue_api_key(session, "old")
+        session.commit()
+        assert revoke_api_keys(session, "old") == 1
+        session.commit()
+
+    store = ApiKeyStore(refresh_interval=3600, miss_interval=3600)
+    with Session(engine) as session:
+        assert store.load(session) == 1
+    partner = asyncio.run(store.lookup(partner_key))
+    assert partner.name == "partner" and partner.rate_limit == 1.0
+    assert asyncio.run(store.lookup(old_key)) is None
+    assert hash_api_key(partner_key) in store.keys and partner_key not in store.keys
+
+    assert partner.acquire() is None
+    with Session(engine) as session:
+        store.load(session)
+    assert store.keys[hash_api_key(partner_key)] is partner
+    assert partner.acquire() is not None  # The bucket was not refilled by the reload
+    engine.dispose()
+
+def test_validate_api_key_returns_429_with_retry_after(monkeypatch):
+    """Test that a key over its rate limit is rejected with Retry-After, and unknown keys with 401."""
+    api_key = generate_api_key()
+    monkeypatch.setitem(key_store.static_keys, hash_api_key(api_key), KeyLimits("test", rate_limit=0.5, burst=1))
+    monkeypatch.setattr(key_store, "loaded_at", time.monotonic())
+
+    app = FastAPI()
+
+    @app.get("/limited")
+    def limited(_api_key: str = Depends(validate_api_key)):
+        return {}
+
+    with TestClient(app) as client:
+        assert client.get("/limited", headers={"X-API-Key": api_key}).status_code == 200
+        response = client.get("/limited", headers={"X-API-Key": api_key})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "2"
+        assert client.get("/limited", headers={"X-API-Key": "unknown"}).status_code == 401
+    assert key_store.static_keys[hash_api_key(api_key)].in_flight == 0
@@ -0,0 +1,60 @@
+"""
+Unit tests for the metrics registry and the request metrics middleware.
+
+The middleware is tested on a small app with an in-memory database, so these
+tests do not depend on ``therapists.db``.
+"""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from app.utils import middleware
+from app.utils.metrics import Counter, Histogram, MetricsRegistry
+
+def test_registry_renders_text_format():
+    """Test counters, cumulative histogram buckets and label escaping."""
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("requests_total", "Requests.", ("route",)))
+    histogram = registry.register(Histogram("duration_seconds", "Durations.", ("route",), buckets=(0.1, 1.0)))
+    counter.inc(('/a"b',))
+    counter.inc(('/a"b',), 2)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(("/x",), value)
+
+    lines = registry.render().splitlines()
+    assert lines[:3] == [
+        "# HELP requests_total Requests.", "# TYPE requests_total counter", 'requests_total{route="/a\\"b"} 3'
+    ]
+    assert 'duration_seconds_bucket{route="/x",le="0.1"} 2' in lines
+    assert 'duration_seconds_bucket{route="/x",le="1"} 3' in lines
+    assert 'duration_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'duration_seconds_sum{route="/x"} 3.65' in lines
+    assert 'duration_seconds_count{route="/x"} 4' in lines
+
+def test_middleware_counts_statements_per_route(monkeypatch, caplog):
+    """Test the Server-Timing header, the per-route metrics and the slow-query log."""
+    engine = create_engine("sqlite://")
+    middleware.instrument_engine(engine)
+    middleware.instrument_engine(engine)  # Instrumenting twice does not double count
+
+    app = FastAPI()
+    middleware.add_metrics_middleware(app)
+
+    @app.get("/items")
+    def items(state: str = None, limit: int = 10):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 2"))
+        return []
+
+    labels = ("GET", "/items", "state")
+    statements_before = middleware.db_statements.values.get(labels, 0)
+    monkeypatch.setattr(middleware, "SLOW_QUERY_MS", 0)
+    with TestClient(app) as client:
+        response = client.get("/items", params={"state": "Wien", "limit": 5})
+        client.get("/missing")
+
+    assert response.headers["Server-Timing"].endswith('desc="2 statements"')
+    assert middleware.db_statements.values[labels] == statements_before + 2
+    assert middleware.request_duration.values[labels][-1] > 0
+    assert middleware.requests_total.values[("GET", "unmatched", "404")] >= 1
+    assert "Slow query" in caplog.text and "/items" in caplog.text
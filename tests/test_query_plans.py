@@ -0,0 +1,86 @@
+"""
+Query plan checks for the therapist filters.
+
+Runs ``EXPLAIN QUERY PLAN`` for the page and expansion loads that the
+therapists endpoints issue, and for every filter combination of
+``therapist_filters``, the SQL filters of the export endpoint. Plans are checked
+against a temporary SQLite database with the declared schema. A plan that scans a whole
+table instead of searching an index fails the test.
+"""
+import itertools
+from datetime import date
+import pytest
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+from data.models import (
+    Base, Therapist, TherapistAddress, TherapistContact, TherapyMethod, TherapyMethodCluster,
+    create_db_engine, therapist_therapy_method
+)
+from app.utils.projections import EXPANSIONS, load_therapists
+from app.utils.therapist_filters import therapist_filters
+
+# Sample value per filter, in the argument order of therapist_filters
+FILTER_VALUES = (date(2015, 1, 1), "Verhaltenstherapie", "1010", "VT", "Wien", "10", "1000", "1100")
+
+@pytest.fixture(scope="module")
+def plan_engine(tmp_path_factory):
+    """Create a small database with the declared schema and indexes."""
+    engine = create_db_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}", profile="default")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(insert(TherapyMethodCluster), [{"id": 1, "cluster_short": "VT", "cluster_name": "V"}])
+        connection.execute(insert(TherapyMethod), [{"id": 1, "method_name": "Verhaltenstherapie", "cluster_id": 1}])
+        connection.execute(insert(Therapist), [
+            {"id": i, "last_name": f"N{i}", "first_name": "V", "title": "",
+             "registration_date": date(2010, 1, 1), "registration_number": i}
+            for i in range(1, 4)
+        ])
+        connection.execute(insert(TherapistAddress), [
+            {"therapist_id": i, "state": "Wien", "postal_code": "1010"} for i in range(1, 4)
+        ])
+        connection.execute(insert(TherapistContact), [
+            {"therapist_id": i, "email": f"{i}@example.com"} for i in range(1, 4)
+        ])
+        connection.execute(insert(therapist_therapy_method), [
+            {"therapist_id": i, "therapy_method_id": 1} for i in range(1, 4)
+        ])
+    yield engine
+    engine.dispose()
+
+def full_scans(connection, statement, parameters=()):
+    """Return the plan steps of a statement that scan a whole table or index."""
+    plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    return [detail for _, _, _, detail in plan if detail.startswith("SCAN ")]
+
+def compiled(engine, statement):
+    """Compile a statement to SQL text and positional parameters."""
+    sql = statement.compile(engine)
+    return str(sql), tuple(sql.params[name] for name in sql.positiontup)
+
+@pytest.mark.parametrize(
+    "mask", [mask for mask in itertools.product((False, True), repeat=len(FILTER_VALUES)) if any(mask)]
+)
+def test_filter_combination_uses_indexes(plan_engine, mask):
+    """Test that every export filter combination is resolved through indexes."""
+    filters = [value if enabled else None for value, enabled in zip(FILTER_VALUES, mask)]
+    statement = select(Therapist.id).where(*therapist_filters(*filters))
+    with plan_engine.connect() as connection:
+        assert full_scans(connection, *compiled(plan_engine, statement)) == []
+
+def test_page_and_expansion_loads_use_indexes(plan_engine):
+    """Test that loading a page with every expansion only searches indexes."""
+    statements = []
+
+    def capture(_conn, _cursor, statement, parameters, _context, _executemany):
+        statements.append((statement, parameters))
+
+    event.listen(plan_engine, "before_cursor_execute", capture)
+    with Session(plan_engine) as db:
+        rows = load_therapists(db, [1, 2, 3], tuple(EXPANSIONS))
+    event.remove(plan_engine, "before_cursor_execute", capture)
+    assert len(rows) == 3
+    assert len(statements) == 1 + len(EXPANSIONS)
+
+    with plan_engine.connect() as connection:
+        for statement, parameters in statements:
+            assert full_scans(connection, statement, parameters) == [], statement
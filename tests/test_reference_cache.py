@@ -0,0 +1,77 @@
+"""
+Unit tests for the preloaded reference data cache.
+
+The reference data is built from fixed rows, so these tests do not depend on
+``therapists.db``.
+"""
+import json
+from app.utils import reference_cache
+from app.utils.pagination import decode_id_cursor
+from app.utils.reference_cache import ReferenceData, page_response
+
+CLUSTERS = [
+    {"id": 1, "cluster_short": "PA", "cluster_name": "Psychoanalytisch", "description": None},
+    {"id": 2, "cluster_short": "VT", "cluster_name": "Verhaltenstherapeutisch", "description": None},
+]
+METHODS = [
+    {"id": method_id, "method_name": f"Methode {method_id}", "cluster_id": 1 if method_id % 3 else 2}
+    for method_id in range(1, 11)
+]
+TYPES = [
+    {"id": 1, "type_short": "A", "type_name": "Typ A", "description": "", "cluster_id": 2},
+]
+
+def reference_data():
+    """Build reference data from the fixed rows."""
+    return ReferenceData({"therapy_clusters": CLUSTERS, "therapy_methods": METHODS, "therapy_types": TYPES})
+
+def rows(page):
+    """Decode the JSON body of a page."""
+    return json.loads(page[0])
+
+def test_page_maps_cluster_short_to_cluster_id():
+    """Test that cluster_short filters methods and types by cluster id, and clusters by their own code."""
+    data = reference_data()
+    assert [row["id"] for row in rows(data.page("therapy_methods", 25, cluster_short="VT"))] == [3, 6, 9]
+    assert [row["id"] for row in rows(data.page("therapy_types", 10, cluster_short="VT"))] == [1]
+    assert rows(data.page("therapy_types", 10, cluster_short="PA")) == []
+    assert rows(data.page("therapy_clusters", 10, cluster_short="PA")) == [CLUSTERS[0]]
+    assert rows(data.page("therapy_methods", 25, cluster_short="XX")) == []
+    assert len(rows(data.page("therapy_methods", 25, cluster_short=None))) == 10  # None is ignored
+
+def test_page_cursors_and_offset():
+    """Test that full pages carry a cursor that continues after their last id."""
+    data = reference_data()
+    body, next_cursor = data.page("therapy_methods", 4)
+    assert [row["id"] for row in json.loads(body)] == [1, 2, 3, 4]
+    assert decode_id_cursor(next_cursor) == 4
+
+    second = data.page("therapy_methods", 4, after_id=decode_id_cursor(next_cursor))
+    assert [row["id"] for row in rows(second)] == [5, 6, 7, 8]
+    last = data.page("therapy_methods", 4, after_id=decode_id_cursor(second[1]))
+    assert [row["id"] for row in rows(last)] == [9, 10]
+    assert last[1] is None  # Partial page ends the walk
+
+    assert [row["id"] for row in rows(data.page("therapy_methods", 3, offset=8))] == [9, 10]
+    filtered = data.page("therapy_methods", 2, cluster_short="PA", after_id=2)
+    assert [row["id"] for row in rows(filtered)] == [4, 5]
+    assert data.page("therapy_methods", 0) == (b"[]", None)
+
+def test_page_cache_is_bounded(monkeypatch):
+    """Test that encoded pages are reused and capped at MAX_CACHED_PAGES."""
+    monkeypatch.setattr(reference_cache, "MAX_CACHED_PAGES", 2)
+    data = reference_data()
+    first = data.page("therapy_methods", 1)
+    assert data.page("therapy_methods", 1) is first
+
+    for offset in range(1, 5):
+        assert [row["id"] for row in rows(data.page("therapy_methods", 1, offset=offset))] == [offset + 1]
+    assert len(data._pages) == 2  # pylint: disable=protected-access
+
+def test_page_response_sets_cursor_header():
+    """Test that the next cursor is sent as a response header."""
+    data = reference_data()
+    response = page_response(data.page("therapy_methods", 4))
+    assert response.media_type == "application/json"
+    assert decode_id_cursor(response.headers["X-Next-Cursor"]) == 4
+    assert "X-Next-Cursor" not in page_response(data.page("therapy_methods", 25)).headers
@@ -0,0 +1,102 @@
+"""
+Tests for the blue/green database refresh and the API's switch to new generations.
+
+Refreshes import small registry CSVs into generations of a temporary
+database, so the tests do not depend on ``therapists.db``.
+"""
+import asyncio
+import os
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, insert, select, text
+from data.models import ApiKey, bind_engine, create_db_engine, current_database_url, release_pointer
+from data.refresh import RefreshError, refresh
+from app.utils.catalogue_snapshot import catalogue_snapshot
+from app.utils.database_release import DatabaseRelease
+from test_import import REGISTRY_ROWS, write_registry_csv
+
+def live_file(url):
+    """Return the file of the live generation of a database."""
+    return current_database_url(url).database
+
+def dataset_version(path):
+    """Return the dataset version stored in a database file."""
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.connect() as connection:
+        version = connection.execute(text("PRAGMA user_version")).scalar()
+    engine.dispose()
+    return version
+
+@pytest.fixture
+def live_url(tmp_path):
+    """Configured database URL of a refreshed database, with a first generation published."""
+    url = f"sqlite:///{tmp_path / 'therapists.db'}"
+    refresh(write_registry_csv(tmp_path / "registry.csv", REGISTRY_ROWS), live_url=url)
+    return url
+
+def test_refresh_publishes_generation(live_url, tmp_path):
+    """Test that a refresh switches the pointer to a new file with a higher dataset version and carries API keys."""
+    first = live_file(live_url)
+    assert os.path.exists(first + ".snapshot")
+    engine = create_db_engine(f"sqlite:///{first}", profile="default")
+    with engine.begin() as connection:
+        connection.execute(insert(ApiKey), [{"name": "partner", "key_hash": "abc", "created_at": datetime.now()}])
+    engine.dispose()
+
+    rows = REGISTRY_ROWS + [("Weber", "Dora", "", "02.02.20", "1004", "", "", "Salzburg", "5020", "Psychodrama")]
+    second = refresh(write_registry_csv(tmp_path / "registry.csv", rows), live_url=live_url)
+    assert live_file(live_url) == second != first
+    assert dataset_version(second) > dataset_version(first)
+    engine = create_db_engine(f"sqlite:///{second}", profile="default")
+    with engine.connect() as connection:
+        assert connection.execute(select(ApiKey.name)).scalars().all() == ["partner"]
+    engine.dispose()
+
+    # Only the live generation and the previous one are kept
+    third = refresh(write_registry_csv(tmp_path / "registry.csv", rows), live_url=live_url, delta=True)
+    assert live_file(live_url) == third
+    assert os.path.exists(second) and not os.path.exists(first) and not os.path.exists(first + ".snapshot")
+
+def test_refresh_keeps_live_generation_on_failure(live_url, tmp_path):
+    """Test that a refresh losing too many therapists is removed without switching the pointer."""
+    live = live_file(live_url)
+    files = sorted(os.listdir(tmp_path))
+    with pytest.raises(RefreshError, match="shrink"):
+        refresh(write_registry_csv(tmp_path / "registry.csv", REGISTRY_ROWS[:1]), live_url=live_url)
+    assert live_file(live_url) == live
+    assert sorted(os.listdir(tmp_path)) == files
+
+def test_release_switches_after_sessions_drain(tmp_path, monkeypatch):
+    """Test that sessions opened before a switch finish on the previous file, which is closed afterwards."""
+    url = f"sqlite+aiosqlite:///{tmp_path / 'therapists.db'}"
+    blue, green = str(tmp_path / "therapists.db.blue"), str(tmp_path / "therapists.db.green")
+    for path, version in ((blue, 1), (green, 2)):
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.begin() as connection:
+            connection.execute(text(f"PRAGMA user_version = {version}"))
+        engine.dispose()
+
+    def publish(path):
+        with open(release_pointer(url), "w", encoding="utf-8") as f:
+            f.write(os.path.basename(path))
+
+    publish(blue)
+    monkeypatch.setattr(catalogue_snapshot, "path", catalogue_snapshot.path)
+    previous = bind_engine(create_db_engine(current_database_url(url), is_async=True), is_async=True)
+    release = DatabaseRelease(url, check_interval=0)
+
+    async def scenario():
+        async with release.session() as old:
+            publish(green)
+            async with release.session() as new:
+                assert await new.scalar(text("PRAGMA user_version")) == 2
+            # The session opened before the switch still reads the previous generation
+            assert release.retiring
+            assert await old.scalar(text("PRAGMA user_version")) == 1
+        assert not release.retiring
+        assert catalogue_snapshot.path == green + ".snapshot"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        asyncio.run(bind_engine(previous, is_async=True).dispose())
@@ -0,0 +1,94 @@
+"""
+Unit tests for the fast JSON encoding and the response compression middleware.
+
+The middleware is tested on a small app, so these tests do not depend on
+``therapists.db``.
+"""
+import json
+import zlib
+from datetime import date
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from app.utils import middleware, responses
+from app.utils.responses import FastJSONResponse, encode_json
+
+ROWS = [{"id": 1, "last_name": "Müller", "registration_date": date(2001, 2, 3), "score": 0.5, "website": None}]
+
+def test_encode_json_matches_fallback(monkeypatch):
+    """Test that orjson and the standard library fallback produce the same compact JSON."""
+    fast = encode_json(ROWS)
+    monkeypatch.setattr(responses, "orjson", None)
+    assert encode_json(ROWS) == fast
+    assert json.loads(fast) == [{**ROWS[0], "registration_date": "2001-02-03"}]
+    assert "Müller".encode() in fast
+
+def test_negotiate_encoding():
+    """Test quality values, wildcards, refusals and the preference order."""
+    supported = ("br", "gzip")
+    assert middleware.negotiate_encoding("gzip, deflate, br", supported) == "br"
+    assert middleware.negotiate_encoding("br;q=0.5, gzip", supported) == "gzip"
+    assert middleware.negotiate_encoding("*;q=0.1, br;q=0", supported) == "gzip"
+    assert middleware.negotiate_encoding("identity", supported) is None
+    assert middleware.negotiate_encoding("gzip;q=bad", supported) is None
+    assert middleware.negotiate_encoding("", supported) is None
+
+def _app():
+    """Build an app with a large, a small, a streamed and a pre-encoded response."""
+    app = FastAPI()
+    middleware.add_compression_middleware(app)
+    rows = [{"id": number, "name": f"Therapist {number}"} for number in range(200)]
+
+    @app.get("/large")
+    def large():
+        return FastJSONResponse(rows, headers={"X-Next-Cursor": "abc"})
+
+    @app.get("/small")
+    def small():
+        return FastJSONResponse(rows[:1])
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((f"{number}\n" for number in range(1000)), media_type="text/plain")
+
+    @app.get("/encoded")
+    def encoded():
+        return PlainTextResponse("x" * 5000, headers={"Content-Encoding": "identity"})
+
+    return app, rows
+
+def test_compression_middleware():
+    """Test that large and streamed responses are gzip-compressed and small ones are not."""
+    app, rows = _app()
+    with TestClient(app) as client:
+        large = client.get("/large", headers={"Accept-Encoding": "gzip"})
+        small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+        plain = client.get("/large", headers={"Accept-Encoding": "identity"})
+        stream = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        encoded = client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+
+    assert large.headers["content-encoding"] == "gzip"
+    assert large.headers["vary"] == "Accept-Encoding"
+    assert large.headers["x-next-cursor"] == "abc"
+    assert int(large.headers["content-length"]) < len(plain.content)
+    assert large.json() == plain.json() == rows
+
+    assert "content-encoding" not in small.headers
+    assert small.headers["vary"] == "Accept-Encoding"
+    assert "content-encoding" not in plain.headers
+
+    assert stream.headers["content-encoding"] == "gzip"
+    assert "content-length" not in stream.headers
+    assert stream.text == "".join(f"{number}\n" for number in range(1000))
+
+    assert encoded.headers["content-encoding"] == "identity"
+    assert encoded.text == "x" * 5000
+
+def test_streamed_chunks_decode_incrementally():
+    """Test that every compressed chunk of a streamed body can be decoded as it arrives."""
+    compressor = middleware._Compressor("gzip")
+    decoder = zlib.decompressobj(31)
+    decoded = [decoder.decompress(compressor.compress(chunk)) for chunk in (b"first\n", b"second\n")]
+    assert decoded == [b"first\n", b"second\n"]
+    assert decoder.decompress(compressor.compress(b"", final=True)) == b""
+    assert decoder.eof
@@ -0,0 +1,95 @@
+"""
+Unit tests for the /therapists result cache: LRU eviction, time to live,
+dataset version invalidation and coalescing of concurrent misses.
+"""
+import asyncio
+import pytest
+from app.utils.result_cache import ResultCache, cache_requests
+
+def counted(results):
+    """Return a compute function returning successive results and the list of its calls."""
+    calls = []
+
+    async def compute():
+        calls.append(len(calls))
+        await asyncio.sleep(0)
+        return results[len(calls) - 1]
+    return compute, calls
+
+def test_lru_ttl_and_dataset_version(monkeypatch):
+    """Test that results are reused until they expire, are evicted or the dataset version changes."""
+    now = [100.0]
+    monkeypatch.setattr("app.utils.result_cache.time.monotonic", lambda: now[0])
+    cache = ResultCache("test", max_entries=2, ttl=5)
+    compute, calls = counted(["a1", "b", "c", "a2", "a3", "a4"])
+
+    async def scenario():
+        assert await cache.get(1, "a", compute) == "a1"
+        assert await cache.get(1, "a", compute) == "a1"  # Hit
+        await cache.get(1, "b", compute)
+        await cache.get(1, "a", compute)  # "a" is now the most recently used
+        await cache.get(1, "c", compute)  # Evicts "b"
+        assert len(cache) == 2
+        assert await cache.get(1, "a", compute) == "a1"
+        now[0] += 5
+        assert await cache.get(1, "a", compute) == "a2"  # Expired
+        assert await cache.get(2, "a", compute) == "a3"  # New dataset version
+        assert len(cache) == 1
+        assert await cache.get(1, "a", compute) == "a4"  # Older versions are not served either
+
+    asyncio.run(scenario())
+    assert len(calls) == 6
+
+def test_concurrent_misses_are_coalesced():
+    """Test that identical concurrent lookups share one computation, including its error."""
+    cache = ResultCache("coalesced", max_entries=8, ttl=60)
+    started = []
+
+    async def compute():
+        started.append(True)
+        await asyncio.sleep(0.01)
+        return "page"
+
+    async def failing():
+        started.append(True)
+        await asyncio.sleep(0.01)
+        raise ValueError("bad cursor")
+
+    async def scenario():
+        pages = await asyncio.gather(*(cache.get(1, "key", compute) for _ in range(10)))
+        assert pages == ["page"] * 10
+        errors = await asyncio.gather(*(cache.get(1, "bad", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(error, ValueError) for error in errors)
+
+    asyncio.run(scenario())
+    assert len(started) == 2
+    assert cache_requests.values[("coalesced", "miss")] == 2
+    assert cache_requests.values[("coalesced", "coalesced")] == 11
+
+def test_cancelled_computation_is_taken_over():
+    """Test that waiters compute the result themselves if the request computing it is cancelled."""
+    cache = ResultCache("cancelled", max_entries=8, ttl=60)
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        return "page"
+
+    async def scenario():
+        leader = asyncio.create_task(cache.get(1, "key", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get(1, "key", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await waiter == "page"
+
+    asyncio.run(scenario())
+
+def test_disabled_cache_always_computes():
+    """Test that a cache without entries calls the computation every time."""
+    cache = ResultCache("disabled", max_entries=0)
+    compute, calls = counted(["a", "b"])
+    assert asyncio.run(cache.get(1, "key", compute)) == "a"
+    assert asyncio.run(cache.get(1, "key", compute)) == "b"
+    assert len(calls) == 2
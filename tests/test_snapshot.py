@@ -0,0 +1,104 @@
+"""
+Tests for the memory-mapped catalogue snapshot against a temporary database.
+
+Rows read from the snapshot are compared with the rows the projections load
+from the database, so the tests do not depend on ``therapists.db``.
+"""
+import os
+from datetime import date
+import pytest
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+from data.models import (
+    Base, Therapist, TherapistAddress, TherapistContact, TherapyMethod, TherapyMethodCluster,
+    create_db_engine, therapist_therapy_method
+)
+from data.snapshot import CatalogueSnapshot, SnapshotError, snapshot_path, write_snapshot
+from app.utils.catalogue_snapshot import SnapshotFile
+from app.utils.projections import EXPANSIONS, load_therapists
+
+@pytest.fixture
+def catalogue_db(tmp_path):
+    """Create a database with therapists lacking an address, a contact or methods, and shared strings."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'catalogue.db'}", profile="default")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(insert(TherapyMethodCluster), [{"id": 1, "cluster_short": "VT", "cluster_name": "V"}])
+        connection.execute(insert(TherapyMethod), [
+            {"id": 1, "method_name": "Verhaltenstherapie", "cluster_id": 1},
+            {"id": 2, "method_name": "Psychodrama", "cluster_id": 2},  # Cluster missing
+            {"id": 3, "method_name": "Verhaltenstherapie", "cluster_id": 1},  # Duplicate name
+        ])
+        connection.execute(insert(Therapist), [
+            {"id": therapist_id, "last_name": name, "first_name": "Jürgen", "title": title,
+             "registration_date": date(2000 + therapist_id, 1, 2), "registration_number": 10_000 + therapist_id}
+            for therapist_id, name, title in ((1, "Müller", "Mag."), (3, "Huber", ""), (7, "Müller", None))
+        ])
+        connection.execute(insert(TherapistAddress), [
+            {"therapist_id": 1, "state": "Wien", "postal_code": "1010"},
+            {"therapist_id": 7, "state": "Tirol", "postal_code": "6020"},
+        ])
+        connection.execute(insert(TherapistContact), [
+            {"therapist_id": 1, "email": "mueller@example.at", "website": None},
+            {"therapist_id": 3, "email": "", "website": "https://huber.at"},
+        ])
+        connection.execute(insert(therapist_therapy_method), [
+            {"therapist_id": 1, "therapy_method_id": 3},
+            {"therapist_id": 1, "therapy_method_id": 1},
+            {"therapist_id": 7, "therapy_method_id": 2},
+        ])
+        connection.execute(text("PRAGMA user_version = 4"))
+    yield engine
+    engine.dispose()
+
+def test_snapshot_rows_match_projections(catalogue_db, tmp_path):
+    """Test that every expansion reads the same rows from the snapshot as from the database."""
+    path = str(tmp_path / "catalogue.snapshot")
+    with Session(catalogue_db) as db:
+        assert write_snapshot(db, path) == (4, 3)
+        snapshot = CatalogueSnapshot(path)
+        ids = [7, 2, 1, 3, 1]  # Unknown ids are left out, repeated ids kept
+        for expand in ((), tuple(EXPANSIONS), ("methods",), ("address", "contact")):
+            assert snapshot.load_therapists(ids, expand) == load_therapists(db, ids, expand)
+    assert snapshot.dataset_version == 4 and len(snapshot) == 3
+    assert snapshot.load_therapists([]) == []
+
+def test_invalid_snapshot_is_rejected(tmp_path):
+    """Test that truncated and foreign files are not read as snapshots."""
+    for content in (b"", b"ELISCAT0" + b"\0" * 64):
+        path = tmp_path / "invalid.snapshot"
+        path.write_bytes(content)
+        with pytest.raises(SnapshotError):
+            CatalogueSnapshot(str(path))
+
+def test_snapshot_path(monkeypatch):
+    """Test that the snapshot lives next to SQLite database files only."""
+    monkeypatch.delenv("CATALOGUE_SNAPSHOT", raising=False)
+    assert snapshot_path("sqlite+aiosqlite:////srv/elis/therapists.db") == "/srv/elis/therapists.db.snapshot"
+    assert snapshot_path("sqlite://") is None
+    monkeypatch.setenv("CATALOGUE_SNAPSHOT", "/dev/shm/catalogue")
+    assert snapshot_path("sqlite:///x.db") == "/dev/shm/catalogue"
+
+def test_snapshot_file_follows_dataset_version_and_replacement(catalogue_db, tmp_path):
+    """Test that the snapshot is only used for its dataset version and reopened when replaced."""
+    path = str(tmp_path / "catalogue.snapshot")
+    holder = SnapshotFile(path, check_interval=0)
+    assert holder.get(4) is None  # No file yet
+    assert holder.load_therapists([1], (), 4) is None
+
+    with Session(catalogue_db) as db:
+        write_snapshot(db, path)
+        first = holder.get(4)
+        assert first is not None and holder.get(5) is None
+        assert holder.load_therapists([1], (), 4)[0]["last_name"] == "Müller"
+
+        db.execute(text("UPDATE therapists SET last_name = 'Maier' WHERE id = 1"))
+        db.execute(text("PRAGMA user_version = 5"))
+        db.commit()
+        write_snapshot(db, path)
+    assert holder.get(4) is None
+    assert holder.load_therapists([1], (), 5)[0]["last_name"] == "Maier"
+    assert first.load_therapists([1])[0]["last_name"] == "Müller"  # Readers of the old file are unaffected
+
+    os.remove(path)
+    assert holder.get(5) is None
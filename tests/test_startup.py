@@ -0,0 +1,56 @@
+"""
+Unit tests for side-effect-free imports and the lazily created database engines.
+
+Imports are checked in fresh interpreters pointed at a temporary database, so
+these tests do not depend on ``therapists.db``.
+"""
+import os
+import subprocess
+import sys
+from sqlalchemy import inspect
+from data import migrate as migrate_module
+from data.models import Base, LazySessionmaker, create_db_engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_CHECK = """
+import sys
+import app.main
+from data import models
+assert not models._engines, "an engine was created on import"
+assert "pandas" not in sys.modules, "pandas was imported"
+"""
+
+def test_importing_the_app_has_no_side_effects(tmp_path):
+    """Test that importing the app opens no database, prints nothing and does not load pandas."""
+    db_path = tmp_path / "therapists.db"
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}"}
+    env.pop("ASYNC_DATABASE_URL", None)
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_CHECK], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == ""
+    assert not db_path.exists()
+
+def test_session_factory_creates_engine_on_first_use():
+    """Test that the engine is created with the first session and then reused."""
+    engines = []
+
+    def get_bind():
+        engines.append(create_db_engine("sqlite://"))
+        return engines[-1]
+
+    factory = LazySessionmaker(get_bind, autoflush=False)
+    assert not engines
+    with factory() as first, factory() as second:
+        assert first.get_bind() is second.get_bind() is engines[0]
+    assert len(engines) == 1
+    engines[0].dispose()
+
+def test_migrate_creates_the_schema(tmp_path):
+    """Test that migrate creates every table of a new database."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    migrate_module.migrate(engine)
+    assert set(Base.metadata.tables) <= set(inspect(engine).get_table_names())
+    engine.dispose()
@@ -0,0 +1,231 @@
+"""
+Unit tests for the in-memory therapist index and the versioned cache it is served from.
+
+The index is built from fixed postings, so these tests do not depend on
+``therapists.db``.
+"""
+import itertools
+from datetime import date
+import pytest
+from sqlalchemy.orm import Session
+from data.models import bump_dataset_version, create_db_engine, notify_dataset_change
+from app.utils.dataset_cache import VersionedCache
+from app.utils.facets import EXPERIENCE_BANDS, therapist_facets
+from app.utils.therapist_filters import experience_cutoff
+from app.utils.therapist_index import TherapistIndex, _postings
+
+REGISTRATION_DATES = {
+    1: date(2001, 1, 1), 2: date(2005, 6, 1), 3: date(2010, 3, 15), 4: date(2012, 8, 1),
+    5: date(2015, 1, 1), 6: date(2018, 9, 30), 7: date(2020, 2, 2), 8: date(2023, 5, 5),
+}
+POSTAL_CODES = {"1010": {1, 3}, "1090": {2, 5, 8}, "6020": {4, 6}, "8010": {7}}
+STATES = {"Wien": {1, 2, 3, 5, 8}, "Tirol": {4, 6}, "Steiermark": {7}}
+METHODS = {"Verhaltenstherapie": {2, 3, 5, 6, 8}, "Psychodrama": {1, 2, 8}}
+CLUSTERS = {"VT": {2, 3, 5, 6, 8}, "HT": {1, 2, 8}}
+
+def pairs(groups):
+    """Flatten value -> ids groups into (value, id) pairs."""
+    return [(value, therapist_id) for value, ids in groups.items() for therapist_id in ids]
+
+@pytest.fixture
+def index():
+    """Build an index over eight therapists."""
+    return TherapistIndex(
+        ids=sorted(REGISTRATION_DATES),
+        registration_dates=REGISTRATION_DATES,
+        by_postal_code=_postings(pairs(POSTAL_CODES)),
+        by_method=_postings(pairs(METHODS)),
+        by_cluster=_postings(pairs(CLUSTERS)),
+        by_state=_postings(pairs(STATES)),
+        postal_codes={therapist_id: code for code, ids in POSTAL_CODES.items() for therapist_id in ids},
+    )
+
+def brute_force(min_registration_date, therapy_method, postal_code, cluster_short):
+    """Return the matching ids by testing every therapist against every filter."""
+    return [
+        therapist_id for therapist_id, registered in sorted(REGISTRATION_DATES.items())
+        if (min_registration_date is None or registered <= min_registration_date)
+        and (not therapy_method or therapist_id in METHODS.get(therapy_method, ()))
+        and (not postal_code or therapist_id in POSTAL_CODES.get(postal_code, ()))
+        and (not cluster_short or therapist_id in CLUSTERS.get(cluster_short, ()))
+    ]
+
+@pytest.mark.parametrize("filters", list(itertools.product(
+    (None, date(2000, 1, 1), date(2012, 8, 1), date(2030, 1, 1)),
+    (None, "Verhaltenstherapie", "Psychodrama", "Unknown"),
+    (None, "1090", "6020", "9999"),
+    (None, "VT", "HT", "XX"),
+)))
+def test_search_matches_brute_force(index, filters):
+    """Test every filter combination, including unknown values, against a brute-force scan."""
+    assert index.search(*filters, limit=100) == brute_force(*filters)
+
+def test_search_intersection_is_independent_of_posting_order(index):
+    """Test that the result does not depend on which posting is walked."""
+    # The method posting is smaller than the postal code posting here, and larger in the second search
+    assert index.search(therapy_method="Psychodrama", state="Wien") == [1, 2, 8]
+    assert index.search(therapy_method="Verhaltenstherapie", postal_code="6020") == [6]
+    assert index.search(therapy_method="Psychodrama", cluster_short="VT", state="Wien") == [2, 8]
+    assert index.search(state="Tirol", postal_code="1090") == []
+
+def postal_brute_force(state, postal_prefix, postal_from, postal_to, near):
+    """Return the ids of a postal code region search ordered by distance, postal code and id."""
+    postal_codes = {therapist_id: code for code, ids in POSTAL_CODES.items() for therapist_id in ids}
+    matches = [
+        therapist_id for therapist_id, code in postal_codes.items()
+        if (not state or therapist_id in STATES.get(state, ()))
+        and (not postal_prefix or code.startswith(postal_prefix))
+        and (not postal_from or code >= postal_from)
+        and (not postal_to or code <= postal_to)
+    ]
+    distance = (lambda code: abs(int(code) - int(near))) if near else (lambda code: 0)
+    return sorted(matches, key=lambda therapist_id: (distance(postal_codes[therapist_id]), postal_codes[therapist_id], therapist_id))
+
+@pytest.mark.parametrize("region", list(itertools.product(
+    (None, "Wien", "Tirol"),
+    (None, "1", "10", "6", "9"),
+    (None, "1050"),
+    (None, "6020"),
+    (None, "1010", "6100"),
+)))
+def test_search_postal_matches_brute_force(index, region):
+    """Test postal code regions, states and distance order against a brute-force sort."""
+    expected = postal_brute_force(*region)
+    state, postal_prefix, postal_from, postal_to, near = region
+    kwargs = {
+        "state": state, "postal_prefix": postal_prefix, "postal_from": postal_from,
+        "postal_to": postal_to, "near": near,
+    }
+    assert index.search_postal(**kwargs, limit=100) == expected
+
+    # Walking the region with cursors of two results yields the same order
+    walked, after = [], None
+    while True:
+        page = index.search_postal(**kwargs, after=after, limit=2)
+        walked.extend(page)
+        if len(page) < 2:
+            break
+        after = (index.postal_codes[page[-1]], page[-1])
+    assert walked == expected
+
+def test_search_postal_region_lookup(index):
+    """Test the binary searches over the sorted postal codes."""
+    assert index.postal_region(postal_prefix="10") == ["1010", "1090"]
+    assert index.postal_region(postal_prefix="109") == ["1090"]
+    assert index.postal_region(postal_from="1050", postal_to="6020") == ["1090", "6020"]
+    assert index.postal_region(postal_prefix="7") == []
+    assert index.search_postal(near="6100", limit=3) == [4, 6, 7]  # 6020, then 8010
+    assert index.search_postal(postal_prefix="10", postal_code="1090", therapy_method="Psychodrama") == [2, 8]
+    assert index.search_postal(postal_prefix="10", offset=1, limit=2) == [3, 2]
+    # A cursor on a postal code that left the region continues with the next nearer code
+    assert index.search_postal(near="1010", after=("1050", 99), limit=2) == [2, 5]
+
+def test_search_pagination(index):
+    """Test limit, offset and cursor pagination, alone and combined."""
+    assert index.search(limit=3) == [1, 2, 3]
+    assert index.search(offset=3, limit=3) == [4, 5, 6]
+    assert index.search(after_id=3, limit=3) == [4, 5, 6]
+    assert index.search(after_id=3, offset=2, limit=2) == [6, 7]  # Offset counts matches after the cursor
+    assert index.search(cluster_short="VT", after_id=3, offset=1, limit=5) == [6, 8]
+    assert index.search(after_id=8) == []
+    assert index.search(limit=0) == []
+
+def test_search_registration_date_short_circuits(index):
+    """Test thresholds before the earliest and after the latest registration date."""
+    assert index.search(min_registration_date=date(1999, 12, 31)) == []
+    assert index.search(min_registration_date=date(2023, 5, 5), limit=100) == sorted(REGISTRATION_DATES)
+    assert index.search(min_registration_date=date(2005, 6, 1)) == [1, 2]
+
+def facets_brute_force(matched):
+    """Count the matched ids per facet value and experience band one by one."""
+    def counts(groups):
+        return {value: len(ids & matched) for value, ids in sorted(groups.items()) if ids & matched}
+    experience = {}
+    for label, min_years, max_years in EXPERIENCE_BANDS:
+        newest = experience_cutoff(min_years) or date.today()
+        oldest = experience_cutoff(max_years) if max_years is not None else date.min
+        experience[label] = sum(oldest < REGISTRATION_DATES[therapist_id] <= newest for therapist_id in matched)
+    return {
+        "total": len(matched), "cluster_short": counts(CLUSTERS), "state": counts(STATES),
+        "method_name": counts(METHODS), "experience": experience,
+    }
+
+@pytest.mark.parametrize("filters", list(itertools.product(
+    (None, date(2012, 8, 1)),
+    (None, "Psychodrama", "Unknown"),
+    (None, "VT"),
+    (None, "Wien", "Tirol"),
+    (None, "10"),
+)))
+def test_facets_match_brute_force(index, filters):
+    """Test facet counts with and without filters against counting every therapist."""
+    min_registration_date, therapy_method, cluster_short, state, postal_prefix = filters
+    matched = set(postal_brute_force(state, postal_prefix, None, None, None)) & set(
+        brute_force(min_registration_date, therapy_method, None, cluster_short)
+    )
+    facets = therapist_facets(
+        index, min_registration_date=min_registration_date, therapy_method=therapy_method,
+        cluster_short=cluster_short, state=state, postal_prefix=postal_prefix,
+    )
+    assert facets == facets_brute_force(matched)
+
+def test_search_empty_index():
+    """Test searching an index without therapists."""
+    empty = TherapistIndex([], {}, {}, {}, {})
+    assert len(empty) == 0
+    assert empty.search() == []
+    assert empty.search(min_registration_date=date(2020, 1, 1)) == []
+    assert therapist_facets(empty)["total"] == 0
+    assert therapist_facets(empty, state="Wien")["experience"]["20+"] == 0
+
+def test_facets_on_leap_day(index, monkeypatch):
+    """Test that the experience cutoffs and facets work on 29 February."""
+    class LeapDay(date):
+        @classmethod
+        def today(cls):
+            return cls(2028, 2, 29)
+
+    monkeypatch.setattr("app.utils.therapist_filters.date", LeapDay)
+    monkeypatch.setattr("app.utils.facets.date", LeapDay)
+    assert experience_cutoff(4) == date(2024, 2, 29)
+    assert experience_cutoff(5) == date(2023, 2, 28)
+    facets = therapist_facets(index)
+    assert sum(facets["experience"].values()) == len(REGISTRATION_DATES)
+
+def test_versioned_cache_rebuilds_on_version_change(tmp_path):
+    """Test that the cache rebuilds only when the dataset version changes."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'versions.db'}", profile="default")
+    builds = []
+    cache = VersionedCache(lambda db: builds.append(len(builds)) or len(builds), check_interval=3600)
+
+    def bump():
+        with Session(engine) as db:
+            bump_dataset_version(db)
+            db.commit()
+
+    with Session(engine) as db:
+        assert cache.get(db) == 1
+        assert cache.version == 0
+
+    bump()
+    with Session(engine) as db:
+        assert cache.get(db) == 1  # Not checked again within the interval
+
+    notify_dataset_change()  # Expires every registered cache
+    with Session(engine) as db:
+        assert cache.get(db) == 2
+        assert cache.version == 1
+        assert cache.get(db) == 2
+
+    cache.check_interval = 0
+    with Session(engine) as db:
+        assert cache.get(db) == 2  # Same version, no rebuild
+    bump()
+    with Session(engine) as db:
+        assert cache.get(db) == 3
+
+    cache.invalidate()
+    assert cache.version is None
+    with Session(engine) as db:
+        assert cache.get(db) == 4
+    engine.dispose()